@@ -0,0 +1,284 @@
+"""
+Admission control for upstream C2S calls
+
+Every upstream call takes a slot from the global limiter and, when one is
+configured, from its endpoint group's limiter. Callers that cannot get a
+slot wait in a bounded queue for their priority lane; once that queue is
+full the call is shed with 503 and a Retry-After estimate instead of
+piling up more requests.
+
+Freed slots are handed out across lanes by smooth weighted round-robin,
+and the bulk lane may only hold a share of the slots, so background work
+yields to realtime traffic whenever realtime callers are waiting.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.errors import GatewayError
+from app.core.metrics import metrics
+from app.core.priority import BULK, LANES, REALTIME
+from app.core.tracing import span
+
+
+class Overloaded(GatewayError):
+    """The gateway is at capacity and shed the request"""
+
+    status_code = 503
+
+
+class ConcurrencyLimiter:
+    """Concurrency limit with bounded, weighted-fair wait queues per lane"""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        weights: Optional[Dict[str, int]] = None,
+        bulk_share: float = 1.0,
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.weights = {lane: max(1, (weights or {}).get(lane, 1)) for lane in LANES}
+        self.lane_limits = {
+            REALTIME: limit,
+            BULK: max(1, int(limit * bulk_share)),
+        }
+        self.active = 0
+        self.active_by_lane = {lane: 0 for lane in LANES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {
+            lane: deque() for lane in LANES
+        }
+        self._current_weight = {lane: 0 for lane in LANES}
+        # Smoothed slot hold time, used for Retry-After estimates
+        self._hold_time = 0.1
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def retry_after(self, lane: str) -> int:
+        """Seconds a shed caller should wait before retrying"""
+        backlog = len(self._waiters[lane]) + 1
+        drain = self._hold_time * backlog / max(self.lane_limits[lane], 1)
+        return max(1, math.ceil(drain))
+
+    def _report(self):
+        for lane in LANES:
+            metrics.set_gauge(
+                "admission_active",
+                self.active_by_lane[lane],
+                limiter=self.name,
+                lane=lane,
+            )
+            metrics.set_gauge(
+                "admission_queued",
+                len(self._waiters[lane]),
+                limiter=self.name,
+                lane=lane,
+            )
+
+    def _has_room(self, lane: str) -> bool:
+        return (
+            self.active < self.limit
+            and self.active_by_lane[lane] < self.lane_limits[lane]
+        )
+
+    def _start(self, lane: str):
+        self.active += 1
+        self.active_by_lane[lane] += 1
+
+    async def acquire(self, lane: str = REALTIME):
+        """Take a slot, waiting in the lane queue or raising Overloaded when full"""
+        # Bulk callers never overtake anyone already waiting
+        overtakes = self._waiters[REALTIME] if lane == REALTIME else self.queued
+        if self._has_room(lane) and not overtakes:
+            self._start(lane)
+            self._report()
+            return
+
+        if len(self._waiters[lane]) >= self.max_queue:
+            metrics.incr("admission_rejected", limiter=self.name, lane=lane)
+            raise Overloaded(
+                f"Gateway overloaded ({self.name}, {lane}), retry later",
+                headers={"Retry-After": str(self.retry_after(lane))},
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        self._report()
+        started = time.monotonic()
+        try:
+            with span("queue", limiter=self.name, lane=lane):
+                await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was granted just as we were cancelled
+                self.release(lane)
+            elif waiter in self._waiters[lane]:
+                self._waiters[lane].remove(waiter)
+                self._report()
+            raise
+        metrics.observe(
+            "admission_wait_seconds",
+            time.monotonic() - started,
+            limiter=self.name,
+            lane=lane,
+        )
+
+    def try_acquire(self, lane: str = REALTIME) -> bool:
+        """Take a slot only if one is free now and nobody is waiting for it"""
+        if self._has_room(lane) and not self.queued:
+            self._start(lane)
+            self._report()
+            return True
+        return False
+
+    def release(self, lane: str = REALTIME, held: Optional[float] = None):
+        """Return a slot and grant freed capacity to waiting callers"""
+        if held is not None:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * held
+        self.active -= 1
+        self.active_by_lane[lane] -= 1
+        self._dispatch()
+        self._report()
+
+    def _dispatch(self):
+        while self.active < self.limit:
+            lane = self._pick_lane()
+            if lane is None:
+                return
+            self._start(lane)
+            self._waiters[lane].popleft().set_result(None)
+
+    def _pick_lane(self) -> Optional[str]:
+        """Smooth weighted round-robin over lanes with eligible waiters"""
+        eligible = []
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if waiters and self._has_room(lane):
+                eligible.append(lane)
+        if not eligible:
+            return None
+        if len(eligible) == 1:
+            return eligible[0]
+
+        total = 0
+        for lane in eligible:
+            self._current_weight[lane] += self.weights[lane]
+            total += self.weights[lane]
+        chosen = max(eligible, key=lambda lane: self._current_weight[lane])
+        self._current_weight[chosen] -= total
+        return chosen
+
+    @asynccontextmanager
+    async def slot(self, lane: str = REALTIME):
+        await self.acquire(lane)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(lane, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "lanes": {
+                lane: {
+                    "limit": self.lane_limits[lane],
+                    "weight": self.weights[lane],
+                    "active": self.active_by_lane[lane],
+                    "queued": len(self._waiters[lane]),
+                }
+                for lane in LANES
+            },
+        }
+
+
+class AdmissionController:
+    """Global and per-endpoint-group limiters in front of the C2S client"""
+
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int,
+        group_limits: Dict[str, int],
+        weights: Dict[str, int],
+        bulk_share: float,
+    ):
+        self.global_limiter = ConcurrencyLimiter(
+            "global", limit, max_queue, weights, bulk_share
+        )
+        self.group_limiters = {
+            group: ConcurrencyLimiter(
+                group, group_limit, max_queue, weights, bulk_share
+            )
+            for group, group_limit in group_limits.items()
+        }
+
+    @asynccontextmanager
+    async def admit(self, group: str, lane: str = REALTIME):
+        """Hold a group slot (if limited) and a global slot for one upstream call"""
+        group_limiter = self.group_limiters.get(group)
+        if group_limiter is None:
+            async with self.global_limiter.slot(lane):
+                yield
+            return
+        # Narrow limiter first so a queued call never pins a global slot
+        async with group_limiter.slot(lane):
+            async with self.global_limiter.slot(lane):
+                yield
+
+    def try_admit(
+        self, group: str, lane: str = REALTIME
+    ) -> Optional[Callable[[], None]]:
+        """
+        Take the slots admit() would, but only if they are all free now
+
+        Returns the function that gives them back, or None without waiting
+        when any of them is taken or queued for.
+        """
+        limiters = [self.global_limiter]
+        if group in self.group_limiters:
+            limiters.insert(0, self.group_limiters[group])
+        taken = []
+        for limiter in limiters:
+            if not limiter.try_acquire(lane):
+                for held in reversed(taken):
+                    held.release(lane)
+                return None
+            taken.append(limiter)
+        started = time.monotonic()
+
+        def release():
+            held = time.monotonic() - started
+            for limiter in reversed(taken):
+                limiter.release(lane, held)
+
+        return release
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        limiters = [self.global_limiter, *self.group_limiters.values()]
+        return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+# Global admission controller
+admission = AdmissionController(
+    limit=settings.max_concurrent_upstream,
+    max_queue=settings.max_upstream_queue,
+    group_limits=settings.c2s_group_concurrency,
+    weights=settings.lane_weights,
+    bulk_share=settings.bulk_max_share,
+)
@@ -0,0 +1,200 @@
+"""
+Gateway-side seller assignment
+
+Picks a seller for a lead from a distribution queue's sellers without a
+round-trip per decision. Queue membership and priorities come from the
+reference-cached GET /integration/distribution_queues/{id}/sellers, so a
+pick costs a cache read; priority or next-seller changes made through the
+gateway invalidate that cache and the queue state is rebuilt on the next
+pick.
+
+Two strategies are supported:
+
+- round_robin: smooth weighted round-robin by seller priority. The
+  interleaved sequence is precomputed when the queue state is built, so a
+  pick is O(1).
+- least_loaded: the seller with the fewest gateway assignments relative
+  to its weight, kept in a heap (O(log n) per pick).
+
+A pick counts towards the seller's load right away, so concurrent
+assignments see each other; the caller releases it if forwarding fails.
+"""
+
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.errors import GatewayError
+from app.core.metrics import metrics
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+STRATEGIES = (ROUND_ROBIN, LEAST_LOADED)
+
+
+class NoSellerAvailable(GatewayError):
+    """The queue has no active seller that may receive the lead"""
+
+    status_code = 409
+
+
+def queue_sellers(response: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """(seller_id, weight) of the active sellers in a queue sellers response"""
+    sellers = []
+    for item in response.get("data", []):
+        attributes = item.get("attributes") or {}
+        seller_id = (
+            item.get("seller_id") or attributes.get("seller_id") or item.get("id")
+        )
+        if seller_id is None or attributes.get("active", item.get("active")) is False:
+            continue
+        priority = attributes.get("priority", item.get("priority")) or 1
+        sellers.append((str(seller_id), max(1, int(priority))))
+    return sellers
+
+
+def smooth_weighted_sequence(sellers: List[Tuple[str, int]]) -> List[str]:
+    """One full cycle of smooth weighted round-robin (nginx-style)"""
+    current = {seller_id: 0 for seller_id, _ in sellers}
+    total = sum(weight for _, weight in sellers)
+    sequence = []
+    for _ in range(total):
+        for seller_id, weight in sellers:
+            current[seller_id] += weight
+        chosen = max(current, key=current.__getitem__)
+        current[chosen] -= total
+        sequence.append(chosen)
+    return sequence
+
+
+class QueueState:
+    """Selection state of one distribution queue"""
+
+    def __init__(self, queue_id: str, sellers: List[Tuple[str, int]], source: Any):
+        self.queue_id = queue_id
+        self.source = source
+        self.weights = dict(sellers)
+        self.sequence = smooth_weighted_sequence(sellers)
+        self.position = 0
+        self.assigned: Dict[str, int] = {seller_id: 0 for seller_id in self.weights}
+        self._heap = [(0.0, seller_id) for seller_id in self.weights]
+        heapq.heapify(self._heap)
+
+    def carry_over(self, previous: "QueueState"):
+        """Keep rotation position and load counts across a rebuild"""
+        if self.sequence:
+            self.position = previous.position % len(self.sequence)
+        for seller_id in self.assigned:
+            self.assigned[seller_id] = previous.assigned.get(seller_id, 0)
+        self._heap = [(self._load(seller_id), seller_id) for seller_id in self.weights]
+        heapq.heapify(self._heap)
+
+    def _load(self, seller_id: str) -> float:
+        return self.assigned[seller_id] / self.weights[seller_id]
+
+    def pick_round_robin(self, exclude: Set[str]) -> Optional[str]:
+        for _ in range(len(self.sequence)):
+            seller_id = self.sequence[self.position]
+            self.position = (self.position + 1) % len(self.sequence)
+            if seller_id not in exclude:
+                return seller_id
+        return None
+
+    def pick_least_loaded(self, exclude: Set[str]) -> Optional[str]:
+        skipped = []
+        chosen = None
+        while self._heap:
+            load, seller_id = self._heap[0]
+            if load != self._load(seller_id):
+                # Superseded by the entry reserve() or release() pushed
+                heapq.heappop(self._heap)
+                continue
+            if seller_id not in exclude:
+                chosen = seller_id
+                break
+            skipped.append(heapq.heappop(self._heap))
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return chosen
+
+    def reserve(self, seller_id: str):
+        """Count a picked assignment towards the seller's load"""
+        if seller_id in self.assigned:
+            self.assigned[seller_id] += 1
+            heapq.heappush(self._heap, (self._load(seller_id), seller_id))
+
+    def release(self, seller_id: str):
+        """Undo reserve() for an assignment that was not forwarded"""
+        if self.assigned.get(seller_id, 0) > 0:
+            self.assigned[seller_id] -= 1
+            heapq.heappush(self._heap, (self._load(seller_id), seller_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_id": self.queue_id,
+            "sellers": [
+                {
+                    "seller_id": seller_id,
+                    "weight": weight,
+                    "assigned": self.assigned[seller_id],
+                }
+                for seller_id, weight in self.weights.items()
+            ],
+        }
+
+
+class SellerSelector:
+    """Per-tenant queue states built from cached queue sellers"""
+
+    def __init__(self):
+        self._queues: Dict[Tuple[str, str], QueueState] = {}
+
+    def state(
+        self, tenant: str, queue_id: str, response: Dict[str, Any]
+    ) -> QueueState:
+        """Queue state for a queue sellers response, rebuilt when it changed"""
+        key = (tenant, queue_id)
+        state = self._queues.get(key)
+        if state is None or state.source is not response:
+            rebuilt = QueueState(queue_id, queue_sellers(response), response)
+            if state is not None:
+                rebuilt.carry_over(state)
+            self._queues[key] = state = rebuilt
+        return state
+
+    def pick(
+        self,
+        tenant: str,
+        queue_id: str,
+        response: Dict[str, Any],
+        strategy: str = ROUND_ROBIN,
+        exclude: Iterable[str] = (),
+    ) -> str:
+        """Choose a seller from the queue and reserve the assignment"""
+        state = self.state(tenant, queue_id, response)
+        excluded = set(exclude)
+        if strategy == LEAST_LOADED:
+            seller_id = state.pick_least_loaded(excluded)
+        else:
+            seller_id = state.pick_round_robin(excluded)
+        if seller_id is None:
+            raise NoSellerAvailable(f"No active seller available in queue {queue_id}")
+        state.reserve(seller_id)
+        metrics.incr("assignments", strategy=strategy)
+        return seller_id
+
+    def release(self, tenant: str, queue_id: str, seller_id: str):
+        """Give back a picked assignment whose forward failed"""
+        state = self._queues.get((tenant, queue_id))
+        if state is not None:
+            state.release(seller_id)
+
+    def stats(self, tenant: str) -> List[Dict[str, Any]]:
+        return [
+            state.stats()
+            for (state_tenant, _), state in self._queues.items()
+            if state_tenant == tenant
+        ]
+
+
+# Global seller selector
+seller_selector = SellerSelector()
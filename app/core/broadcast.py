@@ -0,0 +1,130 @@
+"""
+Bulk message and activity jobs
+
+Adds the same message (kind "bulk_message") or activity ("bulk_activity")
+to many leads, selected by id or by lead filters. The jobs run on the
+background job runner in the bulk lane, with at most `concurrency` leads
+in flight and optionally at most `rate` leads per second on top of the
+tenant's rate limit. Shed calls are retried after their Retry-After, and
+when the tenant's upstream quota refuses bulk calls the job pauses until
+it allows them again.
+
+The lead list and per-lead results are kept in the job state, so a job
+interrupted by a restart resumes with the leads that have no result yet.
+Messages and activities are not idempotent: leads whose call was in
+flight when the job was interrupted are reported as "unknown" rather
+than sent twice.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.client import tenant_clients
+from app.core.jobs import JobContext, jobs
+from app.core.metrics import metrics
+from app.core.ratelimit import TokenBucket
+from app.core.redistribution import error_result, resolve_leads, retry_shed
+from app.models.schemas import BulkActivityCreate, BulkMessageCreate
+
+BULK_MESSAGE = "bulk_message"
+BULK_ACTIVITY = "bulk_activity"
+
+# Progress counter of each per-lead result status
+COUNTERS = {"ok": "succeeded", "error": "failed", "unknown": "unknown"}
+
+Send = Callable[[Any, str, Dict[str, Any]], Awaitable[Any]]
+
+
+async def _send(
+    kind: str, send: Send, client, lead_id: str, payload: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Send to one lead, retrying shed calls and waiting out the bulk quota"""
+    try:
+        await retry_shed(lambda: send(client, lead_id, payload))
+    except Exception as e:
+        metrics.incr("bulk_leads", kind=kind, status="error")
+        return error_result(e)
+    metrics.incr("bulk_leads", kind=kind, status="ok")
+    return {"status": "ok"}
+
+
+async def _broadcast(ctx: JobContext, kind: str, send: Send, payload: Dict[str, Any]):
+    """Send to every selected lead, one result per lead"""
+    params = ctx.params
+    state = ctx.state
+    client = tenant_clients.get(ctx.tenant)
+
+    if "lead_ids" not in state:
+        lead_ids = params.get("lead_ids")
+        if lead_ids is None:
+            lead_ids = await resolve_leads(client, params)
+        state["lead_ids"] = list(dict.fromkeys(lead_ids))
+        state["results"] = {}
+        state["sending"] = []
+        await ctx.checkpoint()
+
+    results = state["results"]
+    for lead_id in state["sending"]:
+        results.setdefault(
+            lead_id,
+            {"status": "unknown", "detail": "Interrupted while sending, not resent"},
+        )
+    sending = state["sending"] = []
+
+    progress = {"total": len(state["lead_ids"]), "done": len(results)}
+    for status, counter in COUNTERS.items():
+        progress[counter] = sum(1 for r in results.values() if r["status"] == status)
+    throttle = TokenBucket(params["rate"], 1) if params.get("rate") else None
+    queue: asyncio.Queue = asyncio.Queue()
+    for lead_id in state["lead_ids"]:
+        if lead_id not in results:
+            queue.put_nowait(lead_id)
+
+    async def worker():
+        while not queue.empty():
+            lead_id = queue.get_nowait()
+            if throttle is not None:
+                await throttle.acquire()
+            sending.append(lead_id)
+            result = await _send(kind, send, client, lead_id, payload)
+            sending.remove(lead_id)
+            results[lead_id] = result
+            progress["done"] += 1
+            progress[COUNTERS[result["status"]]] += 1
+            await ctx.report(**progress)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(params["concurrency"])]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    await ctx.report(**progress)
+    return {**progress, "results": results}
+
+
+async def _create_message(client, lead_id: str, message: Dict[str, Any]):
+    await client.create_message(lead_id, message["message"], message.get("type"))
+
+
+async def _create_activity(client, lead_id: str, activity: Dict[str, Any]):
+    await client.create_activity(
+        lead_id, activity["type"], activity["description"], activity.get("date")
+    )
+
+
+async def send_messages(ctx: JobContext) -> Dict[str, Any]:
+    """Job handler: add the message to every selected lead"""
+    return await _broadcast(ctx, BULK_MESSAGE, _create_message, ctx.params["message"])
+
+
+async def send_activities(ctx: JobContext) -> Dict[str, Any]:
+    """Job handler: log the activity on every selected lead"""
+    return await _broadcast(
+        ctx, BULK_ACTIVITY, _create_activity, ctx.params["activity"]
+    )
+
+
+jobs.register(BULK_MESSAGE, send_messages, BulkMessageCreate)
+jobs.register(BULK_ACTIVITY, send_activities, BulkActivityCreate)
@@ -0,0 +1,389 @@
+"""
+Caches for C2S data: reference resources (sellers, tags, queues),
+short-lived lead records and lead list responses
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from app.core.config import settings
+from app.core.coordination import coordinator
+from app.core.metrics import metrics
+from app.core.shutdown import drainer
+from app.core.tenants import detached_task
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+
+class CacheEntry:
+    """Cached value with the wall-clock time it was fetched"""
+
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class ReferenceCache:
+    """
+    TTL cache with stale-while-revalidate semantics
+
+    Fresh entries are returned directly. Expired entries are still returned
+    while a single background refresh runs, so callers never wait on upstream
+    once a value has been seen (including values restored from a snapshot).
+    Missing keys are loaded once even when requested concurrently.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return cached value for key, loading or refreshing it as needed"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return await asyncio.shield(self._start_fetch(key, loader))
+
+        if time.time() - entry.fetched_at >= self.ttl:
+            self._start_fetch(key, loader)
+        return entry.value
+
+    async def refresh(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Reload key now, keeping the current value visible until it lands"""
+        return await asyncio.shield(self._start_fetch(key, loader))
+
+    def _start_fetch(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        """Start (or join) the single in-flight fetch for key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = drainer.track(detached_task(self._fetch(key, loader)))
+            task.add_done_callback(self._fetch_done)
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self._entries[key] = CacheEntry(value, time.time())
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _fetch_done(task: asyncio.Task):
+        """Log background refresh failures so they are not silently dropped"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Reference cache refresh failed: %s", task.exception())
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Return cached value without triggering a load"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def invalidate(self, key: str):
+        """Drop a single key"""
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        """Drop every key starting with prefix"""
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ========== SNAPSHOT PERSISTENCE ==========
+
+    def save(self, path: str) -> int:
+        """Atomically write all entries to a JSON snapshot, returning the count"""
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": time.time(),
+            "entries": {
+                key: {"value": entry.value, "fetched_at": entry.fetched_at}
+                for key, entry in self._entries.items()
+            },
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(data["entries"])
+
+    def load(self, path: str) -> int:
+        """Restore entries from a snapshot, returning how many were loaded"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable cache snapshot %s: %s", path, e)
+            return 0
+
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning(
+                "Ignoring cache snapshot with version %s", data.get("version")
+            )
+            return 0
+
+        for key, raw in data.get("entries", {}).items():
+            # Snapshot entries keep their original fetch time, so anything
+            # older than the TTL is served stale and refreshed in background.
+            self._entries.setdefault(key, CacheEntry(raw["value"], raw["fetched_at"]))
+        return len(data.get("entries", {}))
+
+
+class TTLCache:
+    """Strict TTL cache with LRU eviction for short-lived upstream records"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh value or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.fetched_at >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entries if full"""
+        self._entries[key] = CacheEntry(value, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        """Drop a single key"""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseEntry:
+    """Cached response with its size and the record ids it contains"""
+
+    __slots__ = ("value", "fetched_at", "size", "tags", "volatile")
+
+    def __init__(
+        self, value: Any, fetched_at: float, size: int, tags: Set[str], volatile: bool
+    ):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.size = size
+        self.tags = tags
+        self.volatile = volatile
+
+
+class ResponseCache:
+    """
+    Stale-while-revalidate cache of query responses, bounded in bytes
+
+    Responses younger than ttl are served directly. Until ttl + stale they
+    are still served while one background refresh runs; older or missing
+    keys are loaded, once even when requested concurrently. The least
+    recently used responses are evicted to stay within max_bytes (sizes are
+    measured as compact JSON).
+
+    Each response is tagged with the record ids it contains. invalidate()
+    drops responses containing a written record and responses marked
+    volatile (queries whose matches a write can change), and discards
+    fetches already in flight so they cannot store pre-write data.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale: float,
+        max_bytes: int,
+        tags_of: Callable[[Any], Iterable[str]],
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_bytes = max_bytes
+        self.tags_of = tags_of
+        self.bytes = 0
+        self._entries: "OrderedDict[str, ResponseEntry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._discarded: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Any]], volatile: bool
+    ) -> Any:
+        """Return the cached response for key, loading or refreshing as needed"""
+        entry = self._entries.get(key)
+        age = time.time() - entry.fetched_at if entry is not None else None
+        if age is not None and age < self.ttl + self.stale:
+            self._entries.move_to_end(key)
+            if age >= self.ttl:
+                metrics.incr("response_cache", result="stale")
+                self._start_fetch(key, loader, volatile)
+            else:
+                metrics.incr("response_cache", result="hit")
+            return entry.value
+        metrics.incr("response_cache", result="miss")
+        return await asyncio.shield(self._start_fetch(key, loader, volatile))
+
+    def _start_fetch(
+        self, key: str, loader: Callable[[], Awaitable[Any]], volatile: bool
+    ) -> asyncio.Task:
+        """Start (or join) the single in-flight fetch for key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = drainer.track(detached_task(self._fetch(key, loader, volatile)))
+            task.add_done_callback(self._fetch_done)
+            self._inflight[key] = task
+        return task
+
+    @staticmethod
+    def _fetch_done(task: asyncio.Task):
+        """Count and log failed fetches, including background refreshes"""
+        if not task.cancelled() and task.exception() is not None:
+            metrics.incr("response_cache", result="error")
+            logger.warning("Lead list cache fetch failed: %s", task.exception())
+
+    async def _fetch(
+        self, key: str, loader: Callable[[], Awaitable[Any]], volatile: bool
+    ) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            if task not in self._discarded:
+                self._store(key, value, volatile)
+            return value
+        finally:
+            self._discarded.discard(task)
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _store(self, key: str, value: Any, volatile: bool):
+        size = len(json.dumps(value, separators=(",", ":"), ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        tags = set(self.tags_of(value))
+        self._entries[key] = ResponseEntry(value, time.time(), size, tags, volatile)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            metrics.incr("response_cache_evictions")
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def invalidate(self, prefix: str, tag: Optional[str] = None):
+        """
+        Drop responses under prefix affected by a write
+
+        With a tag, only volatile responses and those containing the tag are
+        dropped; without one, every response under prefix is.
+        """
+        for key, entry in list(self._entries.items()):
+            if key.startswith(prefix) and (
+                tag is None or entry.volatile or tag in entry.tags
+            ):
+                self._drop(key)
+        for key, task in list(self._inflight.items()):
+            if key.startswith(prefix):
+                self._discarded.add(task)
+                del self._inflight[key]
+
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def record_ids(response: Any) -> Iterable[str]:
+    """Ids of the records in a list response"""
+    data = response.get("data") if isinstance(response, dict) else None
+    if not isinstance(data, list):
+        return ()
+    return (str(item["id"]) for item in data if isinstance(item, dict) and "id" in item)
+
+
+# Global cache instances
+reference_cache = ReferenceCache(ttl=settings.reference_cache_ttl)
+lead_cache = TTLCache(
+    ttl=settings.lead_cache_ttl, max_entries=settings.lead_cache_size
+)
+lead_list_cache = ResponseCache(
+    ttl=settings.lead_list_cache_ttl,
+    stale=settings.lead_list_cache_stale,
+    max_bytes=settings.lead_list_cache_max_bytes,
+    tags_of=record_ids,
+)
+
+
+# ========== CLUSTER INVALIDATION ==========
+
+
+def apply_invalidation(message: Dict[str, Any]):
+    """Drop what an invalidation message names from this machine's caches"""
+    cache, key = message.get("cache"), message.get("key", "")
+    if cache == "reference":
+        if message.get("prefix"):
+            reference_cache.invalidate_prefix(key)
+        else:
+            reference_cache.invalidate(key)
+    elif cache == "lead":
+        lead_cache.invalidate(key)
+    elif cache == "lead_list":
+        lead_list_cache.invalidate(key, message.get("tag"))
+    elif cache == "all":
+        # Only the short-lived caches; reference data still expires by TTL
+        lead_cache.clear()
+        lead_list_cache.clear()
+
+
+def invalidate(cache: str, key: str, tag: Optional[str] = None, prefix: bool = False):
+    """Invalidate on this machine and broadcast it to the others"""
+    message: Dict[str, Any] = {"cache": cache, "key": key}
+    if tag is not None:
+        message["tag"] = tag
+    if prefix:
+        message["prefix"] = True
+    apply_invalidation(message)
+    coordinator.publish(message)
+
+
+coordinator.on_message(apply_invalidation)
@@ -0,0 +1,340 @@
+"""
+Campaign mapping store
+
+Maps Google Ads campaigns to the property they advertise, for lead
+enrichment. Campaigns live in a SQLite database (CAMPAIGNS_DB_PATH, under
+DATA_DIR) shared by every gateway process of the machine; writes run in an immediate transaction, and each
+campaign carries a version so concurrent editors can't overwrite each
+other. A store-wide revision counter is bumped on every write.
+
+Lookups never touch SQLite: they are served from an in-memory index by
+campaign_id, ad_group_id, form_id and prop_ref, rebuilt after a local write
+and whenever another process has moved the revision (checked every
+CAMPAIGN_REFRESH_INTERVAL seconds). ad_group_id and form_id belong to at
+most one campaign; several campaigns may advertise the same prop_ref.
+
+A new store is seeded once from CAMPAIGN_SEED_PATH (campaign_mapping.json);
+a 'seeded' flag in campaign_meta keeps campaigns deleted later from coming
+back at the next start.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.errors import GatewayError
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_ID = "campaign_id"
+AD_GROUP_ID = "ad_group_id"
+FORM_ID = "form_id"
+PROP_REF = "prop_ref"
+# Unique keys, in the order enrichment tries them
+UNIQUE_KEYS = (CAMPAIGN_ID, AD_GROUP_ID, FORM_ID)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS campaign_keys (
+    key_type TEXT NOT NULL,
+    key TEXT NOT NULL,
+    campaign_id TEXT NOT NULL,
+    PRIMARY KEY (key_type, key, campaign_id)
+);
+CREATE INDEX IF NOT EXISTS campaign_keys_campaign ON campaign_keys (campaign_id);
+CREATE TABLE IF NOT EXISTS campaign_meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO campaign_meta (name, value) VALUES ('revision', 0);
+"""
+
+
+class CampaignNotFound(GatewayError):
+    """No campaign with that id"""
+
+    status_code = 404
+
+
+class CampaignConflict(GatewayError):
+    """Stale version, or an ad group / form id owned by another campaign"""
+
+    status_code = 409
+
+
+def campaign_keys(campaign_id: str, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(key_type, key) pairs a campaign is indexed under"""
+    keys = [(AD_GROUP_ID, str(key)) for key in data.get("ad_group_ids") or []]
+    keys += [(FORM_ID, str(key)) for key in data.get("form_ids") or []]
+    prop_ref = (data.get("property") or {}).get("prop_ref")
+    if prop_ref:
+        keys.append((PROP_REF, str(prop_ref)))
+    return keys
+
+
+class CampaignIndex:
+    """Immutable snapshot of the catalog with O(1) lookups"""
+
+    def __init__(self, revision: int, records: Iterable[Dict[str, Any]]):
+        self.revision = revision
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.unique: Dict[str, Dict[str, str]] = {AD_GROUP_ID: {}, FORM_ID: {}}
+        self.by_prop_ref: Dict[str, List[str]] = {}
+        for record in records:
+            campaign_id = record["campaign_id"]
+            self.by_id[campaign_id] = record
+            for key_type, key in campaign_keys(campaign_id, record["data"]):
+                if key_type == PROP_REF:
+                    self.by_prop_ref.setdefault(key, []).append(campaign_id)
+                else:
+                    self.unique[key_type][key] = campaign_id
+
+    def find(self, key_type: str, key: str) -> List[Dict[str, Any]]:
+        if key_type == CAMPAIGN_ID:
+            ids = [key]
+        elif key_type == PROP_REF:
+            ids = self.by_prop_ref.get(key, [])
+        else:
+            ids = [self.unique[key_type].get(key)]
+        return [self.by_id[i] for i in ids if i in self.by_id]
+
+
+class CampaignStore:
+    """SQLite-backed campaign catalog with an in-memory lookup index"""
+
+    def __init__(self, path: str, seed_path: str = ""):
+        self.path = path
+        self.seed_path = seed_path
+        self.index = CampaignIndex(0, [])
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ========== SQLITE (blocking, call off the event loop) ==========
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(
+                self.path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def _revision(self, db: sqlite3.Connection) -> int:
+        row = db.execute("SELECT value FROM campaign_meta WHERE name = 'revision'")
+        return row.fetchone()[0]
+
+    def _load(self, db: sqlite3.Connection) -> CampaignIndex:
+        rows = db.execute("SELECT * FROM campaigns ORDER BY campaign_id")
+        records = [
+            {
+                "campaign_id": row["campaign_id"],
+                "version": row["version"],
+                "updated_at": row["updated_at"],
+                "data": json.loads(row["data"]),
+            }
+            for row in rows
+        ]
+        return CampaignIndex(self._revision(db), records)
+
+    def _write(self, db: sqlite3.Connection, campaign_id: str, data: Dict[str, Any]):
+        """Insert or replace one campaign and its keys (inside a transaction)"""
+        keys = campaign_keys(campaign_id, data)
+        for key_type, key in keys:
+            if key_type == PROP_REF:
+                continue
+            owner = db.execute(
+                "SELECT campaign_id FROM campaign_keys WHERE key_type = ? AND key = ?",
+                (key_type, key),
+            ).fetchone()
+            if owner is not None and owner[0] != campaign_id:
+                raise CampaignConflict(
+                    f"{key_type} {key} already belongs to campaign {owner[0]}"
+                )
+        row = db.execute(
+            "SELECT version FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()
+        version = row[0] + 1 if row else 1
+        db.execute(
+            "INSERT OR REPLACE INTO campaigns VALUES (?, ?, ?, ?)",
+            (campaign_id, json.dumps(data), version, time.time()),
+        )
+        db.execute("DELETE FROM campaign_keys WHERE campaign_id = ?", (campaign_id,))
+        db.executemany(
+            "INSERT INTO campaign_keys VALUES (?, ?, ?)",
+            [(key_type, key, campaign_id) for key_type, key in keys],
+        )
+
+    def _transaction(self, fn, *args):
+        """Run fn(db, *args) in a write transaction and return the new index"""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                fn(db, *args)
+                db.execute(
+                    "UPDATE campaign_meta SET value = value + 1 WHERE name = 'revision'"
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self.index = self._load(db)
+            return self.index
+
+    def open(self):
+        """Create the schema, seed a new store and build the index"""
+        with self._lock:
+            db = self._connect()
+            seeded = db.execute(
+                "SELECT 1 FROM campaign_meta WHERE name = 'seeded'"
+            ).fetchone()
+            # Stores created before the flag existed count as seeded once used
+            empty = db.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0] == 0
+        if seeded is None:
+            if empty and self.seed_path:
+                self.import_file(self.seed_path)
+            with self._lock:
+                db.execute(
+                    "INSERT OR IGNORE INTO campaign_meta (name, value) "
+                    "VALUES ('seeded', 1)"
+                )
+        with self._lock:
+            self.index = self._load(db)
+
+    def import_file(self, path: str) -> int:
+        """Add campaigns from a campaign_mapping.json file missing from the store"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                campaigns = json.load(f).get("google_ads_campaigns", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read campaign mapping %s: %s", path, e)
+            return 0
+
+        def insert(db: sqlite3.Connection):
+            for campaign_id, data in campaigns.items():
+                exists = db.execute(
+                    "SELECT 1 FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+                ).fetchone()
+                if not exists:
+                    self._write(db, campaign_id, data)
+
+        self._transaction(insert)
+        logger.info("Imported %d campaigns from %s", len(campaigns), path)
+        return len(campaigns)
+
+    def refresh(self) -> bool:
+        """Rebuild the index if another process changed the catalog"""
+        with self._lock:
+            db = self._connect()
+            if self._revision(db) == self.index.revision:
+                return False
+            self.index = self._load(db)
+        metrics.incr("campaign_index_reloads")
+        return True
+
+    def put(
+        self,
+        campaign_id: str,
+        data: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Create or replace a campaign, optionally only at expected_version"""
+
+        def write(db: sqlite3.Connection):
+            self._check_version(db, campaign_id, expected_version)
+            self._write(db, campaign_id, data)
+
+        return self._transaction(write).by_id[campaign_id]
+
+    def delete(self, campaign_id: str, expected_version: Optional[int] = None):
+        def remove(db: sqlite3.Connection):
+            if self._check_version(db, campaign_id, expected_version) is None:
+                raise CampaignNotFound(f"Campaign {campaign_id} not found")
+            db.execute("DELETE FROM campaigns WHERE campaign_id = ?", (campaign_id,))
+            db.execute(
+                "DELETE FROM campaign_keys WHERE campaign_id = ?", (campaign_id,)
+            )
+
+        self._transaction(remove)
+
+    def _check_version(
+        self, db: sqlite3.Connection, campaign_id: str, expected: Optional[int]
+    ) -> Optional[int]:
+        row = db.execute(
+            "SELECT version FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()
+        current = row[0] if row else None
+        if expected is not None and expected != (current or 0):
+            raise CampaignConflict(
+                f"Campaign {campaign_id} is at version {current or 0}, not {expected}"
+            )
+        return current
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ========== LOOKUPS (in memory) ==========
+
+    def get(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        return self.index.by_id.get(campaign_id)
+
+    def find(self, key_type: str, key: str) -> List[Dict[str, Any]]:
+        """Campaigns indexed under a campaign/ad group/form id or prop_ref"""
+        return self.index.find(key_type, str(key))
+
+    def match(self, lead: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Campaign a Google Ads lead came from, by the first known id"""
+        aliases = {AD_GROUP_ID: ("ad_group_id", "adgroup_id")}
+        for key_type in UNIQUE_KEYS:
+            for field in aliases.get(key_type, (key_type,)):
+                if lead.get(field):
+                    found = self.find(key_type, lead[field])
+                    if found:
+                        return found[0]
+        return None
+
+    def list(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        records = list(self.index.by_id.values())
+        return records[offset : offset + limit]
+
+    # ========== LIFECYCLE ==========
+
+    async def start(self):
+        await asyncio.to_thread(self.open)
+        logger.info("Campaign store: %d campaigns", len(self.index.by_id))
+        self._task = asyncio.ensure_future(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(settings.campaign_refresh_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except sqlite3.Error as e:
+                logger.warning("Campaign index refresh failed: %s", e)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        await asyncio.to_thread(self.close)
+
+
+# Global campaign store
+campaign_store = CampaignStore(settings.campaigns_db_path, settings.campaign_seed_path)
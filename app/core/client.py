@@ -2,27 +2,109 @@
 Contact2Sale API Client
 """
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import httpx
 
+from app.core import deadlines, tracing
+from app.core.admission import admission
+from app.core.assignment import ROUND_ROBIN, seller_selector
+from app.core.cache import invalidate, lead_cache, lead_list_cache, reference_cache
 from app.core.config import settings
+from app.core.hedging import hedger
+from app.core.metrics import metrics
+from app.core.priority import BULK, REALTIME, current_priority
+from app.core.quota import quota
+from app.core.ratelimit import TokenBucket
+from app.core.recorder import recorder
+from app.core.tagindex import created_tag_id, normalize, tag_ids, tag_index
+from app.core.tenants import current_tenant
 
 logger = logging.getLogger(__name__)
 
+# Path segments containing a digit are treated as resource ids
+_ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+# Lead id of endpoints that act on a single lead
+_LEAD_ENDPOINT = re.compile(r"^/integration/leads/([^/]+)")
+
+
+# Lead list params a write to an already listed lead can change the matches of
+_VOLATILE_LIST_PARAMS = (
+    "updated_gte",
+    "updated_lt",
+    "status",
+    "phone",
+    "email",
+    "tags",
+)
+
+
+def lead_list_key(params: Dict[str, Any]) -> Tuple[str, bool]:
+    """Normalized cache key of a lead list query, and whether it is volatile"""
+    parts = []
+    for name, value in sorted(params.items()):
+        if name.endswith(("_gte", "_lt")):
+            try:
+                parsed = datetime.fromisoformat(str(value))
+                if parsed.tzinfo is not None:
+                    parsed = parsed.astimezone(timezone.utc)
+                value = parsed.isoformat()
+            except ValueError:
+                pass
+        parts.append(f"{name}={value}")
+    volatile = any(name in params for name in _VOLATILE_LIST_PARAMS) or (
+        "updated" in str(params.get("sort", ""))
+    )
+    return "&".join(parts), volatile
+
+
+def endpoint_group(method: str, endpoint: str) -> str:
+    """Collapse an endpoint to a low-cardinality group, e.g. 'GET /leads/:id'"""
+    path = endpoint.replace("/integration", "", 1)
+    return f"{method} {_ID_SEGMENT.sub('/:id', path)}"
+
 
 class C2SClient:
-    """Contact2Sale API client for all API operations"""
+    """Contact2Sale API client for all API operations of one tenant"""
 
-    def __init__(self):
+    def __init__(self, tenant: Optional[str] = None):
+        self.tenant = tenant or settings.default_tenant
+        config = settings.tenant_config(self.tenant)
         self.base_url = settings.c2s_base_url
-        self.token = settings.c2s_token
+        self.token = config["token"]
+        self.rate_limiter = TokenBucket(
+            config["rate_limit"], config["rate_burst"], shared_key=f"rate:{self.tenant}"
+        )
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
         }
-        logger.info(f"C2S Client initialized with base URL: {self.base_url}")
+        # Created lazily so importing the app never opens sockets
+        self._http: Optional[httpx.AsyncClient] = None
+        logger.info(
+            "C2S Client initialized for tenant %s with base URL: %s",
+            self.tenant,
+            self.base_url,
+        )
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client, creating it on first use"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=settings.c2s_max_connections,
+                    max_keepalive_connections=settings.c2s_max_keepalive_connections,
+                ),
+                timeout=30.0,
+            )
+        return self._http
 
     async def _request(
         self,
@@ -30,24 +112,160 @@ class C2SClient:
         endpoint: str,
         params: Optional[Dict[str, Any]] = None,
         json_data: Optional[Dict[str, Any]] = None,
+        hedge: bool = False,
+        priority: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Make HTTP request to C2S API"""
-        url = f"{self.base_url}{endpoint}"
+        """
+        Make HTTP request to C2S API
 
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"{method} {url} - Params: {params} - Data: {json_data}")
+        hedge marks idempotent reads that may be hedged when HEDGE_ENABLED is set.
+        priority pins the lane; otherwise the request's lane is used.
+        """
+        url = f"{self.base_url}{endpoint}"
+        group = endpoint_group(method, endpoint)
+        client = self._get_http_client()
+        profile = deadlines.profile_for(group)
+        lane = priority or current_priority.get()
+        quota.check(self.tenant, lane)
+
+        logger.debug("%s %s - Params: %s - Data: %s", method, url, params, json_data)
+
+        async def send() -> Dict[str, Any]:
+            with tracing.span("upstream", group=group) as upstream:
+                attempt_started = time.perf_counter()
+                available = deadlines.budget(profile.total)
+                quota.record(self.tenant, group, lane)
+                try:
+                    response = await client.request(
+                        method=method,
+                        url=url,
+                        params=params,
+                        json=json_data,
+                        headers=tracing.outbound_headers(),
+                        timeout=deadlines.httpx_timeout(profile, available),
+                        extensions={"trace": tracing.connection_tracer()},
+                    )
+                finally:
+                    if hedge:
+                        # Every attempt sets the hedge delay. Attempts that
+                        # failed or lost to a hedge count the time they ran,
+                        # a lower bound, so slow reads are not left out.
+                        hedger.observe(group, time.perf_counter() - attempt_started)
+                if upstream is not None:
+                    upstream.attrs["status"] = response.status_code
+                if recorder.enabled:
+                    recorder.upstream(
+                        method,
+                        endpoint,
+                        params,
+                        response.status_code,
+                        response.content,
+                        attempt_started,
+                    )
+                response.raise_for_status()
+                return response.json()
+
+        def start_hedge() -> Optional[asyncio.Future]:
+            """The backup attempt, holding its own admission slots and token"""
+            release = admission.try_admit(group, lane)
+            if release is None:
+                return None
+            if not self._admit_hedge():
+                release()
+                return None
+            attempt = asyncio.ensure_future(send())
+            attempt.add_done_callback(lambda _: release())
+            return attempt
+
+        async def call() -> Dict[str, Any]:
+            # Wait for the tenant's token first: a slot is only held while
+            # the request can go out, so one throttled tenant cannot pin them
+            await self.rate_limiter.acquire()
+            async with admission.admit(group, lane):
+                if hedge and hedger.enabled:
+                    return await hedger.run(group, send, start_hedge)
+                return await send()
+
+        started = time.monotonic()
+        try:
+            with tracing.span("c2s", group=group, lane=lane, tenant=self.tenant):
+                result = await deadlines.run_within(call(), group)
+            if method != "GET":
+                self._after_write(endpoint)
+            return result
+        except Exception:
+            metrics.incr("upstream_errors", group=group)
+            raise
+        finally:
+            metrics.observe("upstream_seconds", time.monotonic() - started, group=group)
+
+    def _admit_hedge(self) -> bool:
+        """Hedges are the first extra traffic dropped as the quota runs low"""
+        return quota.allows(self.tenant, BULK) and self.rate_limiter.try_acquire()
+
+    def _after_write(self, endpoint: str):
+        """Invalidate cached records touched by a successful write"""
+        match = _LEAD_ENDPOINT.match(endpoint)
+        if match:
+            self._forget_lead(match.group(1))
+        elif endpoint == "/integration/leads":
+            # A new lead can appear in any list
+            invalidate("lead_list", self._cache_key("leads:"))
+
+    def _forget_lead(self, lead_id: str):
+        invalidate("lead", self._cache_key(f"lead:{lead_id}"))
+        invalidate("lead_list", self._cache_key("leads:"), lead_id)
+
+    def _cache_key(self, key: str) -> str:
+        """Namespace a reference cache key by tenant"""
+        return f"{self.tenant}:{key}"
+
+    async def _cached(self, key: str, method: str, endpoint: str) -> Dict[str, Any]:
+        """GET a reference resource through the shared reference cache"""
+        with tracing.span("cache", key=key):
+            return await reference_cache.get_or_load(
+                self._cache_key(key), lambda: self._request(method, endpoint)
+            )
 
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                params=params,
-                json=json_data,
-                timeout=30.0,
+    def _invalidate(self, key: str):
+        """Drop one of this tenant's reference cache keys"""
+        invalidate("reference", self._cache_key(key))
+
+    # ========== LIFECYCLE ==========
+
+    async def startup(self):
+        """Open the connection pool and warm reference data in background"""
+        self._get_http_client()
+        if settings.prewarm_on_startup:
+            asyncio.ensure_future(self.warm())
+
+    async def warm(self):
+        """Refresh reference data, opening upstream connections as a side effect"""
+        results = await asyncio.gather(
+            self._refresh("sellers", "/integration/sellers"),
+            self._refresh("tags", "/integration/tags"),
+            self._refresh("queues", "/integration/distribution_queues"),
+            return_exceptions=True,
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning(
+                "Reference data warm-up failed for %d resources", len(failed)
             )
+        else:
+            logger.info("Reference data warm-up complete")
+
+    async def _refresh(self, key: str, endpoint: str):
+        """Force-reload one reference resource into the cache"""
+        await reference_cache.refresh(
+            self._cache_key(key), lambda: self._request("GET", endpoint)
+        )
 
-            response.raise_for_status()
-            return response.json()
+    async def close(self):
+        """Close pooled upstream connections"""
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
 
     # ========== LEADS MANAGEMENT ==========
 
@@ -64,8 +282,14 @@ class C2SClient:
         phone: Optional[str] = None,
         email: Optional[str] = None,
         tags: Optional[str] = None,
+        cached: bool = False,
     ) -> Dict[str, Any]:
-        """Retrieve leads with filtering and pagination"""
+        """
+        Retrieve leads with filtering and pagination
+
+        cached serves the page from the lead list response cache, possibly
+        stale for up to LEAD_LIST_CACHE_STALE seconds while it refreshes.
+        """
         params = {
             "page": page,
             "perpage": min(perpage, 50),  # Max 50 per page
@@ -90,15 +314,79 @@ class C2SClient:
         if tags:
             params["tags"] = tags
 
-        return await self._request("GET", "/integration/leads", params=params)
+        if cached and lead_list_cache.enabled:
+            query, volatile = lead_list_key(params)
+            with tracing.span("cache", key="leads"):
+                return await lead_list_cache.get_or_load(
+                    self._cache_key(f"leads:{query}"),
+                    lambda: self._request(
+                        "GET", "/integration/leads", params=params, hedge=True
+                    ),
+                    volatile,
+                )
+        return await self._request(
+            "GET", "/integration/leads", params=params, hedge=True
+        )
 
-    async def get_lead(self, lead_id: str) -> Dict[str, Any]:
-        """Get specific lead details"""
-        return await self._request("GET", f"/integration/leads/{lead_id}")
+    async def get_lead(self, lead_id: str, cached: bool = False) -> Dict[str, Any]:
+        """Get specific lead details, optionally from the short-lived lead cache"""
+        key = self._cache_key(f"lead:{lead_id}")
+        if cached:
+            with tracing.span("cache", key="lead", hit=False) as lookup:
+                hit = lead_cache.get(key)
+                if lookup is not None:
+                    lookup.attrs["hit"] = hit is not None
+            if hit is not None:
+                metrics.incr("lead_cache_hits")
+                return hit
+            metrics.incr("lead_cache_misses")
+        result = await self._request(
+            "GET", f"/integration/leads/{lead_id}", hedge=True
+        )
+        lead_cache.set(key, result)
+        return result
+
+    async def iter_leads(
+        self, lead_ids: Iterable[str], concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """
+        Fetch many leads, yielding (lead_id, lead, error) as each completes
+
+        Ids are deduplicated, cached leads are yielded first, and the rest
+        are fetched with at most `concurrency` requests in flight. A failed
+        lead yields its exception instead of aborting the batch.
+        """
+        pending = []
+        for lead_id in dict.fromkeys(lead_ids):
+            hit = lead_cache.get(self._cache_key(f"lead:{lead_id}"))
+            if hit is not None:
+                metrics.incr("lead_cache_hits")
+                yield lead_id, hit, None
+            else:
+                pending.append(lead_id)
+
+        semaphore = asyncio.Semaphore(concurrency or settings.lookup_concurrency)
+
+        async def fetch(lead_id: str):
+            async with semaphore:
+                try:
+                    return lead_id, await self.get_lead(lead_id), None
+                except Exception as e:
+                    return lead_id, None, e
+
+        tasks = [asyncio.ensure_future(fetch(lead_id)) for lead_id in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def create_lead(self, lead_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new lead"""
-        return await self._request("POST", "/integration/leads", json_data=lead_data)
+        return await self._request(
+            "POST", "/integration/leads", json_data=lead_data, priority=REALTIME
+        )
 
     async def update_lead(
         self, lead_id: str, lead_data: Dict[str, Any]
@@ -118,7 +406,9 @@ class C2SClient:
 
     async def get_lead_tags(self, lead_id: str) -> Dict[str, Any]:
         """Get tags associated with a lead"""
-        return await self._request("GET", f"/integration/leads/{lead_id}/tags")
+        return await self._request(
+            "GET", f"/integration/leads/{lead_id}/tags", hedge=True
+        )
 
     async def create_lead_tag(self, lead_id: str, tag_id: str) -> Dict[str, Any]:
         """Associate tag with lead"""
@@ -191,12 +481,16 @@ class C2SClient:
 
     async def create_tag(self, tag_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create company tag"""
-        return await self._request("POST", "/integration/tags", json_data=tag_data)
+        result = await self._request("POST", "/integration/tags", json_data=tag_data)
+        self._invalidate("tags")
+        return result
 
     async def get_tags(
         self, name: Optional[str] = None, autofill: Optional[bool] = None
     ) -> Dict[str, Any]:
         """List tags with optional filters"""
+        if not name and autofill is None:
+            return await self._cached("tags", "GET", "/integration/tags")
         params = {}
         if name:
             params["name"] = name
@@ -204,65 +498,142 @@ class C2SClient:
             params["autofill"] = autofill
         return await self._request("GET", "/integration/tags", params=params)
 
+    async def resolve_tags(
+        self, names: Iterable[str], create: bool = True
+    ) -> Dict[str, Optional[str]]:
+        """
+        Map tag names to tag ids through the tag name index
+
+        Missing tags are created when create is set, once per name even
+        under concurrent requests; otherwise their id is None.
+        """
+        tags = await self.get_tags()
+        resolved: Dict[str, Optional[str]] = {}
+        missing = []
+        for name in names:
+            tag_id = resolved[name] = tag_index.lookup(self.tenant, tags, name)
+            if tag_id is None and create:
+                missing.append(name)
+
+        created = await asyncio.gather(
+            *(
+                tag_index.create_once(
+                    self.tenant, name, lambda name=name: self._find_or_create_tag(name)
+                )
+                for name in missing
+            )
+        )
+        resolved.update(zip(missing, created))
+        return resolved
+
+    async def _find_or_create_tag(self, name: str) -> str:
+        """Id of a tag the index missed, creating it if C2S doesn't have it"""
+        found = tag_ids(await self.get_tags(name=name)).get(normalize(name))
+        if found is not None:
+            return found
+        tag_id = created_tag_id(await self.create_tag({"name": name}))
+        if tag_id is None:
+            raise ValueError(f"C2S did not return an id for new tag {name}")
+        metrics.incr("tags_created")
+        return tag_id
+
     # ========== SELLERS MANAGEMENT ==========
 
     async def get_sellers(self) -> Dict[str, Any]:
         """List all sellers"""
-        return await self._request("GET", "/integration/sellers")
+        return await self._cached("sellers", "GET", "/integration/sellers")
 
     async def create_seller(self, seller_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new seller"""
-        return await self._request(
+        result = await self._request(
             "POST", "/integration/sellers", json_data=seller_data
         )
+        self._invalidate("sellers")
+        return result
 
     async def update_seller(
         self, seller_id: str, seller_data: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Update seller configuration"""
-        return await self._request(
+        result = await self._request(
             "PUT", f"/integration/sellers/{seller_id}", json_data=seller_data
         )
+        self._invalidate("sellers")
+        invalidate("reference", self._cache_key("queue_sellers:"), prefix=True)
+        return result
 
     # ========== DISTRIBUTION QUEUES ==========
 
     async def get_distribution_queues(self) -> Dict[str, Any]:
         """List all distribution queues"""
-        return await self._request("GET", "/integration/distribution_queues")
+        return await self._cached("queues", "GET", "/integration/distribution_queues")
 
     async def redistribute_lead(
         self, queue_id: str, lead_id: str, seller_id: str
     ) -> Dict[str, Any]:
         """Reassign lead in distribution queue"""
-        return await self._request(
+        result = await self._request(
             "POST",
             f"/integration/distribution_queues/{queue_id}/redistribute",
             json_data={"lead_id": lead_id, "seller_id": seller_id},
         )
+        self._forget_lead(lead_id)
+        return result
+
+    async def assign_lead(
+        self,
+        lead_id: str,
+        queue_id: str,
+        strategy: str = ROUND_ROBIN,
+        exclude: Iterable[str] = (),
+    ) -> Dict[str, Any]:
+        """Pick a seller from the queue locally and forward the lead to them"""
+        sellers = await self.get_queue_sellers(queue_id)
+        seller_id = seller_selector.pick(
+            self.tenant, queue_id, sellers, strategy, exclude
+        )
+        try:
+            result = await self.forward_lead(lead_id, seller_id)
+        except BaseException:
+            seller_selector.release(self.tenant, queue_id, seller_id)
+            raise
+        return {
+            "lead_id": lead_id,
+            "queue_id": queue_id,
+            "seller_id": seller_id,
+            "strategy": strategy,
+            "result": result,
+        }
 
     async def get_queue_sellers(self, queue_id: str) -> Dict[str, Any]:
         """Get sellers in distribution queue"""
-        return await self._request(
-            "GET", f"/integration/distribution_queues/{queue_id}/sellers"
+        return await self._cached(
+            f"queue_sellers:{queue_id}",
+            "GET",
+            f"/integration/distribution_queues/{queue_id}/sellers",
         )
 
     async def update_seller_priority(
         self, queue_id: str, seller_id: str, priority: int
     ) -> Dict[str, Any]:
         """Update seller priority in queue"""
-        return await self._request(
+        result = await self._request(
             "POST",
             f"/integration/distribution_queues/{queue_id}/priority",
             json_data={"seller_id": seller_id, "priority": priority},
         )
+        self._invalidate(f"queue_sellers:{queue_id}")
+        return result
 
     async def set_next_seller(self, queue_id: str, seller_id: str) -> Dict[str, Any]:
         """Define next seller in queue"""
-        return await self._request(
+        result = await self._request(
             "POST",
             f"/integration/distribution_queues/{queue_id}/next_seller",
             json_data={"seller_id": seller_id},
         )
+        self._invalidate(f"queue_sellers:{queue_id}")
+        return result
 
     # ========== DISTRIBUTION RULES ==========
 
@@ -301,5 +672,42 @@ class C2SClient:
         )
 
 
-# Global client instance
-c2s_client = C2SClient()
+class TenantClients:
+    """Registry of per-tenant clients, each with its own pool and rate budget"""
+
+    def __init__(self):
+        self._clients: Dict[str, C2SClient] = {}
+
+    def get(self, tenant: Optional[str] = None) -> C2SClient:
+        """Return the client for a tenant, creating it on first use"""
+        tenant = tenant or current_tenant.get()
+        client = self._clients.get(tenant)
+        if client is None:
+            client = self._clients[tenant] = C2SClient(tenant)
+        return client
+
+    def active(self) -> List[C2SClient]:
+        """Clients created so far"""
+        return list(self._clients.values())
+
+    async def startup(self):
+        """Open pools and warm reference data for every configured tenant"""
+        for tenant in settings.tenant_names():
+            await self.get(tenant).startup()
+
+    async def close(self):
+        """Close every tenant's connection pool"""
+        for client in self.active():
+            await client.close()
+
+
+class TenantClientProxy:
+    """Forwards calls to the client of the tenant bound to the current request"""
+
+    def __getattr__(self, name: str):
+        return getattr(tenant_clients.get(), name)
+
+
+# Global client registry and request-scoped client
+tenant_clients = TenantClients()
+c2s_client = TenantClientProxy()
@@ -2,6 +2,9 @@
 Configuration management for C2S Gateway
 """
 
+import os
+from typing import Any, Dict
+
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings
 
@@ -13,6 +16,292 @@ class Settings(BaseSettings):
     c2s_base_url: str = Field(..., description="Contact2Sale API base URL")
     c2s_gateway_port: int = Field(default=8001, description="Gateway server port")
 
+    # Persistent state
+    data_dir: str = Field(
+        default="/tmp",
+        description="Directory relative snapshot and state paths are placed in",
+    )
+
+    # Connection pool and cold start
+    c2s_max_connections: int = Field(
+        default=20, description="Max open connections to the C2S API"
+    )
+    c2s_max_keepalive_connections: int = Field(
+        default=10, description="Max idle keep-alive connections to the C2S API"
+    )
+    prewarm_on_startup: bool = Field(
+        default=True,
+        description="Open upstream connections and refresh reference data at startup",
+    )
+    reference_cache_ttl: float = Field(
+        default=300.0,
+        description="Seconds before cached sellers/tags/queues are refreshed",
+    )
+    lead_cache_ttl: float = Field(
+        default=30.0, description="Seconds a fetched lead may be served from cache"
+    )
+    lead_cache_size: int = Field(
+        default=5000, description="Max leads kept in the lead cache"
+    )
+    lead_list_cache_ttl: float = Field(
+        default=10.0,
+        description="Seconds a GET /leads response is served fresh (0 = off)",
+    )
+    lead_list_cache_stale: float = Field(
+        default=60.0,
+        description="Further seconds it is served stale while refreshed in background",
+    )
+    lead_list_cache_max_bytes: int = Field(
+        default=16 * 1024 * 1024, description="Memory bound of cached GET /leads pages"
+    )
+    lookup_concurrency: int = Field(
+        default=10, description="Parallel upstream fetches per batch lead lookup"
+    )
+    lead_range_concurrency: int = Field(
+        default=4, description="Parallel upstream pages per GET /leads/range call"
+    )
+    cache_snapshot_path: str = Field(
+        default="c2s-gateway-cache.json",
+        description="Reference cache snapshot written at shutdown, read at startup",
+    )
+
+    # Multi-tenant
+    c2s_tenants: Dict[str, Any] = Field(
+        default_factory=dict,
+        description=(
+            "Extra tenants as JSON: {name: token} or "
+            "{name: {token, rate_limit, rate_burst, quota_hourly, quota_daily}}"
+        ),
+    )
+    default_tenant: str = Field(
+        default="default", description="Tenant name used for C2S_TOKEN"
+    )
+    tenant_header: str = Field(
+        default="X-C2S-Tenant", description="Request header selecting the tenant"
+    )
+    c2s_rate_limit: float = Field(
+        default=10.0, description="Upstream requests/second per tenant (0 = off)"
+    )
+    c2s_rate_burst: int = Field(
+        default=20, description="Upstream request burst size per tenant"
+    )
+
+    # Hedged reads
+    hedge_enabled: bool = Field(
+        default=False, description="Hedge slow idempotent reads (get_lead, get_leads)"
+    )
+    hedge_percentile: float = Field(
+        default=95.0, description="Latency percentile after which a read is hedged"
+    )
+    hedge_initial_delay: float = Field(
+        default=1.0, description="Hedge delay in seconds until latencies are known"
+    )
+    hedge_min_delay: float = Field(
+        default=0.05, description="Lower bound for the adaptive hedge delay"
+    )
+    hedge_max_rate: float = Field(
+        default=0.05, description="Max fraction of hedgeable reads that may hedge"
+    )
+
+    # Timeouts and deadlines
+    c2s_timeout_profiles: Dict[str, Dict[str, float]] = Field(
+        default_factory=dict,
+        description=(
+            "Timeout overrides as JSON: {group: {connect, read, total}}, "
+            'e.g. {"GET /leads/:id": {"total": 3}}'
+        ),
+    )
+    deadline_header: str = Field(
+        default="X-Request-Timeout-Ms",
+        description="Request header carrying the caller's remaining budget in ms",
+    )
+    default_request_timeout: float = Field(
+        default=0.0,
+        description="Deadline in seconds for requests without one (0 = none)",
+    )
+
+    # Admission control
+    max_concurrent_upstream: int = Field(
+        default=50, description="Max concurrent upstream calls across all tenants"
+    )
+    max_upstream_queue: int = Field(
+        default=200, description="Max calls waiting for a slot before shedding (503)"
+    )
+    c2s_group_concurrency: Dict[str, int] = Field(
+        default_factory=dict,
+        description='Per endpoint group limits as JSON, e.g. {"GET /leads": 5}',
+    )
+
+    # Priority lanes
+    priority_header: str = Field(
+        default="X-C2S-Priority",
+        description="Request header selecting the lane (realtime or bulk)",
+    )
+    c2s_route_priorities: Dict[str, str] = Field(
+        default_factory=dict,
+        description=(
+            'Default lane by route prefix as JSON, e.g. {"/leads/range": "bulk"}'
+        ),
+    )
+    lane_weights: Dict[str, int] = Field(
+        default_factory=lambda: {"realtime": 4, "bulk": 1},
+        description="Weighted fair share of freed upstream slots per lane",
+    )
+    bulk_max_share: float = Field(
+        default=0.5, description="Max fraction of upstream slots the bulk lane may hold"
+    )
+
+    # Lead change feed and inbound webhooks
+    feed_sync_interval: float = Field(
+        default=5.0, description="Seconds between upstream lead change syncs"
+    )
+    feed_sync_max_pages: int = Field(
+        default=20, description="Max pages of 50 leads pulled per sync cycle"
+    )
+    feed_idle_timeout: float = Field(
+        default=300.0, description="Stop syncing after this long without consumers"
+    )
+    feed_max_events: int = Field(
+        default=10000, description="Change events retained per tenant"
+    )
+    feed_state_path: str = Field(
+        default="c2s-gateway-feeds.json",
+        description="Sync watermarks written at shutdown, resumed at startup",
+    )
+    webhook_secret: str = Field(
+        default="", description="Shared secret required on inbound webhooks (optional)"
+    )
+
+    # Outbound webhook fan-out
+    fanout_subscribers_path: str = Field(
+        default="c2s-gateway-subscribers.json",
+        description="Where registered webhook subscribers are persisted",
+    )
+    fanout_timeout: float = Field(
+        default=10.0, description="Seconds to wait for a subscriber to accept a batch"
+    )
+    fanout_max_attempts: int = Field(
+        default=5, description="Delivery attempts per batch before it is dropped"
+    )
+    fanout_backoff_base: float = Field(
+        default=0.5, description="First retry delay in seconds (doubles per attempt)"
+    )
+    fanout_backoff_max: float = Field(
+        default=30.0, description="Max retry delay in seconds"
+    )
+
+    # Logging
+    log_level: str = Field(default="INFO", description="Root log level")
+    log_format: str = Field(default="json", description="json or text")
+    log_redact: bool = Field(
+        default=True, description="Mask emails and phone numbers in log lines"
+    )
+    log_sample_rates: Dict[str, float] = Field(
+        default_factory=dict,
+        description=(
+            "Fraction of sub-WARNING records kept per logger as JSON, "
+            'e.g. {"httpx": 0.01}'
+        ),
+    )
+    log_queue_size: int = Field(
+        default=10000, description="Records buffered for the log writer before dropping"
+    )
+
+    # Tracing
+    tracing_enabled: bool = Field(
+        default=True, description="Trace requests and add Server-Timing headers"
+    )
+    trace_buffer_size: int = Field(
+        default=200, description="Finished traces kept for GET /debug/traces"
+    )
+    trace_export_path: str = Field(
+        default="", description="JSON lines file finished traces are appended to"
+    )
+
+    # Background jobs
+    jobs_db_path: str = Field(
+        default="c2s-gateway-jobs.sqlite3",
+        description="SQLite database holding background jobs and their results",
+    )
+    job_concurrency: int = Field(
+        default=2, description="Background jobs run at the same time"
+    )
+
+    # Campaign mapping
+    campaigns_db_path: str = Field(
+        default="c2s-gateway-campaigns.sqlite3",
+        description="SQLite database holding the campaign catalog",
+    )
+    campaign_seed_path: str = Field(
+        default="campaign_mapping.json",
+        description="Mapping file imported when the campaign store is created",
+    )
+    campaign_refresh_interval: float = Field(
+        default=5.0, description="Seconds between checks for other workers' writes"
+    )
+
+    # Traffic recording
+    record_path: str = Field(
+        default="",
+        description="File anonymized request recordings are appended to (unset = off)",
+    )
+    record_sample_rate: float = Field(
+        default=1.0, ge=0, le=1, description="Fraction of requests recorded"
+    )
+    record_max_body: int = Field(
+        default=65536, description="Larger request bodies are recorded as truncated"
+    )
+
+    # Upstream quota
+    quota_hourly_budget: int = Field(
+        default=0, description="Upstream calls per tenant per rolling hour (0 = off)"
+    )
+    quota_daily_budget: int = Field(
+        default=0, description="Upstream calls per tenant per rolling day (0 = off)"
+    )
+    quota_bulk_cutoff: float = Field(
+        default=0.8,
+        ge=0,
+        le=1,
+        description="Share of a budget after which bulk calls and hedges are refused",
+    )
+    quota_state_path: str = Field(
+        default="c2s-gateway-quota.json",
+        description="Where quota counters are persisted",
+    )
+    quota_flush_interval: float = Field(
+        default=30.0, description="Seconds between quota counter flushes"
+    )
+
+    # Cluster coordination
+    coordination_url: str = Field(
+        default="",
+        description="redis://, rediss:// or unix:// server shared by all machines",
+    )
+    coordination_prefix: str = Field(
+        default="c2s-gateway:", description="Prefix of shared keys and channels"
+    )
+    coordination_timeout: float = Field(
+        default=0.5, description="Seconds before falling back to local state"
+    )
+
+    # Graceful shutdown
+    shutdown_grace: float = Field(
+        default=20.0,
+        description="Seconds after the stop signal to drain in-flight work",
+    )
+
+    # Diagnostics
+    debug_token: str = Field(
+        default="", description="X-Debug-Token for /debug endpoints (unset = disabled)"
+    )
+    loop_monitor_enabled: bool = Field(
+        default=True, description="Watch the event loop for blocking callbacks"
+    )
+    loop_lag_threshold: float = Field(
+        default=0.25, description="Seconds the loop may be blocked before it is logged"
+    )
+
     @validator("c2s_token")
     def validate_token(cls, v):
         """Validate C2S token is not empty"""
@@ -29,6 +318,54 @@ class Settings(BaseSettings):
             raise ValueError("C2S_BASE_URL must start with http:// or https://")
         return v.strip().rstrip("/")
 
+    @validator(
+        "cache_snapshot_path",
+        "feed_state_path",
+        "fanout_subscribers_path",
+        "jobs_db_path",
+        "campaigns_db_path",
+        "quota_state_path",
+        always=True,
+    )
+    def resolve_state_path(cls, v, values):
+        """Place relative state paths under DATA_DIR"""
+        return os.path.join(values["data_dir"], v) if v else v
+
+    @validator("c2s_tenants")
+    def validate_tenants(cls, v):
+        """Normalize tenant entries to {token, rate_limit, rate_burst} dicts"""
+        tenants = {}
+        for name, entry in (v or {}).items():
+            if isinstance(entry, str):
+                entry = {"token": entry}
+            if not isinstance(entry, dict):
+                raise ValueError(f"C2S_TENANTS[{name}] must be a token or an object")
+            token = (entry.get("token") or "").strip()
+            if not token:
+                raise ValueError(f"C2S_TENANTS[{name}] token cannot be empty")
+            tenants[name] = {**entry, "token": token}
+        return tenants
+
+    def tenant_config(self, tenant: str) -> Dict[str, Any]:
+        """Resolved token, rate and quota budgets for a tenant"""
+        if tenant == self.default_tenant:
+            entry = {"token": self.c2s_token}
+        else:
+            entry = self.c2s_tenants[tenant]
+        return {
+            "token": entry["token"],
+            "rate_limit": float(entry.get("rate_limit", self.c2s_rate_limit)),
+            "rate_burst": int(entry.get("rate_burst", self.c2s_rate_burst)),
+            "quota_hourly": int(entry.get("quota_hourly", self.quota_hourly_budget)),
+            "quota_daily": int(entry.get("quota_daily", self.quota_daily_budget)),
+        }
+
+    def tenant_names(self):
+        """All configured tenant names, default first"""
+        return [self.default_tenant] + [
+            t for t in self.c2s_tenants if t != self.default_tenant
+        ]
+
     class Config:
         env_file = ".env"
         case_sensitive = False
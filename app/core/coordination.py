@@ -0,0 +1,275 @@
+"""
+Cluster coordination between gateway machines
+
+Each machine used to enforce its own upstream rate limits and keep its own
+caches, so N machines sent N times the tenant's rate and could serve data
+another machine had already invalidated. With COORDINATION_URL set, the
+machines share:
+
+- rate limits: upstream tokens are taken from fixed windows of
+  burst / rate seconds counted on the server (SET NX PX + INCRBY, one
+  round-trip), so the whole cluster stays within the tenant's rate;
+- cache invalidations: every invalidation is published on a channel
+  and applied by the other machines, which also drop their short-lived
+  lead caches after reconnecting, since messages may have been missed.
+
+The backend speaks the Redis protocol over TCP (redis://, rediss://) or a
+local socket (unix://). Without a URL, or while the server is unreachable,
+everything falls back to in-process limits and local invalidation.
+`python -m app.core.resp serve` runs a small stand-in server with just
+the commands used here, for development and tests.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import secrets
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.resp import ConnectionClosed, RespConnection, RespError, read_reply
+from app.core.shutdown import drainer
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared rate window, so tiny bursts don't cost a round-trip each
+MIN_WINDOW = 0.1
+
+# Seconds to keep using local fallbacks after the server failed
+RETRY_AFTER_FAILURE = 5.0
+
+Message = Dict[str, Any]
+
+# Failures after which local state is used instead of the server
+CONNECTION_ERRORS = (OSError, EOFError, asyncio.TimeoutError, RespError)
+
+
+class Coordinator:
+    """In-process coordination: limits and invalidations stay on this machine"""
+
+    backend = "local"
+
+    def __init__(self):
+        self.node = os.environ.get("FLY_MACHINE_ID") or secrets.token_hex(6)
+        self._callbacks: List[Callable[[Message], None]] = []
+
+    @property
+    def shared(self) -> bool:
+        return False
+
+    def on_message(self, callback: Callable[[Message], None]):
+        """Call callback with every invalidation published by other machines"""
+        self._callbacks.append(callback)
+
+    def _deliver(self, message: Message):
+        for callback in self._callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.warning("Coordination message %s failed: %s", message, e)
+
+    async def take(
+        self, key: str, rate: float, burst: int, tokens: float = 1.0
+    ) -> Optional[float]:
+        """
+        Take tokens from a cluster-wide bucket
+
+        Returns 0 when granted, the seconds to wait before trying again, or
+        None when the caller should rely on its local bucket.
+        """
+        return None
+
+    def publish(self, message: Message):
+        """Send an invalidation to the other machines without waiting"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "node": self.node}
+
+
+class RespCoordinator(Coordinator):
+    """Coordination through a Redis-protocol server shared by all machines"""
+
+    backend = "redis"
+
+    def __init__(self, url: str, prefix: str, timeout: float):
+        super().__init__()
+        self.url = url
+        # Shown in logs and /health without credentials
+        parts = urlsplit(url)
+        self.display = parts.path if parts.scheme == "unix" else parts.hostname
+        if parts.port:
+            self.display = f"{self.display}:{parts.port}"
+        self.prefix = prefix
+        self.timeout = timeout
+        self.channel = f"{prefix}invalidate"
+        self._connection: Optional[RespConnection] = None
+        self._connecting: Optional[asyncio.Task] = None
+        self._down_until = 0.0
+        self._subscriber: Optional[asyncio.Task] = None
+        self._subscribed = False
+        self.fallbacks = 0
+
+    @property
+    def shared(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    async def _get_connection(self) -> RespConnection:
+        if self._connection is not None and self._connection.closed:
+            # Closed after a caller was cancelled mid-pipeline
+            self._connection = None
+        if self._connection is None:
+            # Concurrent callers share one connection attempt
+            if self._connecting is None or self._connecting.done():
+                self._connecting = asyncio.ensure_future(
+                    RespConnection.open(self.url)
+                )
+            self._connection = await asyncio.shield(self._connecting)
+        return self._connection
+
+    async def _execute(self, *commands: Sequence[Any]) -> Optional[List[Any]]:
+        """Run commands, or None (and fall back for a while) if the server fails"""
+        if not self.shared:
+            self.fallbacks += 1
+            return None
+        try:
+            connection = await asyncio.wait_for(self._get_connection(), self.timeout)
+            try:
+                return await asyncio.wait_for(
+                    connection.execute(*commands), self.timeout
+                )
+            except ConnectionClosed:
+                # Closed by a caller cancelled ahead of us; nothing was sent
+                connection = await asyncio.wait_for(
+                    self._get_connection(), self.timeout
+                )
+                return await asyncio.wait_for(
+                    connection.execute(*commands), self.timeout
+                )
+        except CONNECTION_ERRORS as e:
+            self._fail(e)
+            self.fallbacks += 1
+            return None
+
+    def _fail(self, e: Exception):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if time.monotonic() >= self._down_until:
+            logger.warning(
+                "Coordination server %s unavailable, using local state: %s",
+                self.display,
+                str(e) or type(e).__name__,
+            )
+        self._down_until = time.monotonic() + RETRY_AFTER_FAILURE
+        metrics.incr("coordination_errors")
+
+    async def take(
+        self, key: str, rate: float, burst: int, tokens: float = 1.0
+    ) -> Optional[float]:
+        window = max(burst / rate, MIN_WINDOW)
+        now = time.time()
+        index = int(now / window)
+        name = f"{self.prefix}{key}:{index}"
+        ttl_ms = int(window * 2000) + 1000
+        replies = await self._execute(
+            ["SET", name, "0", "PX", ttl_ms, "NX"],
+            ["INCRBY", name, math.ceil(tokens)],
+        )
+        if replies is None:
+            return None
+        count = replies[1]
+        if not isinstance(count, int):
+            self._fail(RespError(f"Unexpected INCRBY reply {count!r}"))
+            self.fallbacks += 1
+            return None
+        if count <= burst:
+            return 0.0
+        metrics.incr("coordination_rate_waits")
+        return (index + 1) * window - now
+
+    def publish(self, message: Message):
+        payload = json.dumps({**message, "origin": self.node})
+        drainer.track(
+            asyncio.ensure_future(self._execute(["PUBLISH", self.channel, payload]))
+        )
+
+    async def start(self):
+        self._subscriber = asyncio.ensure_future(self._subscribe_loop())
+
+    async def _subscribe_loop(self):
+        """Apply invalidations from other machines, reconnecting on failure"""
+        backoff = 1.0
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncio.wait_for(
+                    RespConnection.open(self.url), self.timeout
+                )
+                await connection.execute(["SUBSCRIBE", self.channel])
+                self._subscribed = True
+                backoff = 1.0
+                if connected_before:
+                    # Invalidations may have been missed while disconnected
+                    self._deliver({"cache": "all"})
+                connected_before = True
+                logger.info("Subscribed to cache invalidations on %s", self.display)
+                while True:
+                    reply = await read_reply(connection.reader)
+                    if isinstance(reply, list) and reply[:1] == [b"message"]:
+                        message = json.loads(reply[2])
+                        if message.get("origin") != self.node:
+                            metrics.incr("coordination_invalidations_received")
+                            self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except CONNECTION_ERRORS + (ValueError,) as e:
+                if self._subscribed or backoff == 1.0:
+                    logger.warning("Invalidation subscription lost: %s", e)
+                metrics.incr("coordination_errors")
+            finally:
+                self._subscribed = False
+                if connection is not None:
+                    connection.close()
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+
+    async def stop(self):
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "server": self.display,
+            "shared": self.shared,
+            "subscribed": self._subscribed,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def create_coordinator(url: str) -> Coordinator:
+    if not url:
+        return Coordinator()
+    return RespCoordinator(
+        url, settings.coordination_prefix, settings.coordination_timeout
+    )
+
+
+# Global coordinator
+coordinator = create_coordinator(settings.coordination_url)
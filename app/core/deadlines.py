@@ -0,0 +1,163 @@
+"""
+Per-endpoint timeout profiles and client deadline propagation
+
+Callers may send their remaining budget in the deadline header (milliseconds,
+X-Request-Timeout-Ms by default). The deadline is bound to the request
+context, caps every upstream timeout and sub-request, and the request is
+abandoned with 504 the moment it passes.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.errors import DeadlineExceeded, send_json_response
+
+
+class TimeoutProfile(NamedTuple):
+    """Connect, read and total timeouts in seconds for one endpoint group"""
+
+    connect: float
+    read: float
+    total: float
+
+
+# Keyed by endpoint group ("GET /leads/:id"), "<METHOD> *" or "default"
+DEFAULT_TIMEOUT_PROFILES: Dict[str, Dict[str, float]] = {
+    "default": {"connect": 3.0, "read": 15.0, "total": 20.0},
+    "GET *": {"connect": 2.0, "read": 8.0, "total": 10.0},
+    "GET /leads": {"connect": 2.0, "read": 12.0, "total": 15.0},
+    "GET /me": {"connect": 2.0, "read": 5.0, "total": 5.0},
+    "POST /leads": {"connect": 3.0, "read": 20.0, "total": 25.0},
+    "ibvi": {"connect": 2.0, "read": 8.0, "total": 10.0},
+}
+
+
+def _load_profiles() -> Dict[str, TimeoutProfile]:
+    merged = {**DEFAULT_TIMEOUT_PROFILES, **settings.c2s_timeout_profiles}
+    default = merged["default"]
+    return {
+        name: TimeoutProfile(
+            connect=float(p.get("connect", default["connect"])),
+            read=float(p.get("read", default["read"])),
+            total=float(p.get("total", default["total"])),
+        )
+        for name, p in merged.items()
+    }
+
+
+timeout_profiles = _load_profiles()
+
+# Monotonic deadline of the request being handled, if the caller set one
+current_deadline: ContextVar[Optional[float]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+def profile_for(group: str) -> TimeoutProfile:
+    """Timeout profile for an endpoint group"""
+    profile = timeout_profiles.get(group)
+    if profile is None:
+        method = group.split(" ", 1)[0]
+        profile = timeout_profiles.get(f"{method} *", timeout_profiles["default"])
+    return profile
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget(total: float) -> float:
+    """Seconds available for a call: its total timeout capped by the deadline"""
+    left = remaining()
+    if left is None:
+        return total
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(total, left)
+
+
+def httpx_timeout(profile: TimeoutProfile, available: float) -> httpx.Timeout:
+    """httpx timeout for a profile, with every phase capped by the budget"""
+    return httpx.Timeout(
+        connect=min(profile.connect, available),
+        read=min(profile.read, available),
+        write=min(profile.read, available),
+        pool=available,
+    )
+
+
+async def run_within(coro, group: str):
+    """Await coro within the group's total timeout and the request deadline"""
+    profile = profile_for(group)
+    try:
+        available = budget(profile.total)
+    except DeadlineExceeded:
+        coro.close()
+        raise
+    try:
+        return await asyncio.wait_for(coro, available)
+    except asyncio.TimeoutError:
+        if remaining() is not None and remaining() <= 0:
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        raise
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Deadline header to forward to sub-requests, if a deadline is set"""
+    left = remaining()
+    if left is None:
+        return {}
+    return {settings.deadline_header: str(max(0, int(left * 1000)))}
+
+
+class DeadlineMiddleware:
+    """ASGI middleware binding the caller's deadline and enforcing it"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.deadline_header.lower().encode("latin-1")
+
+    def _parse(self, scope) -> Optional[float]:
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                try:
+                    return float(value) / 1000
+                except ValueError:
+                    return None
+        if settings.default_request_timeout > 0:
+            return settings.default_request_timeout
+        return None
+
+    async def __call__(self, scope, receive, send):
+        timeout = self._parse(scope) if scope["type"] == "http" else None
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        token = current_deadline.set(time.monotonic() + timeout)
+        try:
+            await asyncio.wait_for(self.app(scope, receive, send_wrapper), timeout)
+        except asyncio.TimeoutError:
+            if not response_started:
+                await send_json_response(
+                    send, 504, {"detail": "Request deadline exceeded"}
+                )
+        finally:
+            current_deadline.reset(token)
@@ -0,0 +1,65 @@
+"""
+Gateway error types and helpers for surfacing them to callers
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+
+class GatewayError(HTTPException):
+    """Error raised by the gateway itself rather than by the C2S API"""
+
+    status_code = 500
+
+    def __init__(self, detail: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(status_code=self.status_code, detail=detail, headers=headers)
+
+
+class DeadlineExceeded(GatewayError):
+    """The caller's deadline passed before the work completed"""
+
+    status_code = 504
+
+
+class UpstreamTimeout(GatewayError):
+    """An upstream call exceeded its timeout profile"""
+
+    status_code = 504
+
+
+def upstream_error(e: Exception) -> HTTPException:
+    """Map an exception raised while serving a route to the HTTP error returned"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return UpstreamTimeout(f"Upstream timeout: {str(e) or type(e).__name__}")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def error_info(e: Exception) -> Dict[str, object]:
+    """Status and detail for reporting a per-item failure inside a batch"""
+    if isinstance(e, httpx.HTTPStatusError):
+        return {"status": e.response.status_code, "detail": e.response.text[:500]}
+    error = upstream_error(e)
+    return {"status": error.status_code, "detail": error.detail}
+
+
+async def send_json_response(
+    send, status: int, body: dict, headers: Optional[Dict[str, str]] = None
+):
+    """Send a complete JSON response from ASGI middleware"""
+    payload = json.dumps(body).encode("utf-8")
+    raw_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(payload)).encode("latin-1")),
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    await send(
+        {"type": "http.response.start", "status": status, "headers": raw_headers}
+    )
+    await send({"type": "http.response.body", "body": payload})
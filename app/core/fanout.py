@@ -0,0 +1,379 @@
+"""
+Outbound fan-out of C2S lead events to internal subscribers
+
+C2S events are received once (POST /webhooks/c2s) and delivered to every
+locally registered subscriber. Each subscriber has its own bounded queue
+and worker tasks that POST micro-batches and retry with backoff, so a slow
+or failing subscriber only ever delays itself: publishing never waits,
+and when a subscriber's queue is full its oldest event is dropped.
+
+At shutdown the queues get the remaining grace to drain; events still
+queued or mid-delivery are written next to the subscriber file and
+queued again at the next start.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import secrets
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying; other 4xx mean the batch will never be accepted
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+class Subscriber:
+    """One internal service receiving lead events"""
+
+    def __init__(
+        self,
+        url: str,
+        events: Optional[List[str]] = None,
+        tenant: Optional[str] = None,
+        batch_size: int = 20,
+        batch_wait: float = 1.0,
+        concurrency: int = 2,
+        max_queue: int = 10000,
+        secret: Optional[str] = None,
+        subscriber_id: Optional[str] = None,
+    ):
+        self.id = subscriber_id or secrets.token_hex(6)
+        self.url = url
+        self.events = events or []
+        self.tenant = tenant
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.secret = secret
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.workers: List[asyncio.Task] = []
+        # Batches being filled or delivered by the workers
+        self.sending: List[List[Dict[str, Any]]] = []
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.lag_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def wants(self, tenant: str, event: Dict[str, Any]) -> bool:
+        """Whether this subscriber receives the event"""
+        if self.tenant and self.tenant != tenant:
+            return False
+        return not self.events or event.get("type") in self.events
+
+    def to_config(self) -> Dict[str, Any]:
+        """Persistable registration (without runtime state)"""
+        return {
+            "id": self.id,
+            "url": self.url,
+            "events": self.events,
+            "tenant": self.tenant,
+            "batch_size": self.batch_size,
+            "batch_wait": self.batch_wait,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "secret": self.secret,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        config = self.to_config()
+        config["secret"] = bool(self.secret)
+        return {
+            **config,
+            "queued": self.queue.qsize(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "last_error": self.last_error,
+        }
+
+
+class FanOut:
+    """Registry of subscribers and their delivery workers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.subscribers: Dict[str, Subscriber] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        self._running = False
+        self._draining = False
+
+    @property
+    def pending_path(self) -> str:
+        return f"{self.path}.pending"
+
+    # ========== REGISTRATION ==========
+
+    def add(self, subscriber: Subscriber) -> Subscriber:
+        """Register a subscriber and start its workers"""
+        self.subscribers[subscriber.id] = subscriber
+        if self._running:
+            self._start_workers(subscriber)
+        self._save()
+        return subscriber
+
+    def remove(self, subscriber_id: str) -> bool:
+        """Unregister a subscriber, discarding its queued events"""
+        subscriber = self.subscribers.pop(subscriber_id, None)
+        if subscriber is None:
+            return False
+        for worker in subscriber.workers:
+            worker.cancel()
+        self._save()
+        return True
+
+    def _save(self):
+        data = [s.to_config() for s in self.subscribers.values()]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist webhook subscribers: %s", e)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable subscriber file %s: %s", self.path, e)
+            return
+        for config in data:
+            subscriber = Subscriber(subscriber_id=config.pop("id", None), **config)
+            self.subscribers[subscriber.id] = subscriber
+
+    # ========== PUBLISHING ==========
+
+    def publish(self, tenant: str, event: Dict[str, Any]) -> int:
+        """Queue an event for every matching subscriber without waiting"""
+        envelope = {"tenant": tenant, "queued_at": time.time(), "event": event}
+        queued = 0
+        for subscriber in self.subscribers.values():
+            if not subscriber.wants(tenant, event):
+                continue
+            if subscriber.queue.full():
+                subscriber.queue.get_nowait()
+                subscriber.dropped += 1
+                metrics.incr("fanout_dropped", subscriber=subscriber.id)
+            subscriber.queue.put_nowait(envelope)
+            self._report_depth(subscriber)
+            queued += 1
+        return queued
+
+    # ========== DELIVERY ==========
+
+    async def start(self):
+        """Load persisted subscribers and undelivered events, start workers"""
+        self._load()
+        self._load_pending()
+        self._running = True
+        self._draining = False
+        for subscriber in self.subscribers.values():
+            self._start_workers(subscriber)
+        if self.subscribers:
+            logger.info(
+                "Webhook fan-out started for %d subscribers", len(self.subscribers)
+            )
+
+    def _start_workers(self, subscriber: Subscriber):
+        subscriber.workers = [
+            asyncio.ensure_future(self._worker(subscriber))
+            for _ in range(subscriber.concurrency)
+        ]
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=settings.fanout_timeout)
+        return self._http
+
+    async def _worker(self, subscriber: Subscriber):
+        while True:
+            batch = [await subscriber.queue.get()]
+            subscriber.sending.append(batch)
+            try:
+                deadline = time.monotonic() + subscriber.batch_wait
+                while len(batch) < subscriber.batch_size:
+                    left = deadline - time.monotonic()
+                    if self._draining:
+                        # Take what is queued without waiting for more
+                        if subscriber.queue.empty():
+                            break
+                        batch.append(subscriber.queue.get_nowait())
+                        continue
+                    if left <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(subscriber.queue.get(), left)
+                        batch.append(item)
+                    except asyncio.TimeoutError:
+                        break
+                self._report_depth(subscriber)
+                await self._deliver(subscriber, batch)
+            except Exception as e:
+                # Drop the batch, not the worker: its queue would grow forever
+                subscriber.last_error = f"{type(e).__name__}: {e}"
+                subscriber.failed += len(batch)
+                metrics.incr("fanout_failed", len(batch), subscriber=subscriber.id)
+                logger.exception(
+                    "Dropped batch of %d events for subscriber %s",
+                    len(batch),
+                    subscriber.id,
+                )
+            finally:
+                subscriber.sending.remove(batch)
+
+    @staticmethod
+    def _report_depth(subscriber: Subscriber):
+        metrics.set_gauge(
+            "fanout_queue_depth", subscriber.queue.qsize(), subscriber=subscriber.id
+        )
+
+    async def _deliver(self, subscriber: Subscriber, batch: List[Dict[str, Any]]):
+        """POST one batch, retrying transient failures with backoff"""
+        body = json.dumps({"events": batch}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if subscriber.secret:
+            signature = hmac.new(subscriber.secret.encode(), body, hashlib.sha256)
+            headers["X-Gateway-Signature"] = f"sha256={signature.hexdigest()}"
+
+        for attempt in range(settings.fanout_max_attempts):
+            try:
+                response = await self._get_http_client().post(
+                    subscriber.url, content=body, headers=headers
+                )
+                if response.status_code < 400:
+                    subscriber.delivered += len(batch)
+                    subscriber.lag_seconds = time.time() - batch[0]["queued_at"]
+                    metrics.incr(
+                        "fanout_delivered", len(batch), subscriber=subscriber.id
+                    )
+                    metrics.set_gauge(
+                        "fanout_lag_seconds",
+                        round(subscriber.lag_seconds, 3),
+                        subscriber=subscriber.id,
+                    )
+                    return
+                status = response.status_code
+                subscriber.last_error = f"HTTP {status}"
+                if status < 500 and status not in RETRYABLE_STATUS:
+                    break
+            except httpx.HTTPError as e:
+                subscriber.last_error = f"{type(e).__name__}: {e}"
+
+            metrics.incr("fanout_retries", subscriber=subscriber.id)
+            backoff = min(
+                settings.fanout_backoff_max, settings.fanout_backoff_base * 2**attempt
+            )
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+
+        subscriber.failed += len(batch)
+        metrics.incr("fanout_failed", len(batch), subscriber=subscriber.id)
+        logger.warning(
+            "Dropped batch of %d events for subscriber %s: %s",
+            len(batch),
+            subscriber.id,
+            subscriber.last_error,
+        )
+
+    # ========== SHUTDOWN ==========
+
+    def pending(self) -> int:
+        """Events queued or being delivered across subscribers"""
+        return sum(
+            subscriber.queue.qsize() + sum(len(batch) for batch in subscriber.sending)
+            for subscriber in self.subscribers.values()
+        )
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """Deliver queued events for up to timeout seconds"""
+        self._draining = True
+        subscribers = list(self.subscribers.values())
+        before = [(s.delivered, s.failed) for s in subscribers]
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return {
+            "delivered": sum(s.delivered - d for s, (d, _) in zip(subscribers, before)),
+            "failed": sum(s.failed - f for s, (_, f) in zip(subscribers, before)),
+            "pending": self.pending(),
+        }
+
+    def _save_pending(self) -> int:
+        data = {}
+        for subscriber in self.subscribers.values():
+            events = [event for batch in subscriber.sending for event in batch]
+            while not subscriber.queue.empty():
+                events.append(subscriber.queue.get_nowait())
+            if events:
+                data[subscriber.id] = events
+        if not data:
+            return 0
+        try:
+            with open(self.pending_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError as e:
+            logger.warning("Could not persist undelivered webhook events: %s", e)
+            return 0
+        return sum(len(events) for events in data.values())
+
+    def _load_pending(self):
+        try:
+            with open(self.pending_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.remove(self.pending_path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(
+                "Ignoring unreadable pending events %s: %s", self.pending_path, e
+            )
+            return
+        requeued = 0
+        for subscriber_id, events in data.items():
+            subscriber = self.subscribers.get(subscriber_id)
+            if subscriber is None:
+                continue
+            for envelope in events[-subscriber.max_queue :]:
+                subscriber.queue.put_nowait(envelope)
+                requeued += 1
+        if requeued:
+            logger.info("Requeued %d undelivered webhook events", requeued)
+
+    async def stop(self) -> int:
+        """Stop workers and close the client, returning events saved for later"""
+        self._running = False
+        # Taken before cancelling, which unregisters the workers' batches
+        saved = self._save_pending()
+        workers = [
+            worker
+            for subscriber in self.subscribers.values()
+            for worker in subscriber.workers
+        ]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+        return saved
+
+
+# Global fan-out instance
+fanout = FanOut(settings.fanout_subscribers_path)
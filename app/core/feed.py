@@ -0,0 +1,325 @@
+"""
+Lead change feed
+
+One append-only change log per tenant, fed by a single incremental sync
+against GET /integration/leads (updated_gte, sorted by updated_at) and by
+inbound C2S webhooks. Consumers read it with an opaque cursor, either by
+polling, long-polling or Server-Sent Events, so any number of consumers
+cost one upstream sync stream.
+
+The log lives in memory and keeps the latest FEED_MAX_EVENTS events.
+Cursors embed a per-process epoch; a cursor from another process or older
+than the retained window is rejected with 410 so the consumer resyncs.
+Sync watermarks are saved at shutdown (FEED_STATE_PATH), so the next
+process picks up the changes made while the machine was stopped.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.client import tenant_clients
+from app.core.config import settings
+from app.core.errors import GatewayError
+from app.core.metrics import metrics
+from app.core.priority import BULK, use_priority
+from app.core.shutdown import drainer
+from app.core.tenants import current_tenant, detached_task
+
+logger = logging.getLogger(__name__)
+
+# Lead ids remembered for de-duplicating sync pages and webhook echoes
+SEEN_LIMIT = 10000
+
+
+class CursorExpired(GatewayError):
+    """The cursor is from another process or older than the retained log"""
+
+    status_code = 410
+
+
+def lead_id_of(lead: Dict[str, Any]) -> Optional[str]:
+    """Lead id from a lead record or webhook payload"""
+    lead_id = lead.get("id") or lead.get("lead_id")
+    if lead_id is None and isinstance(lead.get("lead"), dict):
+        lead_id = lead["lead"].get("id")
+    return str(lead_id) if lead_id is not None else None
+
+
+def updated_at_of(lead: Dict[str, Any]) -> Optional[str]:
+    """updated_at from a lead record, flat or JSON:API style"""
+    attributes = lead.get("attributes") or {}
+    return lead.get("updated_at") or attributes.get("updated_at")
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Timezone-aware datetime from an ISO 8601 timestamp (naive means UTC)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class LeadChangeFeed:
+    """Append-only lead change log for one tenant"""
+
+    def __init__(self, tenant: str, max_events: int):
+        self.tenant = tenant
+        self.epoch = secrets.token_hex(4)
+        self.watermark = _utc_now_iso()
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._next_seq = 1
+        self._seen: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._changed = asyncio.Event()
+        self._sync_task: Optional[asyncio.Task] = None
+        self._last_read = time.monotonic()
+
+    # ========== WRITING ==========
+
+    def append(
+        self,
+        lead_id: str,
+        event_type: str,
+        data: Dict[str, Any],
+        source: str,
+        updated_at: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Append a change, skipping repeats of an already recorded version"""
+        if updated_at is not None and self._seen.get(lead_id) == updated_at:
+            return None
+        self._seen[lead_id] = updated_at
+        self._seen.move_to_end(lead_id)
+        while len(self._seen) > SEEN_LIMIT:
+            self._seen.popitem(last=False)
+
+        event = {
+            "seq": self._next_seq,
+            "type": event_type,
+            "lead_id": lead_id,
+            "updated_at": updated_at,
+            "source": source,
+            "received_at": time.time(),
+            "data": data,
+        }
+        self._next_seq += 1
+        self._events.append(event)
+        metrics.incr("feed_events", tenant=self.tenant, source=source)
+
+        # Wake every current waiter; later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return event
+
+    def record_webhook(self, event_type: str, payload: Dict[str, Any]):
+        """Append a change received through an inbound C2S webhook"""
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            data = payload
+        lead_id = lead_id_of(data) or lead_id_of(payload)
+        if lead_id is None:
+            logger.warning("Webhook %s without lead id ignored", event_type)
+            return None
+        return self.append(lead_id, event_type, data, "webhook", updated_at_of(data))
+
+    # ========== READING ==========
+
+    def cursor(self, seq: int) -> str:
+        """Opaque cursor pointing after seq"""
+        return f"{self.epoch}.{seq}"
+
+    @property
+    def head(self) -> int:
+        """Seq of the latest event"""
+        return self._next_seq - 1
+
+    def parse_cursor(self, cursor: Optional[str]) -> int:
+        """Seq a cursor points after; no cursor means the oldest retained event"""
+        oldest = self._events[0]["seq"] if self._events else self._next_seq
+        if not cursor:
+            return oldest - 1
+        epoch, _, raw_seq = cursor.partition(".")
+        if epoch != self.epoch or not raw_seq.isdigit():
+            raise CursorExpired("Cursor is not valid for this feed, resync required")
+        seq = int(raw_seq)
+        if seq < oldest - 1 or seq > self.head:
+            raise CursorExpired("Cursor is outside the retained feed, resync required")
+        return seq
+
+    def read(self, after: int, limit: int) -> List[Dict[str, Any]]:
+        """Events with seq greater than after, oldest first"""
+        if not self._events or after >= self.head:
+            return []
+        start = max(0, after - self._events[0]["seq"] + 1)
+        end = min(len(self._events), start + limit)
+        return [self._events[i] for i in range(start, end)]
+
+    async def wait(
+        self, after: int, limit: int, timeout: float
+    ) -> List[Dict[str, Any]]:
+        """Read events, waiting up to timeout seconds for new ones if none exist"""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = self._changed
+            events = self.read(after, limit)
+            left = deadline - time.monotonic()
+            if events or left <= 0 or drainer.draining:
+                return events
+            try:
+                await asyncio.wait_for(changed.wait(), left)
+            except asyncio.TimeoutError:
+                return []
+
+    def wake(self):
+        """Release current waiters without a change"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ========== UPSTREAM SYNC ==========
+
+    def touch(self):
+        """Record consumer activity and make sure the sync loop runs"""
+        self._last_read = time.monotonic()
+        if self._sync_task is None or self._sync_task.done():
+            # Shared by every consumer of the tenant
+            self._sync_task = detached_task(self._sync_loop(), self.tenant)
+
+    async def _sync_loop(self):
+        logger.info("Lead change sync started for tenant %s", self.tenant)
+        while time.monotonic() - self._last_read < settings.feed_idle_timeout:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                metrics.incr("feed_sync_errors", tenant=self.tenant)
+                logger.warning("Lead change sync failed for %s: %s", self.tenant, e)
+            await asyncio.sleep(settings.feed_sync_interval)
+        logger.info("Lead change sync idle, stopped for tenant %s", self.tenant)
+
+    async def sync_once(self) -> int:
+        """
+        Pull leads updated since the watermark into the log
+
+        Pages are read by watermark rather than by offset: each request
+        starts at the newest updated_at seen so far, so a lead updated
+        during the sync (which moves to the end of the ordering) is still
+        reached. Leads at the watermark itself are read again and skipped
+        as already recorded versions; offsets are only used to step
+        through a full page of leads sharing one updated_at.
+        """
+        client = tenant_clients.get(self.tenant)
+        appended = 0
+        since = self.watermark
+        since_time = parse_time(since)
+        page = 1
+        with use_priority(BULK):
+            for _ in range(settings.feed_sync_max_pages):
+                response = await client.get_leads(
+                    page=page,
+                    perpage=50,
+                    sort="updated_at",
+                    updated_gte=since,
+                )
+                leads = response.get("data", [])
+                newest, newest_time = since, since_time
+                for lead in leads:
+                    lead_id = lead_id_of(lead)
+                    updated_at = updated_at_of(lead)
+                    if lead_id is None:
+                        continue
+                    if self.append(lead_id, "lead.updated", lead, "sync", updated_at):
+                        appended += 1
+                    updated_time = parse_time(updated_at)
+                    if updated_time is None:
+                        continue
+                    if newest_time is None or updated_time > newest_time:
+                        newest, newest_time = updated_at, updated_time
+                # Every lead up to the new watermark has been read
+                self.watermark = newest
+                if len(leads) < 50:
+                    break
+                if newest_time != since_time:
+                    since, since_time, page = newest, newest_time, 1
+                else:
+                    page += 1
+        return appended
+
+    def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenant": self.tenant,
+            "events": len(self._events),
+            "head": self.cursor(self.head),
+            "watermark": self.watermark,
+            "syncing": self._sync_task is not None and not self._sync_task.done(),
+        }
+
+
+class ChangeFeeds:
+    """Registry of per-tenant change feeds"""
+
+    def __init__(self):
+        self._feeds: Dict[str, LeadChangeFeed] = {}
+        self._watermarks: Dict[str, str] = {}
+        drainer.on_drain(self.wake)
+
+    def get(self, tenant: Optional[str] = None) -> LeadChangeFeed:
+        tenant = tenant or current_tenant.get()
+        feed = self._feeds.get(tenant)
+        if feed is None:
+            feed = LeadChangeFeed(tenant, settings.feed_max_events)
+            if tenant in self._watermarks:
+                feed.watermark = self._watermarks.pop(tenant)
+            self._feeds[tenant] = feed
+        return feed
+
+    def wake(self):
+        """Release every waiting reader"""
+        for feed in self._feeds.values():
+            feed.wake()
+
+    def stop(self):
+        for feed in self._feeds.values():
+            feed.stop()
+
+    def save(self, path: str) -> int:
+        """Atomically write each tenant's sync watermark, returning the count"""
+        watermarks = {
+            **self._watermarks,
+            **{tenant: feed.watermark for tenant, feed in self._feeds.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(watermarks, f)
+        os.replace(tmp_path, path)
+        return len(watermarks)
+
+    def load(self, path: str) -> int:
+        """Restore sync watermarks saved by a previous process"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._watermarks = dict(json.load(f))
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("Ignoring unreadable feed state %s: %s", path, e)
+            return 0
+        return len(self._watermarks)
+
+
+# Global change feed registry
+change_feeds = ChangeFeeds()
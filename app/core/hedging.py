@@ -0,0 +1,155 @@
+"""
+Request hedging for latency-critical idempotent upstream reads
+
+If a read has not answered within an adaptive percentile of recent
+latencies for its endpoint group, an identical backup request is sent.
+The first successful answer wins and the other attempt is cancelled.
+Hedges are paid for from a budget that grows by `max_rate` per request,
+so hedges never exceed that fraction of traffic.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Max hedges that can be saved up during quiet periods
+BUDGET_CAP = 10.0
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies per endpoint group"""
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, group: str, seconds: float):
+        samples = self._samples.get(group)
+        if samples is None:
+            samples = self._samples[group] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, group: str, pct: float) -> Optional[float]:
+        """Latency percentile for a group, or None until enough samples exist"""
+        samples = self._samples.get(group)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class Hedger:
+    """Sends backup requests for slow reads under a hedge-rate budget"""
+
+    def __init__(
+        self,
+        enabled: bool,
+        percentile: float,
+        initial_delay: float,
+        min_delay: float,
+        max_rate: float,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.tracker = LatencyTracker(window, min_samples)
+        self._budget = 0.0
+
+    def observe(self, group: str, seconds: float):
+        """
+        Record the latency of one upstream attempt of a hedgeable read
+
+        For an attempt that failed or was cancelled, seconds is the time it
+        ran, a lower bound of its latency.
+        """
+        self.tracker.observe(group, seconds)
+
+    def delay_for(self, group: str) -> float:
+        """Seconds to wait before hedging a request in this group"""
+        observed = self.tracker.percentile(group, self.percentile)
+        if observed is None:
+            return self.initial_delay
+        return max(self.min_delay, observed)
+
+    async def run(
+        self,
+        group: str,
+        send: Callable[[], Awaitable[T]],
+        start_hedge: Optional[Callable[[], Optional[Awaitable[T]]]] = None,
+    ) -> T:
+        """
+        Run send(), hedging it once if it is slower than the group threshold
+
+        start_hedge starts the backup attempt, e.g. after taking its own
+        admission slot and rate limit token; returning None skips the hedge.
+        By default send() is simply called again. Latencies are not observed
+        here: callers report every attempt through observe(), including
+        failed and cancelled ones, so the tracker sees upstream latency
+        rather than the faster of two attempts.
+        """
+        self._budget = min(BUDGET_CAP, self._budget + self.max_rate)
+        delay = self.delay_for(group)
+        metrics.set_gauge("hedge_delay_ms", round(delay * 1000, 1), group=group)
+
+        primary = asyncio.ensure_future(send())
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                backup = None
+                if self._budget >= 1.0:
+                    backup = send() if start_hedge is None else start_hedge()
+                if backup is not None:
+                    self._budget -= 1.0
+                    metrics.incr("hedge_sent", group=group)
+                    attempts.append(asyncio.ensure_future(backup))
+                else:
+                    metrics.incr("hedge_skipped", group=group)
+
+            winner = await self._first_success(attempts)
+            if winner is not primary:
+                metrics.incr("hedge_won", group=group)
+            return winner.result()
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+
+    @staticmethod
+    async def _first_success(attempts) -> asyncio.Future:
+        """Wait for the first attempt that succeeds, or the last one to fail"""
+        pending = set(attempts)
+        failed = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt
+                failed = failed or attempt
+        return failed
+
+
+# Global hedger instance
+hedger = Hedger(
+    enabled=settings.hedge_enabled,
+    percentile=settings.hedge_percentile,
+    initial_delay=settings.hedge_initial_delay,
+    min_delay=settings.hedge_min_delay,
+    max_rate=settings.hedge_max_rate,
+)
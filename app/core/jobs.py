@@ -0,0 +1,413 @@
+"""
+Background jobs
+
+Long-running operations (bulk redistribution, exports, backfills) run as
+jobs instead of inside an HTTP request. A job is a registered handler
+kind plus JSON params; submitting one returns immediately and the job is
+picked up by a fixed pool of JOB_CONCURRENCY workers.
+
+Jobs live in a local SQLite table (JOBS_DB_PATH). Handlers report
+progress and may keep resumable state, both persisted at most once per
+PERSIST_INTERVAL. Jobs interrupted by a shutdown go back to pending and
+run again at the next start with their saved state, unless cancel() was
+asked for them. A handler cancelled by anything but cancel() fails. All
+SQLite access happens on one dedicated thread so the
+event loop never blocks on disk.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.priority import BULK, current_priority
+from app.core.tenants import current_tenant
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED = (COMPLETED, CANCELLED, FAILED)
+
+# Seconds between progress/state writes while a job runs
+PERSIST_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_tenant_created ON jobs (tenant, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+_JSON_COLUMNS = ("params", "progress", "state", "result")
+_COLUMNS = (
+    "id",
+    "kind",
+    "tenant",
+    "status",
+    "params",
+    "progress",
+    "state",
+    "result",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "updated_at",
+)
+
+
+class Job:
+    """One job row"""
+
+    def __init__(self, kind: str, tenant: str, params: Dict[str, Any]):
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.tenant = tenant
+        self.status = PENDING
+        self.params = params
+        self.progress: Dict[str, Any] = {}
+        self.state: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        job = cls.__new__(cls)
+        for column in _COLUMNS:
+            value = row[column]
+            if column in _JSON_COLUMNS and value is not None:
+                value = json.loads(value)
+            setattr(job, column, value)
+        return job
+
+    def to_row(self) -> Tuple[Any, ...]:
+        values = []
+        for column in _COLUMNS:
+            value = getattr(self, column)
+            if column in _JSON_COLUMNS and value is not None:
+                value = json.dumps(value)
+            values.append(value)
+        return tuple(values)
+
+    def to_dict(self, result: bool = True) -> Dict[str, Any]:
+        data = {
+            column: getattr(self, column) for column in _COLUMNS if column != "state"
+        }
+        if not result:
+            data.pop("result")
+        return data
+
+
+class JobStore:
+    """SQLite job table, used from a single worker thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+        self._db: Optional[sqlite3.Connection] = None
+
+    async def _call(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _save(self, row: Tuple[Any, ...]):
+        db = self._connect()
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        db.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) "
+            f"VALUES ({placeholders})",
+            row,
+        )
+        db.commit()
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return Job.from_row(row) if row else None
+
+    def _list(
+        self, tenant: str, status: Optional[str], kind: Optional[str], limit: int
+    ) -> List[Job]:
+        query = "SELECT * FROM jobs WHERE tenant = ?"
+        args: List[Any] = [tenant]
+        if status:
+            query += " AND status = ?"
+            args.append(status)
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        return [Job.from_row(row) for row in self._connect().execute(query, args)]
+
+    def _unfinished(self) -> List[Job]:
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (PENDING, RUNNING),
+        )
+        return [Job.from_row(row) for row in rows]
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def save(self, job: Job):
+        # Serialized here, on the loop, so handlers may keep mutating state
+        await self._call(self._save, job.to_row())
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self._call(self._get, job_id)
+
+    async def list(
+        self,
+        tenant: str,
+        status: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Job]:
+        return await self._call(self._list, tenant, status, kind, limit)
+
+    async def unfinished(self) -> List[Job]:
+        return await self._call(self._unfinished)
+
+    async def close(self):
+        await self._call(self._close)
+
+
+class JobContext:
+    """Handle a job handler uses to read params and report progress"""
+
+    def __init__(self, runner: "JobRunner", job: Job):
+        self.runner = runner
+        self.job = job
+        self._persisted = time.monotonic()
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.job.params
+
+    @property
+    def tenant(self) -> str:
+        return self.job.tenant
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """Resumable state; saved with progress and kept across restarts"""
+        return self.job.state
+
+    async def report(self, **progress):
+        """Update progress, persisting it at most once per PERSIST_INTERVAL"""
+        self.job.progress.update(progress)
+        self.job.updated_at = time.time()
+        if time.monotonic() - self._persisted >= PERSIST_INTERVAL:
+            await self.checkpoint()
+
+    async def checkpoint(self):
+        """Persist progress and state now"""
+        self._persisted = time.monotonic()
+        await self.runner.store.save(self.job)
+
+
+Handler = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobRunner:
+    """Worker pool executing jobs from the store"""
+
+    def __init__(self, store: JobStore, concurrency: int):
+        self.store = store
+        self.concurrency = concurrency
+        self.handlers: Dict[str, Tuple[Handler, Optional[Type[BaseModel]]]] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._active: Dict[str, Tuple[Job, asyncio.Task]] = {}
+        self._cancel_requested: set = set()
+        self._stopping = False
+
+    def register(
+        self,
+        kind: str,
+        handler: Handler,
+        params_model: Optional[Type[BaseModel]] = None,
+    ):
+        """Register a job kind; params are validated with params_model if given"""
+        self.handlers[kind] = (handler, params_model)
+
+    def validate(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalized params for a job kind (raises KeyError / ValidationError)"""
+        _, params_model = self.handlers[kind]
+        if params_model is None:
+            return params
+        return params_model.model_validate(params).model_dump(mode="json")
+
+    # ========== API ==========
+
+    async def submit(self, kind: str, tenant: str, params: Dict[str, Any]) -> Job:
+        """Persist a new job and queue it"""
+        job = Job(kind, tenant, self.validate(kind, params))
+        await self.store.save(job)
+        self._queue.put_nowait(job.id)
+        metrics.incr("jobs_submitted", kind=kind)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """A job with live progress if it is running"""
+        active = self._active.get(job_id)
+        if active is not None:
+            return active[0]
+        return await self.store.get(job_id)
+
+    async def list(self, tenant: str, **filters) -> List[Job]:
+        jobs = await self.store.list(tenant, **filters)
+        return [self._active.get(job.id, (job,))[0] for job in jobs]
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a pending or running job"""
+        active = self._active.get(job_id)
+        if active is not None:
+            self._cancel_requested.add(job_id)
+            active[1].cancel()
+            return active[0]
+        job = await self.store.get(job_id)
+        if job is not None and job.status == PENDING:
+            job.status = CANCELLED
+            job.finished_at = job.updated_at = time.time()
+            await self.store.save(job)
+        return job
+
+    # ========== LIFECYCLE ==========
+
+    async def start(self):
+        """Start workers and requeue jobs left unfinished by a previous process"""
+        self._stopping = False
+        unfinished = await self.store.unfinished()
+        for job in unfinished:
+            self._queue.put_nowait(job.id)
+        if unfinished:
+            logger.info("Requeued %d unfinished jobs", len(unfinished))
+        self._workers = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> int:
+        """Stop workers, interrupting running jobs (resumed at next start);
+        returns how many were interrupted"""
+        self._stopping = True
+        interrupted = len(self._active)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.store.close()
+        return interrupted
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = await self.store.get(job_id)
+            if job is None or job.status in FINISHED:
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        entry = self.handlers.get(job.kind)
+        if entry is None:
+            job.status = FAILED
+            job.error = f"Unknown job kind {job.kind}"
+            job.finished_at = job.updated_at = time.time()
+            await self.store.save(job)
+            return
+
+        job.status = RUNNING
+        job.started_at = job.started_at or time.time()
+        job.updated_at = time.time()
+        await self.store.save(job)
+
+        # Handlers run as the job's tenant, in the bulk lane
+        context = contextvars.copy_context()
+        context.run(current_tenant.set, job.tenant)
+        context.run(current_priority.set, BULK)
+        task = asyncio.get_running_loop().create_task(
+            entry[0](JobContext(self, job)), context=context
+        )
+        self._active[job.id] = (job, task)
+        started = time.monotonic()
+        try:
+            job.result = await task
+            job.status = COMPLETED
+        except asyncio.CancelledError:
+            requested = job.id in self._cancel_requested
+            if self._stopping:
+                task.cancel()
+                if requested:
+                    job.status = CANCELLED
+                    job.finished_at = time.time()
+                else:
+                    # Shutdown: leave it for the next start
+                    job.status = PENDING
+                job.updated_at = time.time()
+                await asyncio.shield(self.store.save(job))
+                raise
+            if requested:
+                job.status = CANCELLED
+            else:
+                # Cancelled from inside the handler, not by cancel()
+                job.status = FAILED
+                job.error = "Interrupted"
+                logger.warning("Job %s (%s) was interrupted", job.id, job.kind)
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e) or type(e).__name__
+            logger.warning("Job %s (%s) failed: %s", job.id, job.kind, job.error)
+        finally:
+            self._active.pop(job.id, None)
+            self._cancel_requested.discard(job.id)
+
+        job.finished_at = job.updated_at = time.time()
+        await self.store.save(job)
+        metrics.incr("jobs_finished", kind=job.kind, status=job.status)
+        metrics.observe("job_seconds", time.monotonic() - started, kind=job.kind)
+
+
+# Global job runner
+jobs = JobRunner(JobStore(settings.jobs_db_path), settings.job_concurrency)
@@ -0,0 +1,165 @@
+"""
+Large-page lead listing with opaque cursors
+
+GET /integration/leads serves at most 50 leads per page. A range of up to
+500 leads is read as the upstream pages covering it, fetched concurrently
+(at most LEAD_RANGE_CONCURRENCY at a time, each under the tenant's rate
+limit) and concatenated in page order, which is already the requested
+sort order. The first range may come from the lead list cache; ranges
+read with a cursor are fetched uncached, so they never mix pages cached
+at different times.
+
+The returned cursor encodes the tenant, the filters and the upstream
+position reached, so the next call starts at the right upstream page
+instead of page 1. It also carries the id of the last lead returned: when
+leads were inserted ahead of the position in the meantime, the leads
+pushed into the next range are skipped rather than returned twice.
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.errors import GatewayError
+from app.core.feed import lead_id_of
+from app.core.tenants import current_tenant
+
+# Largest page GET /integration/leads serves
+UPSTREAM_PAGE_SIZE = 50
+
+CURSOR_VERSION = 1
+
+# Filters of GET /leads a cursor may carry
+RANGE_FILTERS = (
+    "sort",
+    "created_gte",
+    "created_lt",
+    "updated_gte",
+    "updated_lt",
+    "status",
+    "phone",
+    "email",
+    "tags",
+)
+
+
+class InvalidCursor(GatewayError):
+    """The cursor is malformed or was issued for another tenant or filters"""
+
+    status_code = 400
+
+
+def encode_cursor(filters: Dict[str, str], offset: int, last: Optional[str]) -> str:
+    """Opaque cursor for the range starting at offset"""
+    state = {
+        "v": CURSOR_VERSION,
+        "t": current_tenant.get(),
+        "f": filters,
+        "o": offset,
+        "l": last,
+    }
+    raw = json.dumps(state, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Dict[str, str], int, Optional[str]]:
+    """(filters, offset, last lead id) from a cursor of this tenant"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw)
+        filters, offset, last = state["f"], int(state["o"]), state.get("l")
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor("Cursor is malformed")
+    if (
+        state.get("v") != CURSOR_VERSION
+        or offset < 0
+        or not isinstance(filters, dict)
+        or not set(filters) <= set(RANGE_FILTERS)
+    ):
+        raise InvalidCursor("Cursor is malformed")
+    if state.get("t") != current_tenant.get():
+        raise InvalidCursor("Cursor was issued for another tenant")
+    return filters, offset, last
+
+
+def unique_leads(leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop leads repeated within a range, keeping their first position
+
+    Pages read concurrently can overlap when leads move between them while
+    they are fetched.
+    """
+    seen = set()
+    unique = []
+    for lead in leads:
+        lead_id = lead_id_of(lead)
+        if lead_id is not None:
+            if lead_id in seen:
+                continue
+            seen.add(lead_id)
+        unique.append(lead)
+    return unique
+
+
+async def read_range(
+    client,
+    filters: Dict[str, str],
+    offset: int,
+    limit: int,
+    last: Optional[str],
+    concurrency: int,
+    cached: bool = True,
+) -> Dict[str, Any]:
+    """
+    Read the leads at upstream positions offset to offset + limit, with the
+    cursor of the next range
+
+    Positions count upstream entries, so leads dropped as repeats never
+    shift the next range.
+    """
+    first_page = offset // UPSTREAM_PAGE_SIZE + 1
+    last_page = (offset + limit - 1) // UPSTREAM_PAGE_SIZE + 1
+    semaphore = asyncio.Semaphore(concurrency)
+    # First page found short; later pages are empty and not fetched
+    end_page = [last_page + 1]
+
+    async def fetch(page: int) -> List[Dict[str, Any]]:
+        async with semaphore:
+            if page > end_page[0]:
+                return []
+            response = await client.get_leads(
+                page=page, perpage=UPSTREAM_PAGE_SIZE, cached=cached, **filters
+            )
+        leads = response.get("data", [])
+        if len(leads) < UPSTREAM_PAGE_SIZE:
+            end_page[0] = min(end_page[0], page)
+        return leads
+
+    pages = await asyncio.gather(
+        *(fetch(page) for page in range(first_page, last_page + 1))
+    )
+    exhausted = end_page[0] <= last_page
+
+    # Upstream entries from offset on, in upstream order
+    start = offset - (first_page - 1) * UPSTREAM_PAGE_SIZE
+    window = [lead for page in pages for lead in page][start:]
+    if last is not None:
+        # Leads inserted ahead pushed the previous range's tail into this one
+        ids = [lead_id_of(lead) for lead in window]
+        if last in ids:
+            skipped = ids.index(last) + 1
+            window = window[skipped:]
+            offset += skipped
+    taken = window[:limit]
+    leads = unique_leads(taken)
+    next_offset = offset + len(taken)
+    has_more = not (exhausted and len(taken) == len(window))
+    next_last = lead_id_of(taken[-1]) if taken else last
+    return {
+        "data": leads,
+        "count": len(leads),
+        "cursor": encode_cursor(filters, next_offset, next_last) if has_more else None,
+        "has_more": has_more,
+    }
@@ -0,0 +1,175 @@
+"""
+Structured, non-blocking logging
+
+Log calls only enqueue the record: a listener thread formats and writes it,
+so the event loop never waits on stderr. Formatting is lazy (log with
+%-style arguments, never f-strings), records from high-volume loggers can
+be sampled by LOG_SAMPLE_RATES before they are queued, and emails and
+phone numbers are redacted from every rendered line.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+EMAIL_RE = re.compile(r"[\w.+-]+(?:@|%40)[\w-]+(?:\.[\w-]+)+")
+# 10+ digit numbers with optional country/area code and separators
+PHONE_RE = re.compile(
+    r"(?<![\w/-])(?:\+?\d{1,3}[\s.-]?)?\(?\d{2,3}\)?[\s.-]?\d{4,5}[\s.-]?\d{4}"
+    r"(?!\w|[.-]\d)"
+)
+
+# Loggers configured by uvicorn that are re-routed through the root logger
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "color_message",
+}
+
+
+def redact(text: str) -> str:
+    """Mask email addresses and phone numbers"""
+    text = EMAIL_RE.sub("[email]", text)
+    return PHONE_RE.sub("[phone]", text)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with extra= fields and redaction"""
+
+    def __init__(self, redacted: bool = True):
+        super().__init__()
+        self.redacted = redacted
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        line = json.dumps(entry, default=str)
+        return redact(line) if self.redacted else line
+
+
+class RedactingFormatter(logging.Formatter):
+    """Plain text formatter with redaction"""
+
+    def __init__(self, fmt: str, redacted: bool = True):
+        super().__init__(fmt)
+        self.redacted = redacted
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        return redact(line) if self.redacted else line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of sub-WARNING records per logger (longest prefix match)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            best = ""
+            for prefix in self.rates:
+                matches = name == prefix or name.startswith(prefix + ".")
+                if matches and len(prefix) > len(best):
+                    best = prefix
+            rate = self.rates[best] if best else 1.0
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        metrics.incr("log_sampled_out", logger=record.name)
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that defers formatting and drops records when full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens in the listener thread, not on the event loop
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr("log_dropped")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging():
+    """Route the root logger through the sampling filter and queue listener"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if settings.log_format == "json":
+        formatter: logging.Formatter = JsonFormatter(settings.log_redact)
+    else:
+        formatter = RedactingFormatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            settings.log_redact,
+        )
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    records: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    handler = NonBlockingQueueHandler(records)
+    if settings.log_sample_rates:
+        handler.addFilter(SamplingFilter(settings.log_sample_rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+    # Server logs (including access lines with query strings) get the same
+    # queue, sampling and redaction
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
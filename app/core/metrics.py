@@ -0,0 +1,63 @@
+"""
+In-process metrics registry (counters, gauges and summaries)
+"""
+
+from collections import defaultdict
+from typing import Any, Dict
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Render a metric name with sorted labels, e.g. hedge_sent{group=GET /leads}"""
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Minimal metrics registry exposed as JSON by GET /metrics"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self.summaries: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        self.counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to its current value"""
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation in a count/sum/max summary"""
+        key = _key(name, labels)
+        summary = self.summaries.get(key)
+        if summary is None:
+            summary = self.summaries[key] = {"count": 0, "sum": 0.0, "max": 0.0}
+        summary["count"] += 1
+        summary["sum"] += value
+        if value > summary["max"]:
+            summary["max"] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of every metric"""
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "summaries": {
+                key: {**s, "avg": s["sum"] / s["count"] if s["count"] else 0.0}
+                for key, s in self.summaries.items()
+            },
+        }
+
+    def reset(self):
+        """Drop all recorded values"""
+        self.counters.clear()
+        self.gauges.clear()
+        self.summaries.clear()
+
+
+# Global metrics instance
+metrics = Metrics()
@@ -0,0 +1,73 @@
+"""
+Priority lanes for upstream traffic
+
+Upstream calls run in the realtime lane (live lead traffic, interactive
+requests) or the bulk lane (exports, backfills, redistributions). The lane
+comes from, in order: an explicit priority passed to the client, the
+priority header, the per-route defaults in C2S_ROUTE_PRIORITIES, and
+finally realtime. Background code switches lanes with use_priority().
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.core.config import settings
+
+REALTIME = "realtime"
+BULK = "bulk"
+LANES = (REALTIME, BULK)
+
+# Lane of the request or background task being handled
+current_priority: ContextVar[str] = ContextVar("current_priority", default=REALTIME)
+
+
+def normalize(lane: str) -> str:
+    """Map a caller-supplied lane name onto a known lane"""
+    lane = (lane or "").strip().lower()
+    return lane if lane in LANES else REALTIME
+
+
+@contextmanager
+def use_priority(lane: str):
+    """Run upstream calls made inside the block in the given lane"""
+    token = current_priority.set(normalize(lane))
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def route_priority(path: str) -> str:
+    """Default lane for a gateway route, by longest matching path prefix"""
+    best = ""
+    for prefix in settings.c2s_route_priorities:
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return normalize(settings.c2s_route_priorities[best]) if best else REALTIME
+
+
+class PriorityMiddleware:
+    """ASGI middleware binding the request's lane from header or route"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.priority_header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lane = None
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                lane = normalize(value.decode("latin-1"))
+                break
+        if lane is None:
+            lane = route_priority(scope["path"])
+
+        token = current_priority.set(lane)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_priority.reset(token)
@@ -0,0 +1,247 @@
+"""
+Production profiling: on-demand sampling profiler and event loop monitor
+
+SamplingProfiler runs a background thread that periodically snapshots the
+event loop thread's Python stack (on-CPU view) or, in task mode, walks the
+await chain of every pending asyncio task (where tasks are waiting).
+Samples are aggregated into collapsed stacks for flamegraph tools or a
+speedscope file.
+
+LoopMonitor keeps a heartbeat on the event loop and a watchdog thread.
+When the heartbeat stalls for longer than LOOP_LAG_THRESHOLD, the
+watchdog logs the loop thread's stack while it is still blocked, which
+names the slow callback without running asyncio in debug mode.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CPU = "cpu"
+TASKS = "tasks"
+MODES = (CPU, TASKS)
+
+# Frames of the selector wait, reported as idle loop time
+_IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "control"}
+
+_SEARCH_ROOTS = sorted({os.path.abspath(p) for p in sys.path if p}, key=len)[::-1]
+_labels: Dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    """Frame label like 'get_lead (app/core/client.py:228)', cached per code"""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        for root in _SEARCH_ROOTS:
+            if path.startswith(root + os.sep):
+                path = path[len(root) + 1 :]
+                break
+        label = f"{code.co_name} ({path}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def collapse_frame(frame: Optional[FrameType]) -> str:
+    """Root-first ';'-joined stack of a thread frame"""
+    if frame is not None and frame.f_code.co_name in _IDLE_FUNCTIONS:
+        return "(idle)"
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def collapse_task(task: asyncio.Task) -> str:
+    """Root-first ';'-joined await chain of a suspended task"""
+    labels = [f"task:{task.get_coro().__qualname__}"]
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        labels.append(_label(frame.f_code))
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return ";".join(labels)
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already being recorded"""
+
+
+class SamplingProfiler:
+    """Samples the event loop thread or its tasks for a fixed duration"""
+
+    def __init__(self):
+        self.running = False
+
+    async def record(self, seconds: float, interval: float, mode: str) -> Counter:
+        """Collect stack samples for `seconds`, one every `interval` seconds"""
+        if self.running:
+            raise ProfilerBusy("A profile is already running")
+        self.running = True
+        try:
+            if mode == TASKS:
+                return await self._record_tasks(seconds, interval)
+            return await self._record_cpu(seconds, interval)
+        finally:
+            self.running = False
+
+    async def _record_cpu(self, seconds: float, interval: float) -> Counter:
+        loop_thread = threading.get_ident()
+        samples: Counter = Counter()
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(interval):
+                samples[collapse_frame(sys._current_frames().get(loop_thread))] += 1
+
+        sampler = threading.Thread(target=sample, name="profiler", daemon=True)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+        return samples
+
+    async def _record_tasks(self, seconds: float, interval: float) -> Counter:
+        me = asyncio.current_task()
+        samples: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for task in asyncio.all_tasks():
+                if task is not me:
+                    samples[collapse_task(task)] += 1
+            await asyncio.sleep(interval)
+        return samples
+
+
+def to_collapsed(samples: Counter) -> str:
+    """Brendan Gregg collapsed stack format ('a;b;c count' per line)"""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+def to_speedscope(samples: Counter, interval: float, name: str) -> Dict[str, Any]:
+    """speedscope sampled profile, weighted in milliseconds"""
+    frames: List[Dict[str, str]] = []
+    index: Dict[str, int] = {}
+    stacks = []
+    weights = []
+    for stack, count in samples.most_common():
+        ids = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        stacks.append(ids)
+        weights.append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "exporter": "c2s-gateway",
+        "name": name,
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": stacks,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+class LoopMonitor:
+    """Event loop heartbeat with a watchdog logging the stack of stalls"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = max(threshold / 4, 0.01)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(loop_thread,), name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            self.max_lag = max(self.max_lag, lag)
+            metrics.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self, loop_thread: int):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self.stalls += 1
+            metrics.incr("event_loop_stalls")
+            frame = sys._current_frames().get(loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=15)) if frame else ""
+            logger.warning(
+                "Event loop blocked for %.3fs, loop thread stack:\n%s",
+                stalled,
+                stack,
+                extra={"stalled_seconds": round(stalled, 3)},
+            )
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_seconds": self.threshold,
+            "max_lag_seconds": round(self.max_lag, 4),
+            "stalls": self.stalls,
+        }
+
+
+# Global profiler and loop monitor
+profiler = SamplingProfiler()
+loop_monitor = LoopMonitor(settings.loop_lag_threshold)
@@ -0,0 +1,306 @@
+"""
+Upstream quota accounting
+
+Every request sent to C2S (retries and hedges included, since they count
+against the API quota too) is metered per tenant, endpoint group and
+lane in one-minute buckets, giving rolling hour and day totals. Counters
+are flushed to QUOTA_STATE_PATH every QUOTA_FLUSH_INTERVAL seconds and at
+shutdown, and restored at startup, so auto-stopped machines keep their
+history.
+
+Tenants may have hourly and daily budgets (QUOTA_HOURLY_BUDGET,
+QUOTA_DAILY_BUDGET or per tenant in C2S_TENANTS). Once a rolling window
+passes QUOTA_BULK_CUTOFF of its budget, bulk-lane calls and hedges are
+refused; at the budget itself, every call is refused with 429 and a
+Retry-After for when the window has rolled off enough.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.errors import GatewayError
+from app.core.metrics import metrics
+from app.core.priority import BULK, REALTIME
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 60
+WINDOWS = {"hour": 3600, "day": 86400}
+BUDGET_NAMES = {"hour": "hourly", "day": "daily"}
+# Minutes of traffic the projections extrapolate from
+RATE_MINUTES = 15
+
+STATE_VERSION = 1
+
+MeterKey = Tuple[str, str, str]
+
+
+class QuotaExceeded(GatewayError):
+    """The tenant's upstream budget (or its bulk share) is used up"""
+
+    status_code = 429
+
+
+class RollingCount:
+    """Count over the last span seconds, kept in one-minute buckets"""
+
+    def __init__(self, span: int):
+        self.span = span
+        self.buckets: Deque[List[int]] = deque()
+        self.total = 0
+
+    def _expire(self, now: float):
+        oldest = int(now // BUCKET_SECONDS) - self.span // BUCKET_SECONDS
+        while self.buckets and self.buckets[0][0] <= oldest:
+            self.total -= self.buckets.popleft()[1]
+
+    def add(self, now: float, count: int = 1):
+        minute = int(now // BUCKET_SECONDS)
+        if self.buckets and self.buckets[-1][0] == minute:
+            self.buckets[-1][1] += count
+        else:
+            self.buckets.append([minute, count])
+        self.total += count
+        self._expire(now)
+
+    def value(self, now: float) -> int:
+        self._expire(now)
+        return self.total
+
+    def recent(self, now: float, minutes: int) -> int:
+        """Count over the last few minutes"""
+        since = int(now // BUCKET_SECONDS) - minutes
+        return sum(count for minute, count in self.buckets if minute > since)
+
+    def seconds_until_below(self, now: float, limit: int) -> float:
+        """Seconds until the count drops below limit as buckets roll off"""
+        self._expire(now)
+        total = self.total
+        wait = 1.0
+        for minute, count in self.buckets:
+            if total < limit:
+                break
+            total -= count
+            wait = minute * BUCKET_SECONDS + self.span - now
+        return max(1.0, wait)
+
+
+class QuotaMeter:
+    """Per-tenant upstream call accounting with budget enforcement"""
+
+    def __init__(self, path: str, bulk_cutoff: float):
+        self.path = path
+        self.bulk_cutoff = bulk_cutoff
+        self.budgets: Dict[str, Dict[str, int]] = {}
+        # Rolling day counts per (tenant, group, lane), for breakdowns
+        self._keys: Dict[MeterKey, RollingCount] = {}
+        # Rolling hour/day totals per tenant, for enforcement
+        self._tenants: Dict[str, Dict[str, RollingCount]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def limits(self, tenant: str) -> Dict[str, int]:
+        """Budget per window for a tenant (0 = unlimited)"""
+        limits = self.budgets.get(tenant)
+        if limits is None:
+            limits = {"hour": 0, "day": 0}
+            if tenant in settings.tenant_names():
+                config = settings.tenant_config(tenant)
+                limits = {"hour": config["quota_hourly"], "day": config["quota_daily"]}
+            self.budgets[tenant] = limits
+        return limits
+
+    def _windows(self, tenant: str) -> Dict[str, RollingCount]:
+        windows = self._tenants.get(tenant)
+        if windows is None:
+            windows = {name: RollingCount(span) for name, span in WINDOWS.items()}
+            self._tenants[tenant] = windows
+        return windows
+
+    # ========== METERING ==========
+
+    def record(self, tenant: str, group: str, lane: str, count: int = 1):
+        """Count upstream requests sent for a tenant"""
+        now = time.time()
+        key = (tenant, group, lane)
+        meter = self._keys.get(key)
+        if meter is None:
+            meter = self._keys[key] = RollingCount(WINDOWS["day"])
+        meter.add(now, count)
+        for window in self._windows(tenant).values():
+            window.add(now, count)
+
+    # ========== ENFORCEMENT ==========
+
+    def _blocking_window(
+        self, tenant: str, lane: str, now: float
+    ) -> Optional[Tuple[str, int]]:
+        """(window, limit) that refuses a call in this lane, if any"""
+        limits = self.limits(tenant)
+        share = self.bulk_cutoff if lane == BULK else 1.0
+        windows = self._windows(tenant)
+        for name, budget in limits.items():
+            if budget <= 0:
+                continue
+            limit = max(1, math.floor(budget * share))
+            if windows[name].value(now) >= limit:
+                return name, limit
+        return None
+
+    def allows(self, tenant: str, lane: str) -> bool:
+        """Whether a call in this lane fits the tenant's budgets"""
+        return self._blocking_window(tenant, lane, time.time()) is None
+
+    def check(self, tenant: str, lane: str):
+        """Raise QuotaExceeded if a call in this lane would break a budget"""
+        now = time.time()
+        blocking = self._blocking_window(tenant, lane, now)
+        if blocking is None:
+            return
+        name, limit = blocking
+        metrics.incr("quota_rejected", tenant=tenant, lane=lane, window=name)
+        wait = self._windows(tenant)[name].seconds_until_below(now, limit)
+        scope = "bulk share of the" if lane == BULK else "the"
+        raise QuotaExceeded(
+            f"Tenant {tenant} used {scope} {BUDGET_NAMES[name]} upstream budget "
+            f"({limit} calls)",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+    # ========== REPORTING ==========
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consumption, budgets and projections per tenant"""
+        now = time.time()
+        tenants = {}
+        for tenant in sorted(set(settings.tenant_names()) | set(self._tenants)):
+            windows = self._windows(tenant)
+            limits = self.limits(tenant)
+            per_minute = windows["hour"].recent(now, RATE_MINUTES) / RATE_MINUTES
+            report: Dict[str, Any] = {
+                "rate_per_minute": round(per_minute, 2),
+                "state": "ok",
+            }
+            for name, span in WINDOWS.items():
+                used = windows[name].value(now)
+                budget = limits[name]
+                entry: Dict[str, Any] = {
+                    "used": used,
+                    "budget": budget or None,
+                    # Usage over a full window at the current rate
+                    "projected": round(per_minute * span / 60),
+                }
+                if budget:
+                    remaining = max(0, budget - used)
+                    entry["remaining"] = remaining
+                    entry["used_pct"] = round(used / budget * 100, 1)
+                    entry["exhausted_in_seconds"] = (
+                        round(remaining / per_minute * 60) if per_minute else None
+                    )
+                report[name] = entry
+            if not self.allows(tenant, REALTIME):
+                report["state"] = "exhausted"
+            elif not self.allows(tenant, BULK):
+                report["state"] = "bulk_shed"
+
+            groups: Dict[str, int] = {}
+            lanes: Dict[str, int] = {}
+            for (key_tenant, group, lane), meter in self._keys.items():
+                if key_tenant != tenant:
+                    continue
+                used = meter.value(now)
+                if used:
+                    groups[group] = groups.get(group, 0) + used
+                    lanes[lane] = lanes.get(lane, 0) + used
+            report["day_by_group"] = dict(
+                sorted(groups.items(), key=lambda item: -item[1])
+            )
+            report["day_by_lane"] = lanes
+            tenants[tenant] = report
+        return {"bulk_cutoff": self.bulk_cutoff, "tenants": tenants}
+
+    # ========== PERSISTENCE ==========
+
+    def state(self) -> Dict[str, Any]:
+        """Copy of the rolling counters, safe to write from another thread"""
+        now = time.time()
+        keys = [
+            [*key, [list(bucket) for bucket in meter.buckets]]
+            for key, meter in self._keys.items()
+            if meter.value(now)
+        ]
+        return {"version": STATE_VERSION, "saved_at": now, "keys": keys}
+
+    def write(self, data: Dict[str, Any], path: Optional[str] = None) -> int:
+        """Atomically write counters from state(), returning the keys written"""
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return len(data["keys"])
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Restore counters saved by a previous process"""
+        path = path or self.path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable quota state %s: %s", path, e)
+            return 0
+        if data.get("version") != STATE_VERSION:
+            return 0
+        now = time.time()
+        per_tenant: Dict[str, Dict[int, int]] = {}
+        for tenant, group, lane, buckets in data["keys"]:
+            key = (tenant, group, lane)
+            meter = self._keys.setdefault(key, RollingCount(WINDOWS["day"]))
+            minutes = per_tenant.setdefault(tenant, {})
+            for minute, count in buckets:
+                meter.add(minute * BUCKET_SECONDS, count)
+                minutes[minute] = minutes.get(minute, 0) + count
+            meter.value(now)
+        for tenant, minutes in per_tenant.items():
+            for window in self._windows(tenant).values():
+                for minute in sorted(minutes):
+                    window.add(minute * BUCKET_SECONDS, minutes[minute])
+                window.value(now)
+        return len(data["keys"])
+
+    # ========== LIFECYCLE ==========
+
+    async def start(self):
+        restored = self.load()
+        if restored:
+            logger.info("Restored quota counters for %d endpoint groups", restored)
+        self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def flush(self):
+        try:
+            await asyncio.to_thread(self.write, self.state())
+        except OSError as e:
+            logger.warning("Could not save quota counters: %s", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.quota_flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+# Global quota meter
+quota = QuotaMeter(settings.quota_state_path, settings.quota_bulk_cutoff)
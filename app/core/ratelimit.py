@@ -0,0 +1,83 @@
+"""
+Token bucket rate limiting for upstream C2S calls
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from app.core.coordination import coordinator
+from app.core.tracing import span
+
+
+class TokenBucket:
+    """
+    Async token bucket
+
+    Waiters are served in FIFO order; a rate of 0 disables limiting. With a
+    shared_key, acquire() takes tokens from the cluster-wide bucket of that
+    key while the coordination server is reachable and from this local
+    bucket otherwise; try_acquire() (used for hedges) stays local.
+    """
+
+    def __init__(self, rate: float, burst: int, shared_key: Optional[str] = None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.shared_key = shared_key
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available without waiting"""
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until tokens are available, then take them"""
+        if self.rate <= 0:
+            return
+        if self.shared_key and coordinator.shared:
+            if await self._acquire_shared(tokens):
+                return
+        # Nobody is queued ahead, so taking a token now keeps FIFO order
+        if not self._lock.locked() and self.try_acquire(tokens):
+            return
+        with span("queue", limiter="rate"):
+            async with self._lock:
+                while not self.try_acquire(tokens):
+                    await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    async def _acquire_shared(self, tokens: float) -> bool:
+        """Wait for cluster-wide tokens; False if the server is unavailable"""
+        wait = await coordinator.take(self.shared_key, self.rate, self.burst, tokens)
+        if wait is None:
+            return False
+        if wait > 0:
+            with span("queue", limiter="cluster_rate"):
+                while wait:
+                    await asyncio.sleep(wait)
+                    wait = await coordinator.take(
+                        self.shared_key, self.rate, self.burst, tokens
+                    )
+                    if wait is None:
+                        return False
+        return True
+
+    @property
+    def available(self) -> float:
+        """Tokens currently available"""
+        if self.rate <= 0:
+            return float(self.burst)
+        self._refill()
+        return self._tokens
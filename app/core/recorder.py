@@ -0,0 +1,239 @@
+"""
+Traffic recorder
+
+When RECORD_PATH is set, RecorderMiddleware appends every sampled inbound
+request to that file as one compact JSON line: method, path, query, the
+headers that change routing, the body, the response status and latency,
+and each upstream exchange C2SClient made while serving it (endpoint,
+params, status, response body and timing). `python -m app.core.replay`
+turns such a file back into load against a gateway build, with the
+upstream served from the recorded exchanges.
+
+Recordings are anonymized before they are queued: values under personal
+keys (names, emails, phones, documents) become deterministic pseudonyms,
+so the same customer maps to the same pseudonym in requests and upstream
+responses and replays still line up, and any other string is passed
+through the log redactor (ids are kept as they are). Lines are written by
+a dedicated thread.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from app.core.config import settings
+from app.core.logs import redact
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Key fragments whose values are replaced by pseudonyms
+PII_KEYS = (
+    "name",
+    "customer",
+    "email",
+    "phone",
+    "mobile",
+    "cpf",
+    "cnpj",
+    "document",
+    "address",
+)
+
+# Inbound headers replayed with the request
+RECORDED_HEADERS = {"content-type", "x-request-timeout-ms"}
+
+# Upstream exchanges of the request being recorded, None once it finished
+current_exchanges: ContextVar[Optional[List[Optional[Dict[str, Any]]]]] = ContextVar(
+    "current_exchanges", default=None
+)
+
+
+def pseudonym(key: str, value: str) -> str:
+    """Stable stand-in for a personal value, shaped like the original"""
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:10]
+    key = key.lower()
+    if "email" in key:
+        return f"user-{digest}@example.com"
+    if "phone" in key or "mobile" in key:
+        return "+55" + "".join(str(int(c, 16) % 10) for c in digest)
+    return f"anon-{digest}"
+
+
+def anonymize(value: Any, key: str = "") -> Any:
+    """Copy of a JSON value with personal data pseudonymized or redacted"""
+    if isinstance(value, dict):
+        return {k: anonymize(v, str(k)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item, key) for item in value]
+    if isinstance(value, str):
+        key = key.lower()
+        if key == "id" or key.endswith(("_id", "_ids")):
+            # Ids are kept so replayed requests hit the same records
+            return value
+        if any(fragment in key for fragment in PII_KEYS):
+            return pseudonym(key, value)
+        return redact(value)
+    return value
+
+
+def _decode_body(body: bytes) -> Any:
+    try:
+        return anonymize(json.loads(body))
+    except ValueError:
+        return {"_text": redact(body.decode("utf-8", "replace"))}
+
+
+class TrafficRecorder:
+    """Queues anonymized request records onto an append-only file"""
+
+    def __init__(self, path: str, sample_rate: float, max_body: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rec")
+        self._file = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def upstream(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        status: int,
+        body: bytes,
+        started: float,
+    ):
+        """
+        Record an upstream exchange with the request being served
+
+        Calls made outside a recorded request (warm-up, background
+        refreshes, jobs) are written on their own line, so replay can still
+        answer them.
+        """
+        exchange = {
+            "method": method,
+            "endpoint": endpoint,
+            "params": anonymize(params or {}),
+            "status": status,
+            "body": _decode_body(body) if body else None,
+            "ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        exchanges = current_exchanges.get()
+        if exchanges is not None and exchanges[-1:] != [None]:
+            exchanges.append(exchange)
+        else:
+            self.record({"ts": round(time.time(), 4), "upstream": [exchange]})
+
+    def record(self, entry: Dict[str, Any]):
+        """Queue one finished request for writing"""
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        self._executor.submit(self._write, line)
+        metrics.incr("recorded_requests")
+
+    def _write(self, line: str):
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+        except OSError as e:
+            logger.warning("Could not record traffic to %s: %s", self.path, e)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Flush queued records and close the file"""
+        self._executor.submit(self._close).result()
+
+
+# Global traffic recorder
+recorder = TrafficRecorder(
+    settings.record_path, settings.record_sample_rate, settings.record_max_body
+)
+
+
+class RecorderMiddleware:
+    """ASGI middleware recording sampled requests and their upstream calls"""
+
+    def __init__(self, app):
+        self.app = app
+        self.headers = RECORDED_HEADERS | {
+            settings.tenant_header.lower(),
+            settings.priority_header.lower(),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not recorder.enabled or not recorder.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        truncated = False
+        status = 0
+        exchanges: List[Optional[Dict[str, Any]]] = []
+        token = current_exchanges.set(exchanges)
+
+        async def receive_and_keep():
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) <= recorder.max_body:
+                    body.extend(chunk)
+                else:
+                    truncated = True
+            return message
+
+        async def send_and_note(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        ts = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_keep, send_and_note)
+        finally:
+            current_exchanges.reset(token)
+            recorded = list(exchanges)
+            # Closes the list for background tasks that copied the context
+            exchanges.append(None)
+            query = scope.get("query_string", b"").decode("latin-1")
+            recorder.record(
+                {
+                    "ts": round(ts, 4),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": [
+                        [k, anonymize(v, k)]
+                        for k, v in parse_qsl(query, keep_blank_values=True)
+                    ],
+                    "headers": {
+                        name.decode("latin-1"): value.decode("latin-1")
+                        for name, value in scope.get("headers", [])
+                        if name.decode("latin-1") in self.headers
+                    },
+                    "body": None if truncated or not body else _decode_body(body),
+                    "truncated": truncated,
+                    "status": status,
+                    "ms": round((time.perf_counter() - started) * 1000, 2),
+                    "upstream": recorded,
+                }
+            )
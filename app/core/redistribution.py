@@ -0,0 +1,181 @@
+"""
+Bulk lead redistribution jobs
+
+A redistribution job moves a set of leads (an explicit list, or every
+lead matching lead filters and currently held by a seller) to a fixed
+seller or to sellers picked from a distribution queue. It runs on the
+background job runner (kind "redistribution") with bounded concurrency,
+backs off when the gateway or C2S sheds load, pauses while the tenant's
+upstream quota refuses bulk calls, and records a result per lead.
+
+The resolved lead list and per-lead results are kept in the job state,
+so a job interrupted by a restart resumes and skips leads that already
+have a result.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.admission import Overloaded
+from app.core.client import tenant_clients
+from app.core.errors import error_info
+from app.core.jobs import JobContext, jobs
+from app.core.metrics import metrics
+from app.core.quota import QuotaExceeded
+from app.models.schemas import RedistributionCreate
+
+REDISTRIBUTION = "redistribution"
+
+T = TypeVar("T")
+
+# Attempts per lead when C2S (429) or the gateway (503) sheds load
+MAX_ATTEMPTS = 4
+
+
+def seller_of(lead: Dict[str, Any]) -> Optional[str]:
+    """Seller id currently holding a lead, flat or JSON:API style"""
+    attributes = lead.get("attributes") or {}
+    for source in (lead, attributes):
+        seller = source.get("seller")
+        if isinstance(seller, dict) and seller.get("id") is not None:
+            return str(seller["id"])
+        if source.get("seller_id") is not None:
+            return str(source["seller_id"])
+    return None
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """Seconds to wait before retrying a shed call, None if not retryable"""
+    if isinstance(e, (Overloaded, QuotaExceeded)):
+        return float((e.headers or {}).get("Retry-After", 1))
+    response = getattr(e, "response", None)
+    if response is not None and response.status_code == 429:
+        try:
+            return float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            return 1.0
+    return None
+
+
+async def retry_shed(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run call(), retrying it after the Retry-After of shed calls
+
+    While the tenant's quota refuses bulk calls it waits without counting an
+    attempt, since that is not a failure of the call. Other shed calls are
+    tried MAX_ATTEMPTS times; the last error, or any other error, is raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except QuotaExceeded as e:
+            await asyncio.sleep(retry_after(e))
+        except Exception as e:
+            attempt += 1
+            wait = retry_after(e)
+            if wait is None or attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(wait)
+
+
+def error_result(e: Exception) -> Dict[str, Any]:
+    """Per-lead result of a lead that failed, the same for every bulk job kind"""
+    return {"status": "error", "error": error_info(e)}
+
+
+async def resolve_leads(client, params: Dict[str, Any]) -> List[str]:
+    """Lead ids matching the job's filters and current seller"""
+    criteria = {"sort": "created_at", **(params.get("criteria") or {})}
+    criteria = {key: value for key, value in criteria.items() if value is not None}
+    from_seller_id = params.get("from_seller_id")
+    lead_ids = []
+    page = 1
+    while True:
+        response = await client.get_leads(page=page, perpage=50, **criteria)
+        leads = response.get("data", [])
+        for lead in leads:
+            if from_seller_id and seller_of(lead) != from_seller_id:
+                continue
+            lead_ids.append(str(lead["id"]))
+        if len(leads) < 50:
+            return lead_ids
+        page += 1
+
+
+async def _move(
+    client, params: Dict[str, Any], lead_id: str, exclude: List[str]
+) -> Dict[str, Any]:
+    """Move one lead, retrying while upstream capacity is shed"""
+
+    async def move() -> str:
+        if params.get("seller_id"):
+            await client.forward_lead(lead_id, params["seller_id"])
+            return params["seller_id"]
+        assigned = await client.assign_lead(
+            lead_id, params["queue_id"], params["strategy"], exclude
+        )
+        return assigned["seller_id"]
+
+    try:
+        seller_id = await retry_shed(move)
+    except Exception as e:
+        metrics.incr("redistribution_leads", status="error")
+        return error_result(e)
+    metrics.incr("redistribution_leads", status="ok")
+    return {"status": "ok", "seller_id": seller_id}
+
+
+async def redistribute(ctx: JobContext) -> Dict[str, Any]:
+    """Job handler: move every selected lead, one result per lead"""
+    params = ctx.params
+    state = ctx.state
+    client = tenant_clients.get(ctx.tenant)
+
+    if "lead_ids" not in state:
+        lead_ids = params.get("lead_ids")
+        if lead_ids is None:
+            lead_ids = await resolve_leads(client, params)
+        state["lead_ids"] = lead_ids
+        state["results"] = {}
+        await ctx.checkpoint()
+
+    results = state["results"]
+    succeeded = sum(1 for result in results.values() if result["status"] == "ok")
+    progress = {
+        "total": len(state["lead_ids"]),
+        "done": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+    }
+    exclude = list(params.get("exclude") or [])
+    if params.get("from_seller_id") and params["from_seller_id"] not in exclude:
+        exclude.append(params["from_seller_id"])
+    queue: asyncio.Queue = asyncio.Queue()
+    for lead_id in state["lead_ids"]:
+        if lead_id not in results:
+            queue.put_nowait(lead_id)
+
+    async def worker():
+        while not queue.empty():
+            lead_id = queue.get_nowait()
+            result = await _move(client, params, lead_id, exclude)
+            results[lead_id] = result
+            progress["done"] += 1
+            progress["succeeded" if result["status"] == "ok" else "failed"] += 1
+            await ctx.report(**progress)
+
+    workers = [
+        asyncio.ensure_future(worker()) for _ in range(params.get("concurrency", 5))
+    ]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    await ctx.report(**progress)
+    return {**progress, "results": results}
+
+
+jobs.register(REDISTRIBUTION, redistribute, RedistributionCreate)
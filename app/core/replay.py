@@ -0,0 +1,315 @@
+"""
+Replay recorded traffic against a gateway build
+
+Reads a recording made with RECORD_PATH (see app.core.recorder) and:
+
+- serves the recorded upstream exchanges from a stub C2S API, matching
+  calls by method, endpoint and query and waiting the recorded upstream
+  time (divided by the speed factor) before answering;
+- sends the recorded inbound requests to a gateway at their recorded
+  offsets, at 1x or accelerated speed, open-loop like real traffic;
+- reports throughput and latency percentiles overall and per route, and
+  the deltas against a baseline report from another build.
+
+Start the gateway under test with C2S_BASE_URL pointing at the stub, and
+with the same settings for every build being compared:
+
+    python -m app.core.replay run recording.jsonl \\
+        --gateway http://127.0.0.1:8000 --stub-port 9100 --speed 4 \\
+        --output build-b.json --baseline build-a.json
+    python -m app.core.replay stub recording.jsonl --port 9100
+    python -m app.core.replay compare build-a.json build-b.json
+
+This module only depends on httpx and uvicorn, so it runs without the
+gateway's settings.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+# Path segments containing a digit are grouped as ids in per-route stats
+_ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+ExchangeKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """Recorded lines, oldest first (lines without a method only hold
+    upstream calls made outside a request)"""
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                requests.append(json.loads(line))
+    requests.sort(key=lambda entry: entry["ts"])
+    return requests
+
+
+def exchange_key(method: str, path: str, query: httpx.QueryParams) -> ExchangeKey:
+    """Match key of an upstream call: method, path and sorted query"""
+    return method.upper(), path, tuple(sorted(query.multi_items()))
+
+
+def route_of(method: str, path: str) -> str:
+    return f"{method} {_ID_SEGMENT.sub('/:id', path)}"
+
+
+# ========== STUB UPSTREAM ==========
+
+
+class StubUpstream:
+    """ASGI app answering upstream calls with recorded exchanges"""
+
+    def __init__(self, requests: List[Dict[str, Any]], speed: float = 1.0):
+        self.speed = speed
+        self.exchanges: Dict[ExchangeKey, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.unmatched = 0
+        for request in requests:
+            for exchange in request.get("upstream", []):
+                key = exchange_key(
+                    exchange["method"],
+                    exchange["endpoint"],
+                    httpx.QueryParams(exchange.get("params") or {}),
+                )
+                self.exchanges[key].append(exchange)
+
+    def next_exchange(self, key: ExchangeKey) -> Optional[Dict[str, Any]]:
+        """Recorded exchanges for a key in order, repeating the last one"""
+        recorded = self.exchanges.get(key)
+        if not recorded:
+            return None
+        return recorded.popleft() if len(recorded) > 1 else recorded[0]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        more_body = True
+        while more_body:
+            message = await receive()
+            more_body = message.get("more_body", False)
+
+        query = httpx.QueryParams(scope.get("query_string", b"").decode("latin-1"))
+        key = exchange_key(scope["method"], scope["path"], query)
+        exchange = self.next_exchange(key)
+        if exchange is None:
+            self.unmatched += 1
+            status, body = 404, {"error": "not in recording"}
+        else:
+            await asyncio.sleep(exchange["ms"] / 1000 / self.speed)
+            status, body = exchange["status"], exchange.get("body")
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})
+
+
+def serve_stub(stub: StubUpstream, port: int, background: bool = False):
+    """Run the stub with uvicorn, in a daemon thread if background"""
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning")
+    )
+    if not background:
+        server.run()
+        return server
+    thread = threading.Thread(target=server.run, name="replay-stub", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ========== DRIVER ==========
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p90_ms": round(percentile(latencies, 0.90), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies, default=0.0), 2),
+    }
+
+
+async def drive(
+    requests: List[Dict[str, Any]], gateway: str, speed: float, timeout: float
+) -> Dict[str, Any]:
+    """Send the recorded requests at their (scaled) offsets and time them"""
+    requests = [request for request in requests if "method" in request]
+    results: List[Tuple[str, float, int, int]] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+
+    async with httpx.AsyncClient(
+        base_url=gateway, timeout=timeout, limits=limits
+    ) as client:
+
+        async def send(request: Dict[str, Any]):
+            body = request.get("body")
+            started = time.perf_counter()
+            try:
+                response = await client.request(
+                    request["method"],
+                    request["path"],
+                    params=request.get("query") or None,
+                    headers=request.get("headers") or {},
+                    content=json.dumps(body).encode() if body is not None else None,
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            elapsed = (time.perf_counter() - started) * 1000
+            route = route_of(request["method"], request["path"])
+            results.append((route, elapsed, status, request.get("status", 0)))
+
+        origin = requests[0]["ts"] if requests else 0.0
+        loop_start = time.perf_counter()
+        tasks = []
+        for request in requests:
+            if request.get("truncated"):
+                continue
+            elapsed = time.perf_counter() - loop_start
+            delay = (request["ts"] - origin) / speed - elapsed
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(request)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - loop_start
+
+    by_route: Dict[str, List[float]] = defaultdict(list)
+    for route, elapsed, _, _ in results:
+        by_route[route].append(elapsed)
+    return {
+        "requests": len(results),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(results) / duration, 2) if duration else 0.0,
+        "errors": sum(
+            1 for _, _, status, _ in results if status == 0 or status >= 500
+        ),
+        "status_mismatches": sum(
+            1 for _, _, status, recorded in results if recorded and status != recorded
+        ),
+        "latency": summarize([elapsed for _, elapsed, _, _ in results]),
+        "routes": {
+            route: summarize(values) for route, values in sorted(by_route.items())
+        },
+    }
+
+
+# ========== COMPARISON ==========
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Readable latency and throughput deltas of current against baseline"""
+    lines = [
+        f"{'metric':<40}{'baseline':>12}{'current':>12}{'delta':>10}",
+        f"{'throughput_rps':<40}{baseline['throughput_rps']:>12}"
+        f"{current['throughput_rps']:>12}"
+        f"{_delta(baseline['throughput_rps'], current['throughput_rps']):>10}",
+    ]
+    for name in ("p50_ms", "p90_ms", "p99_ms", "max_ms"):
+        old, new = baseline["latency"][name], current["latency"][name]
+        lines.append(f"{name:<40}{old:>12}{new:>12}{_delta(old, new):>10}")
+    for name in ("errors", "status_mismatches"):
+        lines.append(f"{name:<40}{baseline[name]:>12}{current[name]:>12}{'':>10}")
+    for route, stats in current["routes"].items():
+        old = baseline["routes"].get(route)
+        if old is not None:
+            label = f"{route[:32]} p99"
+            lines.append(
+                f"{label:<40}{old['p99_ms']:>12}{stats['p99_ms']:>12}"
+                f"{_delta(old['p99_ms'], stats['p99_ms']):>10}"
+            )
+    return "\n".join(lines)
+
+
+# ========== CLI ==========
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.replay")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay a recording against a gateway")
+    run.add_argument("recording")
+    run.add_argument("--gateway", default="http://127.0.0.1:8000")
+    run.add_argument("--speed", type=float, default=1.0, help="Replay speed factor")
+    run.add_argument("--stub-port", type=int, default=9100)
+    run.add_argument("--no-stub", action="store_true", help="Stub runs elsewhere")
+    run.add_argument("--timeout", type=float, default=30.0)
+    run.add_argument("--output", help="Write the report as JSON")
+    run.add_argument("--baseline", help="Report of another build to compare to")
+
+    stub = commands.add_parser("stub", help="Only serve the recorded upstream")
+    stub.add_argument("recording")
+    stub.add_argument("--port", type=int, default=9100)
+    stub.add_argument("--speed", type=float, default=1.0)
+
+    diff = commands.add_parser("compare", help="Compare two replay reports")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            print(compare(baseline, json.load(f)))
+        return
+
+    requests = load_recording(args.recording)
+    if args.command == "stub":
+        serve_stub(StubUpstream(requests, args.speed), args.port)
+        return
+
+    upstream = None
+    if not args.no_stub:
+        upstream = StubUpstream(requests, args.speed)
+        serve_stub(upstream, args.stub_port, background=True)
+    report = asyncio.run(drive(requests, args.gateway, args.speed, args.timeout))
+    report["speed"] = args.speed
+    if upstream is not None:
+        report["stub_unmatched"] = upstream.unmatched
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
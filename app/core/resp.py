@@ -0,0 +1,249 @@
+"""
+Minimal Redis protocol (RESP) client and stand-in server
+
+The gateway only needs a handful of commands from its coordination
+server, so it speaks the protocol directly instead of depending on a
+Redis client library. `python -m app.core.resp serve` runs an in-memory
+stand-in with just those commands (strings with expiry, counters and
+pub/sub), for development and tests; it needs none of the gateway's
+settings.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import unquote, urlsplit
+
+
+class RespError(Exception):
+    """Error reply from the coordination server"""
+
+
+class ConnectionClosed(ConnectionResetError):
+    """The connection was closed before the commands were sent"""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    """RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """One RESP reply; error replies are returned as RespError instances"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Coordination server closed the connection")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        return RespError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f"Unexpected reply {line!r}")
+
+
+class RespConnection:
+    """One Redis-protocol connection running pipelined commands"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, url: str) -> "RespConnection":
+        """Connect to redis://[user:password@]host[:port][/db] or unix:///path"""
+        parts = urlsplit(url)
+        if parts.scheme == "unix":
+            reader, writer = await asyncio.open_unix_connection(parts.path)
+        elif parts.scheme in ("redis", "rediss"):
+            reader, writer = await asyncio.open_connection(
+                parts.hostname or "127.0.0.1",
+                parts.port or 6379,
+                ssl=parts.scheme == "rediss" or None,
+            )
+        else:
+            raise ValueError(f"Unsupported coordination URL scheme {parts.scheme!r}")
+        connection = cls(reader, writer)
+        commands = []
+        if parts.password:
+            auth = [unquote(parts.password)]
+            if parts.username:
+                auth.insert(0, unquote(parts.username))
+            commands.append(["AUTH", *auth])
+        db = parts.path.strip("/") if parts.scheme != "unix" else ""
+        if db and db != "0":
+            commands.append(["SELECT", db])
+        if commands:
+            await connection.execute(*commands)
+        return connection
+
+    async def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        """Send commands in one write and return their replies in order"""
+        async with self._lock:
+            if self.closed:
+                raise ConnectionClosed("Coordination connection is closed")
+            try:
+                self.writer.write(b"".join(encode_command(c) for c in commands))
+                await self.writer.drain()
+                replies = [await read_reply(self.reader) for _ in commands]
+            except BaseException:
+                # Unread replies (e.g. after a cancellation) would be handed
+                # to the next caller, so the connection can't be reused
+                self.close()
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+
+# ========== STAND-IN SERVER ==========
+
+
+class StandInServer:
+    """
+    Minimal Redis-protocol server for development and tests
+
+    Supports PING, ECHO, AUTH, SELECT, QUIT, GET, SET (NX/XX/EX/PX), INCR,
+    INCRBY, DEL, PUBLISH and SUBSCRIBE, in memory.
+    """
+
+    def __init__(self):
+        self.values: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.channels: Dict[bytes, List[asyncio.StreamWriter]] = {}
+
+    def _get(self, key: bytes) -> Any:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    def _set(self, args: List[bytes]) -> bytes:
+        key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+        exists = self._get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return b"$-1\r\n"
+        self.values[key] = value
+        self.expires.pop(key, None)
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                ttl = float(args[2 + options.index(unit) + 1]) * scale
+                self.expires[key] = time.monotonic() + ttl
+        return b"+OK\r\n"
+
+    def _incrby(self, key: bytes, amount: int) -> bytes:
+        value = int(self._get(key) or 0) + amount
+        self.values[key] = str(value).encode()
+        return b":%d\r\n" % value
+
+    async def _publish(self, channel: bytes, payload: bytes) -> bytes:
+        subscribers = self.channels.get(channel, [])
+        message = encode_command([b"message", channel, payload])
+        for writer in list(subscribers):
+            try:
+                writer.write(message)
+                await writer.drain()
+            except ConnectionError:
+                subscribers.remove(writer)
+        return b":%d\r\n" % len(subscribers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: List[bytes] = []
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                name, args = command[0].upper(), command[1:]
+                if name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                if name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel, []).append(writer)
+                        subscribed.append(channel)
+                        writer.write(
+                            b"*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:%d\r\n"
+                            % (len(channel), channel, len(subscribed))
+                        )
+                elif name in (b"PING", b"AUTH", b"SELECT"):
+                    writer.write(b"+PONG\r\n" if name == b"PING" else b"+OK\r\n")
+                elif name == b"ECHO":
+                    writer.write(b"$%d\r\n%s\r\n" % (len(args[0]), args[0]))
+                elif name == b"GET":
+                    value = self._get(args[0])
+                    writer.write(
+                        b"$-1\r\n"
+                        if value is None
+                        else b"$%d\r\n%s\r\n" % (len(value), value)
+                    )
+                elif name == b"SET":
+                    writer.write(self._set(args))
+                elif name in (b"INCR", b"INCRBY"):
+                    amount = int(args[1]) if name == b"INCRBY" else 1
+                    writer.write(self._incrby(args[0], amount))
+                elif name == b"DEL":
+                    removed = sum(
+                        1 for key in args if self.values.pop(key, None) is not None
+                    )
+                    writer.write(b":%d\r\n" % removed)
+                elif name == b"PUBLISH":
+                    writer.write(await self._publish(args[0], args[1]))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                if writer in self.channels.get(channel, []):
+                    self.channels[channel].remove(writer)
+            writer.close()
+
+    async def serve(self, host: str, port: int, unix: Optional[str] = None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.resp")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Run the stand-in server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=6380)
+    serve.add_argument("--unix", help="Listen on a unix socket instead")
+    args = parser.parse_args(argv)
+    asyncio.run(StandInServer().serve(args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Graceful shutdown
+
+Fly stops idle machines with a signal and kills them kill_timeout seconds
+later, so everything the gateway does at shutdown has to fit in that
+window. Once draining starts (on the stop signal when run with
+`python -m app.main`, otherwise at the start of the shutdown event):
+
+- new requests on kept-alive connections get 503 with Connection: close,
+  so callers retry on another machine instead of waiting;
+- long-polls and event streams return early, so they don't hold the
+  process until the grace runs out;
+- in-flight requests and tracked background tasks (cache refreshes, tag
+  creations) get until SHUTDOWN_GRACE seconds after the signal to finish,
+  and the shutdown event then drains queues with what is left;
+- what finished in time and what was abandoned is logged as one report.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.errors import send_json_response
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Drainer:
+    """Tracks in-flight work and waits for it within the shutdown grace"""
+
+    def __init__(self, grace: float):
+        self.grace = grace
+        self.draining = False
+        self.inflight = 0
+        self.tasks: Set[asyncio.Task] = set()
+        self.report: Dict[str, Any] = {}
+        self._started: Optional[float] = None
+        self._at_start = {"requests": 0, "tasks": 0}
+        self.rejected = 0
+        self.cancelled = 0
+        self._callbacks: List[Callable[[], None]] = []
+
+    def on_drain(self, callback: Callable[[], None]):
+        """Call callback when draining starts (to end long-polls and streams)"""
+        self._callbacks.append(callback)
+
+    def begin(self):
+        """Stop accepting requests; idempotent"""
+        if self.draining:
+            return
+        self.draining = True
+        self._started = time.monotonic()
+        self._at_start = {"requests": self.inflight, "tasks": len(self.tasks)}
+        logger.info(
+            "Draining: %d requests in flight, %d background tasks, %gs grace",
+            self.inflight,
+            len(self.tasks),
+            self.grace,
+        )
+        for callback in self._callbacks:
+            callback()
+
+    def remaining(self) -> float:
+        """Seconds of grace left"""
+        if self._started is None:
+            return self.grace
+        return max(0.0, self.grace - (time.monotonic() - self._started))
+
+    def track(self, task: asyncio.Task) -> asyncio.Task:
+        """Let shutdown wait for a background task"""
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def wait(self) -> Dict[str, Any]:
+        """Wait for in-flight requests and tracked tasks until the grace ends"""
+        self.begin()
+        while self.inflight or self.tasks:
+            left = self.remaining()
+            if left <= 0:
+                break
+            await asyncio.sleep(min(0.05, left))
+
+        abandoned_requests = self.inflight + self.cancelled
+        abandoned_tasks = len(self.tasks)
+        for task in list(self.tasks):
+            task.cancel()
+        self.report.update(
+            requests_drained=max(0, self._at_start["requests"] - abandoned_requests),
+            requests_abandoned=abandoned_requests,
+            requests_rejected=self.rejected,
+            tasks_drained=max(0, self._at_start["tasks"] - abandoned_tasks),
+            tasks_abandoned=abandoned_tasks,
+        )
+        return self.report
+
+    def finish(self) -> Dict[str, Any]:
+        """Log the shutdown report"""
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        self.report["seconds"] = round(elapsed, 3)
+        for name, value in self.report.items():
+            if isinstance(value, int) and value:
+                metrics.incr("shutdown_" + name, value)
+        logger.info(
+            "Shutdown drained %s",
+            ", ".join(f"{name}={value}" for name, value in self.report.items()),
+            extra={"shutdown": self.report},
+        )
+        return self.report
+
+
+# Global drain coordinator
+drainer = Drainer(settings.shutdown_grace)
+
+
+class DrainMiddleware:
+    """ASGI middleware counting in-flight requests, refusing new ones when draining"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if drainer.draining:
+            drainer.rejected += 1
+            await send_json_response(
+                send,
+                503,
+                {"detail": "Gateway is shutting down"},
+                {"Retry-After": "1", "Connection": "close"},
+            )
+            return
+
+        drainer.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        except asyncio.CancelledError:
+            if drainer.draining:
+                drainer.cancelled += 1
+            raise
+        finally:
+            drainer.inflight -= 1
@@ -0,0 +1,99 @@
+"""
+Tag name to id index
+
+Tagging a lead by name used to take up to three round-trips (find the tag,
+create it if missing, tag the lead). Names are resolved here from the
+reference-cached tag list instead: the index is rebuilt whenever the
+cached response object changes, so a lookup is a dict read. Missing tags
+are created once per tenant and name even when many requests ask for
+them at the same time, and created ids are served from an overlay until
+the refreshed tag list includes them.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.metrics import metrics
+from app.core.shutdown import drainer
+from app.core.tenants import detached_task
+
+
+def normalize(name: str) -> str:
+    """Case- and whitespace-insensitive tag name key"""
+    return " ".join(name.split()).casefold()
+
+
+def tag_ids(response: Dict[str, Any]) -> Dict[str, str]:
+    """Normalized name -> id of the tags in a tags response, flat or JSON:API"""
+    ids = {}
+    for item in response.get("data", []):
+        attributes = item.get("attributes") or {}
+        name = attributes.get("name", item.get("name"))
+        if name and item.get("id") is not None:
+            ids.setdefault(normalize(str(name)), str(item["id"]))
+    return ids
+
+
+def created_tag_id(response: Dict[str, Any]) -> Optional[str]:
+    """Id of the tag in a create tag response"""
+    data = response.get("data", response)
+    if isinstance(data, dict) and data.get("id") is not None:
+        return str(data["id"])
+    return None
+
+
+class TagIndex:
+    """Per-tenant tag name index with single-flight creation"""
+
+    def __init__(self):
+        self._indexes: Dict[str, Tuple[Any, Dict[str, str]]] = {}
+        self._created: Dict[str, Dict[str, str]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _index(self, tenant: str, response: Dict[str, Any]) -> Dict[str, str]:
+        """Name index for a tags response, rebuilt when it changed"""
+        cached = self._indexes.get(tenant)
+        if cached is None or cached[0] is not response:
+            index = tag_ids(response)
+            created = self._created.get(tenant, {})
+            for key in [key for key in created if key in index]:
+                del created[key]
+            self._indexes[tenant] = cached = (response, index)
+        return cached[1]
+
+    def lookup(
+        self, tenant: str, response: Dict[str, Any], name: str
+    ) -> Optional[str]:
+        """Tag id for a name, None if the tenant has no such tag yet"""
+        key = normalize(name)
+        tag_id = self._index(tenant, response).get(key)
+        if tag_id is None:
+            tag_id = self._created.get(tenant, {}).get(key)
+        metrics.incr("tag_index_lookups", result="hit" if tag_id else "miss")
+        return tag_id
+
+    async def create_once(
+        self, tenant: str, name: str, create: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Run create() for a missing tag, joining a creation already running"""
+        key = (tenant, normalize(name))
+        task = self._inflight.get(key)
+        if task is None:
+            task = drainer.track(detached_task(self._create(key, create), key[0]))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _create(
+        self, key: Tuple[str, str], create: Callable[[], Awaitable[str]]
+    ) -> str:
+        tenant, name = key
+        try:
+            tag_id = await create()
+            self._created.setdefault(tenant, {})[name] = tag_id
+            return tag_id
+        finally:
+            self._inflight.pop(key, None)
+
+
+# Global tag index
+tag_index = TagIndex()
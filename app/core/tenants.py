@@ -0,0 +1,77 @@
+"""
+Tenant selection for multi-company deployments
+
+A request selects its tenant with the tenant header (X-C2S-Tenant by
+default) or a /t/{tenant}/ path prefix. The prefix is stripped before
+routing, so /t/acme/leads is served by the regular /leads route.
+"""
+
+import asyncio
+import contextvars
+from contextvars import ContextVar
+from typing import Coroutine, Optional
+
+from app.core.config import settings
+from app.core.errors import send_json_response
+
+# Tenant of the request being handled
+current_tenant: ContextVar[str] = ContextVar(
+    "current_tenant", default=settings.default_tenant
+)
+
+TENANT_PATH_PREFIX = "/t/"
+
+
+def detached_task(coro: Coroutine, tenant: Optional[str] = None) -> asyncio.Task:
+    """
+    Run coro in a task whose context carries only the tenant
+
+    For work shared by several requests, which must not inherit the
+    deadline, lane or trace of the request that happened to start it.
+    """
+    context = contextvars.Context()
+    context.run(current_tenant.set, tenant or current_tenant.get())
+    return asyncio.get_running_loop().create_task(coro, context=context)
+
+
+def is_known_tenant(tenant: str) -> bool:
+    """Check whether a tenant is configured"""
+    return tenant == settings.default_tenant or tenant in settings.c2s_tenants
+
+
+class TenantMiddleware:
+    """ASGI middleware resolving the tenant and binding it to the request context"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.tenant_header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        tenant = None
+        path = scope["path"]
+        if path.startswith(TENANT_PATH_PREFIX):
+            tenant, _, rest = path[len(TENANT_PATH_PREFIX):].partition("/")
+            scope = dict(scope)
+            scope["path"] = "/" + rest
+            scope["raw_path"] = scope["path"].encode("utf-8")
+        else:
+            for name, value in scope.get("headers", []):
+                if name == self.header:
+                    tenant = value.decode("latin-1").strip()
+                    break
+
+        tenant = tenant or settings.default_tenant
+        if not is_known_tenant(tenant):
+            await send_json_response(send, 404, {"detail": f"Unknown tenant: {tenant}"})
+            return
+
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+
@@ -0,0 +1,225 @@
+"""
+Request tracing
+
+Each gateway request gets a trace: a root span opened by TracingMiddleware
+(continuing a W3C traceparent if the caller sent one) and child spans
+around upstream calls, admission queueing, connection setup, cache lookups
+and enrichment sub-requests. Finished traces go to an in-memory ring
+buffer (GET /debug/traces) and, when TRACE_EXPORT_PATH is set, are
+appended to a JSON lines file. The response carries a Server-Timing header
+summarizing where the time went, and upstream calls carry traceparent.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Span names summed into the Server-Timing header, in header order
+TIMING_SPANS = ("queue", "connect", "upstream", "c2s", "cache", "ibvi")
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attrs")
+
+    def __init__(self, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+        }
+
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+
+    def server_timing(self, root: Span) -> str:
+        """Server-Timing header value: total plus summed durations per span name"""
+        totals: Dict[str, float] = {}
+        for recorded in self.spans:
+            if recorded.name in TIMING_SPANS:
+                duration = recorded.duration_ms
+                totals[recorded.name] = totals.get(recorded.name, 0.0) + duration
+        parts = [f"total;dur={root.duration_ms:.1f}"]
+        for name in TIMING_SPANS:
+            if name in totals:
+                parts.append(f"{name};dur={totals[name]:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.spans[0].start if self.spans else 0.0
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "spans": [recorded.to_dict(origin) for recorded in self.spans],
+        }
+
+
+# Trace and innermost open span of the request being handled
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span (no-op outside a trace)"""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    new_span = Span(name, parent.span_id if parent else None, attrs)
+    trace.spans.append(new_span)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        new_span.end = time.perf_counter()
+        current_span.reset(token)
+
+
+def outbound_headers() -> Dict[str, str]:
+    """traceparent header continuing the current trace, if any"""
+    trace = current_trace.get()
+    parent = current_span.get()
+    if trace is None or parent is None:
+        return {}
+    return {"traceparent": f"00-{trace.trace_id}-{parent.span_id}-01"}
+
+
+def connection_tracer():
+    """httpcore trace hook recording TCP/TLS connection setup as spans"""
+    trace = current_trace.get()
+    if trace is None:
+        return None
+    parent = current_span.get()
+    open_spans: Dict[str, Span] = {}
+
+    async def hook(event: str, info: Dict[str, Any]):
+        step, _, phase = event.rpartition(".")
+        if not step.startswith("connection."):
+            return
+        if phase == "started":
+            open_spans[step] = Span(
+                "connect", parent.span_id if parent else None, {"step": step[11:]}
+            )
+        elif step in open_spans:
+            finished = open_spans.pop(step)
+            finished.end = time.perf_counter()
+            if phase == "failed":
+                finished.attrs["error"] = type(info.get("exception")).__name__
+            trace.spans.append(finished)
+
+    return hook
+
+
+class TraceCollector:
+    """Ring buffer of finished traces with optional JSON lines export"""
+
+    def __init__(self, size: int, path: str = ""):
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.path = path
+
+    def record(self, trace: Trace):
+        exported = trace.to_dict()
+        self.traces.append(exported)
+        if self.path:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self._write, json.dumps(exported))
+
+    def _write(self, line: str):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("Could not export trace to %s: %s", self.path, e)
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        return list(self.traces)[-limit:][::-1]
+
+
+# Global trace collector
+collector = TraceCollector(settings.trace_buffer_size, settings.trace_export_path)
+
+
+def _parse_traceparent(scope) -> Tuple[Optional[str], Optional[str]]:
+    """(trace id, parent span id) from the caller's traceparent header"""
+    for name, value in scope.get("headers", []):
+        if name == b"traceparent":
+            match = TRACEPARENT_RE.match(value.decode("latin-1").strip().lower())
+            if match:
+                return match.group(1), match.group(2)
+    return None, None
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span and adding Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, caller_span_id = _parse_traceparent(scope)
+        trace = Trace(trace_id)
+        trace_token = current_trace.set(trace)
+
+        with span("request", method=scope["method"], path=scope["path"]) as root:
+            root.parent_id = caller_span_id
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    root.attrs["status"] = message["status"]
+                    headers = list(message.get("headers", []))
+                    timing = trace.server_timing(root)
+                    headers.append((b"server-timing", timing.encode("latin-1")))
+                    headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                current_trace.reset(trace_token)
+        collector.record(trace)
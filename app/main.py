@@ -4,19 +4,55 @@ FastAPI application for managing Contact2Sale operations
 """
 
 import logging
+import os
+import time
 
+# Captured before the heavy imports below so startup reports include them
+_import_started = time.perf_counter()
+
+import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.admission import admission
+from app.core.cache import lead_list_cache, reference_cache
+from app.core.campaigns import campaign_store
+from app.core.client import tenant_clients
 from app.core.config import settings
-from app.routes import company, distribution, leads, sellers, tags, test, webhooks
+from app.core.coordination import coordinator
+from app.core.deadlines import DeadlineMiddleware
+from app.core.fanout import fanout
+from app.core.feed import change_feeds
+from app.core.jobs import jobs as job_runner
+from app.core.logs import configure_logging
+from app.core.metrics import metrics
+from app.core.priority import PriorityMiddleware
+from app.core.profiling import loop_monitor
+from app.core.quota import quota
+from app.core.recorder import RecorderMiddleware, recorder
+from app.core.shutdown import DrainMiddleware, drainer
+from app.core.tenants import TenantMiddleware
+from app.core.tracing import TracingMiddleware
+from app.routes import (
+    campaigns,
+    company,
+    debug,
+    distribution,
+    jobs,
+    leads,
+    sellers,
+    tags,
+    test,
+    webhooks,
+)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Startup timings in milliseconds, reported by /health
+startup_stats = {}
+
 # Create FastAPI app
 app = FastAPI(
     title="C2S Gateway",
@@ -35,6 +71,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Priority lane by header or route (inside tenant so it sees stripped paths)
+app.add_middleware(PriorityMiddleware)
+
+# Tenant selection by header or /t/{tenant}/ path prefix
+app.add_middleware(TenantMiddleware)
+
+# Caller deadlines (X-Request-Timeout-Ms) bound to the request context
+app.add_middleware(DeadlineMiddleware)
+
+# Request traces and Server-Timing headers
+app.add_middleware(TracingMiddleware)
+
+# Opt-in traffic recording for replay (sees the raw request)
+app.add_middleware(RecorderMiddleware)
+
+# In-flight request tracking and refusal while draining (outermost)
+app.add_middleware(DrainMiddleware)
+
 # Include routers
 app.include_router(leads.router)
 app.include_router(tags.router)
@@ -42,8 +96,13 @@ app.include_router(sellers.router)
 app.include_router(distribution.router)
 app.include_router(webhooks.router)
 app.include_router(company.router)
+app.include_router(campaigns.router)
+app.include_router(debug.router)
+app.include_router(jobs.router)
 app.include_router(test.router)  # TEST routes - DELETE after testing
 
+startup_stats["import_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+
 
 # Root endpoint
 @app.get("/")
@@ -66,21 +125,117 @@ async def health():
     return {
         "status": "healthy",
         "c2s_configured": bool(settings.c2s_token and settings.c2s_base_url),
+        "startup": startup_stats,
+        "reference_cache_entries": len(reference_cache),
+        "lead_list_cache": {
+            "entries": len(lead_list_cache),
+            "bytes": lead_list_cache.bytes,
+        },
+        "coordination": coordinator.stats(),
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Gateway metrics: upstream latencies, errors, hedging and admission queues"""
+    return {**metrics.snapshot(), "admission": admission.stats()}
+
+
+@app.get("/quota")
+async def get_quota():
+    """Upstream calls per tenant in rolling hour/day windows, budgets and projections"""
+    return quota.snapshot()
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Startup event - log configuration"""
+    """Startup event - log configuration, restore caches and warm connections"""
+    started = time.perf_counter()
     logger.info("=" * 60)
     logger.info("C2S Gateway Starting...")
-    logger.info(f"C2S Base URL: {settings.c2s_base_url}")
-    logger.info(f"C2S Token: {'***' + settings.c2s_token[-10:]}")
-    logger.info(f"Gateway Port: {settings.c2s_gateway_port}")
+    logger.info("C2S Base URL: %s", settings.c2s_base_url)
+    logger.info("C2S Token: ***%s", settings.c2s_token[-10:])
+    logger.info("Gateway Port: %s", settings.c2s_gateway_port)
+
+    restored = reference_cache.load(settings.cache_snapshot_path)
+    logger.info("Restored %d reference cache entries from snapshot", restored)
+    restored = change_feeds.load(settings.feed_state_path)
+    if restored:
+        logger.info("Restored %d lead change sync watermarks", restored)
+    logger.info("Tenants: %s", ", ".join(settings.tenant_names()))
+    await quota.start()
+    await coordinator.start()
+    await tenant_clients.startup()
+    await fanout.start()
+    await campaign_store.start()
+    await job_runner.start()
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+
+    startup_stats["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_stats["total_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    logger.info(
+        "Startup complete: import %sms, startup %sms, total %sms",
+        startup_stats["import_ms"],
+        startup_stats["startup_ms"],
+        startup_stats["total_ms"],
+        extra={"startup": startup_stats},
+    )
     logger.info("=" * 60)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Shutdown event"""
+    """Shutdown event - drain in-flight work, persist state and close connections"""
     logger.info("C2S Gateway shutting down...")
+    drainer.begin()
+    # Jobs checkpoint and resume at the next start, so they stop first
+    drainer.report["jobs_interrupted"] = await job_runner.stop()
+    change_feeds.stop()
+    await drainer.wait()
+
+    drained = await fanout.drain(drainer.remaining())
+    drainer.report["webhook_events_delivered"] = drained["delivered"]
+    drainer.report["webhook_events_failed"] = drained["failed"]
+    drainer.report["webhook_events_saved"] = await fanout.stop()
+
+    try:
+        saved = reference_cache.save(settings.cache_snapshot_path)
+        logger.info("Saved %d reference cache entries to snapshot", saved)
+    except OSError as e:
+        logger.warning("Could not save reference cache snapshot: %s", e)
+    try:
+        change_feeds.save(settings.feed_state_path)
+    except OSError as e:
+        logger.warning("Could not save lead change sync watermarks: %s", e)
+    await campaign_store.stop()
+    await quota.stop()
+    loop_monitor.stop()
+    if recorder.enabled:
+        recorder.close()
+    await coordinator.stop()
+    await tenant_clients.close()
+    drainer.finish()
+
+
+class GatewayServer(uvicorn.Server):
+    """Uvicorn server that starts draining as soon as the stop signal arrives"""
+
+    def handle_exit(self, sig, frame):
+        drainer.begin()
+        super().handle_exit(sig, frame)
+
+
+if __name__ == "__main__":
+    # Requests still running SHUTDOWN_GRACE seconds after the signal are
+    # cancelled, then the shutdown event drains queues with what is left
+    GatewayServer(
+        uvicorn.Config(
+            app,
+            host="0.0.0.0",
+            port=int(os.environ.get("PORT", settings.c2s_gateway_port)),
+            timeout_graceful_shutdown=settings.shutdown_grace,
+            # Keep the queued, redacting handlers from configure_logging()
+            log_config=None,
+        )
+    ).run()
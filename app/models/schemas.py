@@ -3,9 +3,17 @@ Pydantic models for C2S Gateway
 """
 
 from datetime import datetime
-from typing import List, Optional
-
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import (
+    AnyHttpUrl,
+    BaseModel,
+    ConfigDict,
+    Field,
+    field_validator,
+    model_validator,
+)
+from typing_extensions import TypedDict
 
 # ========== LEAD MODELS ==========
 
@@ -54,6 +62,14 @@ class LeadQuery(BaseModel):
     tags: Optional[str] = None
 
 
+class LeadLookup(BaseModel):
+    """Schema for fetching many leads by id in one call"""
+
+    ids: List[str] = Field(
+        ..., min_length=1, max_length=500, description="Lead IDs (duplicates ignored)"
+    )
+
+
 # ========== MESSAGE MODELS ==========
 
 
@@ -106,6 +122,32 @@ class LeadTagCreate(BaseModel):
     tag_id: str = Field(..., description="Tag ID to associate")
 
 
+class LeadTagsByName(BaseModel):
+    """Schema for tagging a lead by tag name"""
+
+    names: List[str] = Field(
+        ..., min_length=1, max_length=50, description="Tag name or list of names"
+    )
+    create: bool = Field(default=True, description="Create tags that don't exist")
+
+    @field_validator("names", mode="before")
+    @classmethod
+    def distinct_names(cls, v):
+        """Accept a single name; drop blank names and case-insensitive repeats"""
+        if isinstance(v, str):
+            v = [v]
+        if not isinstance(v, list):
+            return v
+        names: Dict[Any, Any] = {}
+        for name in v:
+            if isinstance(name, str):
+                name = " ".join(name.split())
+                if not name:
+                    continue
+            names.setdefault(name.casefold() if isinstance(name, str) else name, name)
+        return list(names.values())
+
+
 # ========== SELLER MODELS ==========
 
 
@@ -150,6 +192,64 @@ class NextSeller(BaseModel):
     seller_id: str = Field(..., description="Seller ID")
 
 
+class LeadAssign(BaseModel):
+    """Schema for assigning a lead to a seller picked by the gateway"""
+
+    lead_id: str = Field(..., description="Lead ID to assign")
+    queue_id: str = Field(..., description="Distribution queue to pick a seller from")
+    strategy: Literal["round_robin", "least_loaded"] = Field(
+        default="round_robin", description="Seller selection strategy"
+    )
+    exclude: List[str] = Field(
+        default_factory=list, description="Seller IDs that must not receive the lead"
+    )
+
+
+class LeadFilters(BaseModel):
+    """Lead list filters selecting the leads of a bulk operation"""
+
+    created_gte: Optional[str] = Field(None, description="Created date >= (ISO 8601)")
+    created_lt: Optional[str] = Field(None, description="Created date < (ISO 8601)")
+    updated_gte: Optional[str] = Field(None, description="Updated date >= (ISO 8601)")
+    updated_lt: Optional[str] = Field(None, description="Updated date < (ISO 8601)")
+    status: Optional[str] = Field(None, description="Lead status filter")
+    tags: Optional[str] = None
+
+
+class RedistributionCreate(BaseModel):
+    """Schema for a bulk redistribution job"""
+
+    lead_ids: Optional[List[str]] = Field(
+        None, max_length=10000, description="Leads to move"
+    )
+    criteria: Optional[LeadFilters] = Field(
+        None, description="Move every lead matching these filters"
+    )
+    from_seller_id: Optional[str] = Field(
+        None, description="Only move leads held by this seller (and never to them)"
+    )
+    seller_id: Optional[str] = Field(None, description="Move every lead to this seller")
+    queue_id: Optional[str] = Field(
+        None, description="Pick a seller per lead from this distribution queue"
+    )
+    strategy: Literal["round_robin", "least_loaded"] = Field(
+        default="round_robin", description="Seller selection strategy for queue_id"
+    )
+    exclude: List[str] = Field(
+        default_factory=list, description="Seller IDs that must not receive leads"
+    )
+    concurrency: int = Field(default=5, ge=1, le=20, description="Leads moved at once")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        """Require one lead selection and one target"""
+        if self.lead_ids is None and self.criteria is None and not self.from_seller_id:
+            raise ValueError("Provide lead_ids, criteria or from_seller_id")
+        if bool(self.seller_id) == bool(self.queue_id):
+            raise ValueError("Provide exactly one of seller_id or queue_id")
+        return self
+
+
 class DistributionRuleCreate(BaseModel):
     """Schema for creating distribution rule"""
 
@@ -159,6 +259,32 @@ class DistributionRuleCreate(BaseModel):
     actions: dict = Field(..., description="Rule actions")
 
 
+# ========== CAMPAIGN MODELS ==========
+
+
+class CampaignMapping(BaseModel):
+    """Schema for a Google Ads campaign mapped to the property it advertises"""
+
+    model_config = ConfigDict(extra="allow")
+
+    campaign_name: str = Field(..., description="Campaign name")
+    campaign_type: Optional[str] = Field(None, description="SEARCH, PMAX, ...")
+    ad_group_ids: List[str] = Field(
+        default_factory=list, description="Ad groups whose leads map here"
+    )
+    form_ids: List[str] = Field(
+        default_factory=list, description="Lead form ids whose leads map here"
+    )
+    property: Dict[str, Any] = Field(
+        default_factory=dict, description="Property (description, prop_ref, price)"
+    )
+    lead_source: Optional[Dict[str, Any]] = Field(None, description="C2S lead source")
+    product_details: Dict[str, Any] = Field(
+        default_factory=dict, description="Building details shown in the lead body"
+    )
+    message_template: Optional[str] = Field(None, description="Lead message template")
+
+
 # ========== WEBHOOK MODELS ==========
 
 
@@ -175,6 +301,94 @@ class WebhookUnsubscribe(BaseModel):
     url: str = Field(..., description="Webhook URL to unsubscribe")
 
 
+class WebhookSubscriberCreate(BaseModel):
+    """Schema for registering an internal webhook subscriber"""
+
+    url: AnyHttpUrl = Field(..., description="URL receiving POSTed event batches")
+    events: List[str] = Field(
+        default_factory=list, description="Event names to deliver (empty = all)"
+    )
+    tenant: Optional[str] = Field(None, description="Only deliver this tenant's events")
+    batch_size: int = Field(default=20, ge=1, le=500, description="Max events per POST")
+    batch_wait: float = Field(
+        default=1.0, ge=0, le=60, description="Seconds to wait to fill a batch"
+    )
+    concurrency: int = Field(default=2, ge=1, le=20, description="Parallel deliveries")
+    max_queue: int = Field(
+        default=10000, ge=1, description="Queued events before the oldest are dropped"
+    )
+    secret: Optional[str] = Field(
+        None, description="Signs batches with X-Gateway-Signature (HMAC-SHA256)"
+    )
+
+
+class C2SWebhookEvent(BaseModel):
+    """Inbound lead event delivered by C2S"""
+
+    model_config = ConfigDict(extra="allow")
+
+    event: str = Field(default="lead.updated", description="Event name")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Lead payload")
+
+
+class C2SWebhookPayload(TypedDict, total=False):
+    """Inbound C2S lead event as validated on the ingest fast path"""
+
+    __pydantic_config__ = ConfigDict(extra="allow")  # type: ignore[misc]
+
+    event: str
+    data: Dict[str, Any]
+
+
+# ========== JOB MODELS ==========
+
+
+class JobCreate(BaseModel):
+    """Schema for submitting a background job"""
+
+    kind: str = Field(..., description="Registered job kind, e.g. redistribution")
+    params: Dict[str, Any] = Field(
+        default_factory=dict, description="Job parameters for that kind"
+    )
+
+
+# ========== BULK LEAD OPERATION MODELS ==========
+
+
+class BulkLeadOperation(BaseModel):
+    """Lead selection and pacing shared by bulk lead jobs"""
+
+    lead_ids: Optional[List[str]] = Field(
+        None, max_length=10000, description="Leads to apply the operation to"
+    )
+    criteria: Optional[LeadFilters] = Field(
+        None, description="Apply it to every lead matching these filters"
+    )
+    concurrency: int = Field(default=5, ge=1, le=20, description="Leads sent at once")
+    rate: Optional[float] = Field(
+        None, gt=0, le=50, description="Max leads per second (default: rate limit)"
+    )
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        """Require exactly one lead selection"""
+        if (self.lead_ids is None) == (self.criteria is None):
+            raise ValueError("Provide exactly one of lead_ids or criteria")
+        return self
+
+
+class BulkMessageCreate(BulkLeadOperation):
+    """Schema for adding the same message to many leads"""
+
+    message: MessageCreate
+
+
+class BulkActivityCreate(BulkLeadOperation):
+    """Schema for logging the same activity on many leads"""
+
+    activity: ActivityCreate
+
+
 # ========== TEST MODELS (marked with TEST) ==========
 
 
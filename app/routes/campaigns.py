@@ -0,0 +1,92 @@
+"""
+Campaign mapping routes
+"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from app.core.campaigns import (
+    AD_GROUP_ID,
+    CAMPAIGN_ID,
+    FORM_ID,
+    PROP_REF,
+    CampaignNotFound,
+    campaign_store,
+)
+from app.models.schemas import CampaignMapping
+
+router = APIRouter(prefix="/campaigns", tags=["Campaigns"])
+
+VERSION_QUERY = Query(
+    default=None,
+    ge=0,
+    description="Expected current version (0 = must not exist); 409 if stale",
+)
+
+
+@router.get("")
+async def list_campaigns(
+    offset: int = Query(default=0, ge=0), limit: int = Query(default=100, ge=1, le=1000)
+):
+    """List mapped campaigns"""
+    index = campaign_store.index
+    return {
+        "campaigns": campaign_store.list(offset, limit),
+        "total": len(index.by_id),
+        "revision": index.revision,
+    }
+
+
+@router.get("/lookup")
+async def lookup_campaigns(
+    campaign_id: Optional[str] = Query(None, description="Google Ads campaign id"),
+    ad_group_id: Optional[str] = Query(None, description="Google Ads ad group id"),
+    form_id: Optional[str] = Query(None, description="Lead form id"),
+    prop_ref: Optional[str] = Query(None, description="Property reference"),
+):
+    """Campaigns matching any of the given ids (served from memory)"""
+    keys = {
+        CAMPAIGN_ID: campaign_id,
+        AD_GROUP_ID: ad_group_id,
+        FORM_ID: form_id,
+        PROP_REF: prop_ref,
+    }
+    found = {}
+    for key_type, key in keys.items():
+        if key:
+            for record in campaign_store.find(key_type, key):
+                found[record["campaign_id"]] = record
+    return {"campaigns": list(found.values())}
+
+
+@router.get("/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    """Get one campaign mapping with its version"""
+    record = campaign_store.get(campaign_id)
+    if record is None:
+        raise CampaignNotFound(f"Campaign {campaign_id} not found")
+    return record
+
+
+@router.put("/{campaign_id}")
+async def put_campaign(
+    campaign_id: str, data: CampaignMapping, version: Optional[int] = VERSION_QUERY
+):
+    """
+    Create or replace a campaign mapping
+
+    Pass the version you read as `version` to fail with 409 instead of
+    overwriting a concurrent edit.
+    """
+    return await asyncio.to_thread(
+        campaign_store.put, campaign_id, data.model_dump(), version
+    )
+
+
+@router.delete("/{campaign_id}")
+async def delete_campaign(campaign_id: str, version: Optional[int] = VERSION_QUERY):
+    """Delete a campaign mapping"""
+    await asyncio.to_thread(campaign_store.delete, campaign_id, version)
+    return {"status": "deleted", "campaign_id": campaign_id}
@@ -2,9 +2,12 @@
 Company and user information routes
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 
-from app.core.client import c2s_client
+from app.core.client import c2s_client, tenant_clients
+from app.core.config import settings
+from app.core.errors import upstream_error
+from app.core.tenants import current_tenant
 
 router = APIRouter(prefix="/company", tags=["Company"])
 
@@ -15,4 +18,25 @@ async def get_company_info():
     try:
         return await c2s_client.get_me()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+@router.get("/tenants")
+async def list_tenants():
+    """List configured tenants and their upstream rate budgets"""
+    tenants = []
+    for name in settings.tenant_names():
+        client = tenant_clients.get(name)
+        tenants.append(
+            {
+                "name": name,
+                "rate_limit": client.rate_limiter.rate,
+                "rate_burst": client.rate_limiter.burst,
+                "rate_available": round(client.rate_limiter.available, 2),
+            }
+        )
+    return {
+        "current": current_tenant.get(),
+        "header": settings.tenant_header,
+        "tenants": tenants,
+    }
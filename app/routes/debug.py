@@ -0,0 +1,84 @@
+"""
+Diagnostics routes
+"""
+
+import secrets
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.core.config import settings
+from app.core.profiling import (
+    MODES,
+    ProfilerBusy,
+    loop_monitor,
+    profiler,
+    to_collapsed,
+    to_speedscope,
+)
+from app.core.tracing import collector
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """Allow debug endpoints only with the configured DEBUG_TOKEN"""
+    if not settings.debug_token:
+        raise HTTPException(status_code=403, detail="Debug endpoints are disabled")
+    if not secrets.compare_digest(x_debug_token or "", settings.debug_token):
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+
+router = APIRouter(
+    prefix="/debug", tags=["Debug"], dependencies=[Depends(require_debug_token)]
+)
+
+
+@router.get("/traces")
+async def recent_traces(limit: int = Query(default=20, ge=1, le=200)):
+    """Most recent request traces, newest first"""
+    return {"traces": collector.recent(limit)}
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(default=10, gt=0, le=60),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    mode: str = Query(default="cpu", description="cpu (on-CPU) or tasks (awaits)"),
+    output: str = Query(
+        default="collapsed", alias="format", description="collapsed or speedscope"
+    ),
+):
+    """
+    Sample the live process for N seconds
+
+    cpu mode samples the event loop thread's stack; tasks mode samples the
+    await chain of every pending asyncio task. collapsed output feeds
+    flamegraph.pl / speedscope, speedscope output opens directly in
+    https://www.speedscope.app.
+    """
+    if mode not in MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {MODES}")
+    if output not in ("collapsed", "speedscope"):
+        raise HTTPException(
+            status_code=422, detail="format must be collapsed or speedscope"
+        )
+    interval = interval_ms / 1000
+    try:
+        samples = await profiler.record(seconds, interval, mode)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    name = f"c2s-gateway-{mode}-{time.strftime('%Y%m%dT%H%M%S')}"
+    if output == "speedscope":
+        return JSONResponse(
+            to_speedscope(samples, interval, name),
+            headers={"Content-Disposition": f'attachment; filename="{name}.json"'},
+        )
+    return PlainTextResponse(to_collapsed(samples))
+
+
+@router.get("/loop")
+async def loop_stats():
+    """Event loop lag and stall counters"""
+    return loop_monitor.stats()
@@ -2,13 +2,20 @@
 Distribution queue and rules management routes
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
+from app.core.assignment import seller_selector
 from app.core.client import c2s_client
+from app.core.errors import upstream_error
+from app.core.jobs import Job, jobs
+from app.core.redistribution import REDISTRIBUTION
+from app.core.tenants import current_tenant
 from app.models.schemas import (
     DistributionRuleCreate,
+    LeadAssign,
     LeadRedistribute,
     NextSeller,
+    RedistributionCreate,
     SellerPriority,
 )
 
@@ -24,7 +31,7 @@ async def list_distribution_queues():
     try:
         return await c2s_client.get_distribution_queues()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/queues/{queue_id}/redistribute")
@@ -35,7 +42,7 @@ async def redistribute_lead(queue_id: str, data: LeadRedistribute):
             queue_id, data.lead_id, data.seller_id
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.get("/queues/{queue_id}/sellers")
@@ -44,7 +51,7 @@ async def get_queue_sellers(queue_id: str):
     try:
         return await c2s_client.get_queue_sellers(queue_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/queues/{queue_id}/priority")
@@ -55,7 +62,7 @@ async def update_seller_priority(queue_id: str, data: SellerPriority):
             queue_id, data.seller_id, data.priority
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/queues/{queue_id}/next-seller")
@@ -64,7 +71,83 @@ async def set_next_seller(queue_id: str, data: NextSeller):
     try:
         return await c2s_client.set_next_seller(queue_id, data.seller_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+# ========== GATEWAY ASSIGNMENT ==========
+
+
+@router.post("/assign")
+async def assign_lead(data: LeadAssign):
+    """
+    Pick a seller from a queue and forward the lead in one call
+
+    Sellers and priorities come from the cached queue sellers, so only the
+    forward reaches C2S. round_robin rotates by priority weight;
+    least_loaded picks the seller with the fewest gateway assignments per
+    unit of priority.
+    """
+    try:
+        return await c2s_client.assign_lead(
+            data.lead_id, data.queue_id, data.strategy, data.exclude
+        )
+    except Exception as e:
+        raise upstream_error(e)
+
+
+@router.get("/assign/state")
+async def assignment_state():
+    """Seller weights and gateway assignment counts per queue"""
+    return {"queues": seller_selector.stats(current_tenant.get())}
+
+
+# ========== BULK REDISTRIBUTION ==========
+
+
+@router.post("/redistributions", status_code=202)
+async def create_redistribution(data: RedistributionCreate):
+    """
+    Start a bulk redistribution job
+
+    Select leads with lead_ids, or with criteria and/or from_seller_id,
+    and move them to seller_id or to sellers picked from queue_id. The job
+    runs in the background in the bulk lane; poll it for progress.
+    """
+    job = await jobs.submit(
+        REDISTRIBUTION, current_tenant.get(), data.model_dump(mode="json")
+    )
+    return job.to_dict()
+
+
+@router.get("/redistributions")
+async def list_redistributions(limit: int = Query(default=50, ge=1, le=500)):
+    """List this tenant's redistribution jobs, newest first"""
+    tenant = current_tenant.get()
+    found = await jobs.list(tenant, kind=REDISTRIBUTION, limit=limit)
+    return {"jobs": [job.to_dict(result=False) for job in found]}
+
+
+async def _redistribution_job(job_id: str) -> Job:
+    job = await jobs.get(job_id)
+    tenant = current_tenant.get()
+    if job is None or job.tenant != tenant or job.kind != REDISTRIBUTION:
+        raise HTTPException(status_code=404, detail="Redistribution job not found")
+    return job
+
+
+@router.get("/redistributions/{job_id}")
+async def get_redistribution(
+    job_id: str, results: bool = Query(default=False, description="Per-lead results")
+):
+    """Progress of a redistribution job"""
+    return (await _redistribution_job(job_id)).to_dict(result=results)
+
+
+@router.post("/redistributions/{job_id}/cancel")
+async def cancel_redistribution(job_id: str):
+    """Stop a redistribution job; leads already moved stay moved"""
+    await _redistribution_job(job_id)
+    return (await jobs.cancel(job_id)).to_dict(result=False)
 
 
 # ========== DISTRIBUTION RULES ==========
@@ -76,4 +159,4 @@ async def create_distribution_rule(rule: DistributionRuleCreate):
     try:
         return await c2s_client.create_distribution_rule(rule.model_dump())
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
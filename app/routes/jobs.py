@@ -0,0 +1,72 @@
+"""
+Background job routes
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import ValidationError
+
+from app.core.jobs import FINISHED, PENDING, RUNNING, Job, jobs
+from app.core.tenants import current_tenant
+from app.models.schemas import JobCreate
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+STATUSES = (PENDING, RUNNING) + FINISHED
+
+
+async def _tenant_job(job_id: str) -> Job:
+    job = await jobs.get(job_id)
+    if job is None or job.tenant != current_tenant.get():
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("", status_code=202)
+async def submit_job(data: JobCreate):
+    """
+    Submit a background job
+
+    The job is queued and runs on the gateway's job workers in the bulk
+    lane; poll GET /jobs/{job_id} for progress and the result.
+    """
+    if data.kind not in jobs.handlers:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown job kind {data.kind}, expected one of "
+            f"{sorted(jobs.handlers)}",
+        )
+    try:
+        job = await jobs.submit(data.kind, current_tenant.get(), data.params)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_context=False)
+        )
+    return job.to_dict()
+
+
+@router.get("")
+async def list_jobs(
+    status: Optional[str] = Query(default=None, description=f"One of {STATUSES}"),
+    kind: Optional[str] = Query(default=None, description="Only this job kind"),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """List this tenant's jobs, newest first"""
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {STATUSES}")
+    found = await jobs.list(current_tenant.get(), status=status, kind=kind, limit=limit)
+    return {"jobs": [job.to_dict(result=False) for job in found]}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once finished) result of a job"""
+    return (await _tenant_job(job_id)).to_dict()
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a pending or running job; finished jobs are left as they are"""
+    await _tenant_job(job_id)
+    return (await jobs.cancel(job_id)).to_dict(result=False)
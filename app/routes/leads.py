@@ -2,18 +2,34 @@
 Lead management routes
 """
 
+import asyncio
+import json
 from typing import Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
+from app.core import deadlines, tracing
+from app.core.broadcast import BULK_ACTIVITY, BULK_MESSAGE
 from app.core.client import c2s_client
+from app.core.errors import error_info, upstream_error
+from app.core.config import settings
+from app.core.feed import CursorExpired, change_feeds
+from app.core.jobs import jobs
+from app.core.leadrange import InvalidCursor, decode_cursor, read_range
+from app.core.shutdown import drainer
+from app.core.tenants import current_tenant
 from app.models.schemas import (
     ActivityCreate,
+    BulkActivityCreate,
+    BulkMessageCreate,
     DoneDeal,
     LeadCreate,
     LeadForward,
+    LeadLookup,
     LeadTagCreate,
+    LeadTagsByName,
     LeadUpdate,
     MessageCreate,
     VisitCreate,
@@ -62,17 +78,205 @@ async def resolve_lead_source(
         if google_lead_id:
             params["google_lead_id"] = google_lead_id
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{IBVI_ADS_GATEWAY_URL}/v1/leads/resolve-source",
-                params=params,
-            )
-            response.raise_for_status()
-            return response.json()
+        profile = deadlines.profile_for("ibvi")
+        timeout = deadlines.httpx_timeout(profile, deadlines.budget(profile.total))
+        with tracing.span("ibvi", endpoint="resolve-source"):
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response = await client.get(
+                    f"{IBVI_ADS_GATEWAY_URL}/v1/leads/resolve-source",
+                    params=params,
+                    headers={
+                        **deadlines.outbound_headers(),
+                        **tracing.outbound_headers(),
+                    },
+                )
+                response.raise_for_status()
+                return response.json()
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Error calling ibvi-ads-gateway: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+# =============================================================================
+# CHANGE FEED - Must be before /{lead_id} route to avoid conflicts
+# =============================================================================
+
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+@router.get("/changes")
+async def lead_changes(
+    cursor: Optional[str] = Query(None, description="Cursor from a previous call"),
+    limit: int = Query(default=100, ge=1, le=500),
+    wait: float = Query(
+        default=0, ge=0, le=60, description="Long-poll seconds when no changes"
+    ),
+):
+    """
+    Read lead changes after a cursor
+
+    Changes come from one gateway-side sync of GET /integration/leads plus
+    inbound webhooks, shared by every consumer. Without a cursor, reading
+    starts at the oldest retained change. Pass the returned cursor to the
+    next call; a 410 means the cursor expired and the consumer must resync.
+    """
+    feed = change_feeds.get()
+    feed.touch()
+    after = feed.parse_cursor(cursor)
+    left = deadlines.remaining()
+    timeout = wait if left is None else max(0.0, min(wait, left - 0.1))
+    events = await feed.wait(after, limit, timeout)
+    last = events[-1]["seq"] if events else after
+    return {
+        "events": events,
+        "cursor": feed.cursor(last),
+        "has_more": last < feed.head,
+    }
+
+
+@router.get("/changes/stream")
+async def stream_lead_changes(
+    cursor: Optional[str] = Query(None, description="Cursor to resume from"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream lead changes as Server-Sent Events
+
+    Each event's id is its cursor, so reconnecting clients resume with the
+    Last-Event-ID header. A `reset` event means the consumer fell behind the
+    retained log and must resync.
+    """
+    feed = change_feeds.get()
+    feed.touch()
+    after = feed.parse_cursor(cursor or last_event_id)
+
+    async def events():
+        position = after
+        # Ends at shutdown; the client reconnects with Last-Event-ID
+        while not drainer.draining:
+            feed.touch()
+            try:
+                feed.parse_cursor(feed.cursor(position))
+            except CursorExpired as e:
+                yield f"event: reset\ndata: {json.dumps({'detail': e.detail})}\n\n"
+                return
+            batch = await feed.wait(position, 100, SSE_KEEPALIVE_SECONDS)
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+            for event in batch:
+                yield (
+                    f"id: {feed.cursor(event['seq'])}\n"
+                    f"event: {event['type']}\n"
+                    f"data: {json.dumps(event)}\n\n"
+                )
+            position = batch[-1]["seq"]
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# =============================================================================
+# LARGE PAGES - Must be before /{lead_id} route to avoid conflicts
+# =============================================================================
+
+MAX_RANGE_LIMIT = 500
+
+
+@router.get("/range")
+async def list_lead_range(
+    limit: int = Query(default=100, ge=1, le=MAX_RANGE_LIMIT),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous call"),
+    sort: Optional[str] = Query(
+        None, description="Sort: -created_at, created_at, -updated_at, updated_at"
+    ),
+    created_gte: Optional[str] = Query(None, description="Created >= (ISO 8601)"),
+    created_lt: Optional[str] = Query(None, description="Created < (ISO 8601)"),
+    updated_gte: Optional[str] = Query(None, description="Updated >= (ISO 8601)"),
+    updated_lt: Optional[str] = Query(None, description="Updated < (ISO 8601)"),
+    status: Optional[str] = Query(None, description="Status filter"),
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    tags: Optional[str] = None,
+):
+    """
+    List up to 500 leads per call with cursor pagination
+
+    The upstream pages covering the range are fetched concurrently and
+    concatenated in upstream order. Pass the returned cursor (it carries
+    the filters) to read the next range; it is null after the last lead.
+    """
+    filters = {
+        name: value
+        for name, value in {
+            "sort": sort,
+            "created_gte": created_gte,
+            "created_lt": created_lt,
+            "updated_gte": updated_gte,
+            "updated_lt": updated_lt,
+            "status": status,
+            "phone": phone,
+            "email": email,
+            "tags": tags,
+        }.items()
+        if value
+    }
+    offset, last = 0, None
+    if cursor:
+        cursor_filters, offset, last = decode_cursor(cursor)
+        if filters and filters != cursor_filters:
+            raise InvalidCursor("Cursor was issued for different filters")
+        filters = cursor_filters
+    try:
+        return await read_range(
+            c2s_client,
+            filters,
+            offset,
+            limit,
+            last,
+            settings.lead_range_concurrency,
+            cached=not cursor,
+        )
+    except Exception as e:
+        raise upstream_error(e)
+
+
+# =============================================================================
+# BULK MESSAGES AND ACTIVITIES - Must be before /{lead_id} route to avoid conflicts
+# =============================================================================
+
+
+@router.post("/messages/bulk", status_code=202)
+async def bulk_create_messages(data: BulkMessageCreate):
+    """
+    Start a job adding the same message to many leads
+
+    Select leads with lead_ids or criteria. The job runs in the background
+    in the bulk lane with bounded concurrency and records a result per
+    lead; poll GET /jobs/{job_id} for progress and cancel it with
+    POST /jobs/{job_id}/cancel.
+    """
+    job = await jobs.submit(
+        BULK_MESSAGE, current_tenant.get(), data.model_dump(mode="json")
+    )
+    return job.to_dict()
+
+
+@router.post("/activities/bulk", status_code=202)
+async def bulk_create_activities(data: BulkActivityCreate):
+    """
+    Start a job logging the same activity on many leads
+
+    Works like POST /leads/messages/bulk.
+    """
+    job = await jobs.submit(
+        BULK_ACTIVITY, current_tenant.get(), data.model_dump(mode="json")
+    )
+    return job.to_dict()
 
 
 # =============================================================================
@@ -101,6 +305,9 @@ async def list_leads(
 
     Status options: novo, em_negociacao, convertido, negocio_fechado,
                    arquivado, resgatado, pendente, recusado, finalizado
+
+    Responses are cached briefly (LEAD_LIST_CACHE_TTL) and may be served
+    stale while refreshed; lead writes through the gateway invalidate them.
     """
     try:
         return await c2s_client.get_leads(
@@ -115,9 +322,48 @@ async def list_leads(
             phone=phone,
             email=email,
             tags=tags,
+            cached=True,
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+@router.post("/lookup")
+async def lookup_leads(
+    data: LeadLookup,
+    stream: bool = Query(False, description="Stream results as NDJSON lines"),
+):
+    """
+    Fetch many leads by id in one call
+
+    Ids are deduplicated and served from the lead cache when possible; the
+    rest are fetched concurrently. Each id maps to {"data": lead} or
+    {"error": {"status", "detail"}}, so one bad id never fails the batch.
+    With stream=true each result is sent as an NDJSON line as it completes.
+    """
+    results = c2s_client.iter_leads(data.ids)
+
+    if stream:
+
+        async def lines():
+            async for lead_id, lead, error in results:
+                yield json.dumps(_lookup_result(lead_id, lead, error)) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    leads = {}
+    errors = 0
+    async for lead_id, lead, error in results:
+        item = _lookup_result(lead_id, lead, error)
+        errors += "error" in item
+        leads[lead_id] = {k: v for k, v in item.items() if k != "id"}
+    return {"leads": leads, "count": len(leads), "errors": errors}
+
+
+def _lookup_result(lead_id: str, lead, error) -> dict:
+    if error is not None:
+        return {"id": lead_id, "error": error_info(error)}
+    return {"id": lead_id, "data": lead}
 
 
 @router.get("/{lead_id}")
@@ -126,7 +372,7 @@ async def get_lead(lead_id: str):
     try:
         return await c2s_client.get_lead(lead_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("")
@@ -135,7 +381,7 @@ async def create_lead(lead: LeadCreate):
     try:
         return await c2s_client.create_lead(lead.model_dump(exclude_none=True))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.patch("/{lead_id}")
@@ -144,7 +390,7 @@ async def update_lead(lead_id: str, lead: LeadUpdate):
     try:
         return await c2s_client.update_lead(lead_id, lead.model_dump(exclude_none=True))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.patch("/{lead_id}/forward")
@@ -153,7 +399,7 @@ async def forward_lead(lead_id: str, data: LeadForward):
     try:
         return await c2s_client.forward_lead(lead_id, data.seller_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.get("/{lead_id}/tags")
@@ -162,7 +408,7 @@ async def get_lead_tags(lead_id: str):
     try:
         return await c2s_client.get_lead_tags(lead_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/{lead_id}/tags")
@@ -171,7 +417,36 @@ async def create_lead_tag(lead_id: str, data: LeadTagCreate):
     try:
         return await c2s_client.create_lead_tag(lead_id, data.tag_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+@router.post("/{lead_id}/tags/by-name")
+async def tag_lead_by_name(lead_id: str, data: LeadTagsByName):
+    """
+    Tag a lead by tag name
+
+    Names are resolved through the gateway's tag name index; missing tags
+    are created (unless create is false) and all tags are applied
+    concurrently. Each tag reports its own outcome, so one failure never
+    fails the others.
+    """
+    try:
+        tag_ids = await c2s_client.resolve_tags(data.names, create=data.create)
+    except Exception as e:
+        raise upstream_error(e)
+
+    async def apply(name: str):
+        tag_id = tag_ids[name]
+        if tag_id is None:
+            return {"name": name, "tag_id": None, "status": "not_found"}
+        try:
+            await c2s_client.create_lead_tag(lead_id, tag_id)
+            return {"name": name, "tag_id": tag_id, "status": "ok"}
+        except Exception as e:
+            return {"name": name, "tag_id": tag_id, "error": error_info(e)}
+
+    results = await asyncio.gather(*(apply(name) for name in data.names))
+    return {"lead_id": lead_id, "tags": results}
 
 
 @router.post("/{lead_id}/mark-interacted")
@@ -180,7 +455,7 @@ async def mark_as_interacted(lead_id: str):
     try:
         return await c2s_client.mark_lead_as_interacted(lead_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/{lead_id}/messages")
@@ -189,7 +464,7 @@ async def create_message(lead_id: str, message: MessageCreate):
     try:
         return await c2s_client.create_message(lead_id, message.message, message.type)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/{lead_id}/visits")
@@ -200,7 +475,7 @@ async def create_visit(lead_id: str, visit: VisitCreate):
             lead_id, visit.visit_date, visit.description
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/{lead_id}/activities")
@@ -211,7 +486,7 @@ async def create_activity(lead_id: str, activity: ActivityCreate):
             lead_id, activity.type, activity.description, activity.date
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/{lead_id}/done-deal")
@@ -220,4 +495,4 @@ async def mark_done_deal(lead_id: str, deal: DoneDeal):
     try:
         return await c2s_client.mark_done_deal(lead_id, deal.value, deal.description)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
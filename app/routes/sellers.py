@@ -2,9 +2,10 @@
 Seller management routes
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 
 from app.core.client import c2s_client
+from app.core.errors import upstream_error
 from app.models.schemas import SellerCreate, SellerUpdate
 
 router = APIRouter(prefix="/sellers", tags=["Sellers"])
@@ -16,7 +17,7 @@ async def list_sellers():
     try:
         return await c2s_client.get_sellers()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("")
@@ -25,7 +26,7 @@ async def create_seller(seller: SellerCreate):
     try:
         return await c2s_client.create_seller(seller.model_dump(exclude_none=True))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.put("/{seller_id}")
@@ -36,4 +37,4 @@ async def update_seller(seller_id: str, seller: SellerUpdate):
             seller_id, seller.model_dump(exclude_none=True)
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
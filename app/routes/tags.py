@@ -4,9 +4,10 @@ Tag management routes
 
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Query
 
 from app.core.client import c2s_client
+from app.core.errors import upstream_error
 from app.models.schemas import TagCreate
 
 router = APIRouter(prefix="/tags", tags=["Tags"])
@@ -21,7 +22,7 @@ async def list_tags(
     try:
         return await c2s_client.get_tags(name=name, autofill=autofill)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("")
@@ -30,4 +31,4 @@ async def create_tag(tag: TagCreate):
     try:
         return await c2s_client.create_tag(tag.model_dump(exclude_none=True))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
@@ -2,10 +2,25 @@
 Webhook management routes
 """
 
-from fastapi import APIRouter, HTTPException
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from pydantic import ValidationError
 
 from app.core.client import c2s_client
-from app.models.schemas import WebhookSubscribe, WebhookUnsubscribe
+from app.core.config import settings
+from app.core.errors import upstream_error
+from app.core.fanout import Subscriber, fanout
+from app.core.feed import change_feeds
+from app.core.ingest import parse_c2s_event
+from app.core.tenants import current_tenant
+from app.models.schemas import (
+    C2SWebhookEvent,
+    WebhookSubscribe,
+    WebhookSubscriberCreate,
+    WebhookUnsubscribe,
+)
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
@@ -26,7 +41,7 @@ async def subscribe_webhook(data: WebhookSubscribe):
     try:
         return await c2s_client.subscribe_webhook(data.url, data.events)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
 
 
 @router.post("/unsubscribe")
@@ -35,4 +50,84 @@ async def unsubscribe_webhook(data: WebhookUnsubscribe):
     try:
         return await c2s_client.unsubscribe_webhook(data.url)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+def check_webhook_secret(header_secret: Optional[str], query_secret: Optional[str]):
+    """Reject inbound webhooks without the shared secret, when one is configured"""
+    if not settings.webhook_secret:
+        return
+    supplied = header_secret or query_secret or ""
+    if not secrets.compare_digest(supplied, settings.webhook_secret):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+
+
+@router.post(
+    "/c2s",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": C2SWebhookEvent.model_json_schema()}
+            },
+        }
+    },
+)
+async def receive_c2s_event(
+    request: Request,
+    x_webhook_secret: Optional[str] = Header(None),
+    secret: Optional[str] = Query(None),
+):
+    """
+    Receive a lead event from C2S
+
+    Register this URL with POST /webhooks/subscribe. Events are appended to
+    the lead change feed (GET /leads/changes) and fanned out to internal
+    subscribers (POST /webhooks/subscribers). The raw body is validated
+    on the ingest fast path (app.core.ingest) instead of via a model.
+    """
+    check_webhook_secret(x_webhook_secret, secret)
+    try:
+        event, payload = parse_c2s_event(await request.body())
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_input=False)
+        )
+    recorded = change_feeds.get().record_webhook(event, payload)
+    delivered_to = fanout.publish(
+        current_tenant.get(), recorded or {"type": event, "data": payload}
+    )
+    return {
+        "status": "accepted",
+        "recorded": recorded is not None,
+        "subscribers": delivered_to,
+    }
+
+
+# ========== INTERNAL SUBSCRIBERS ==========
+
+
+@router.get("/subscribers")
+async def list_subscribers():
+    """List internal subscribers with queue depth, lag and delivery counters"""
+    return {"subscribers": [s.stats() for s in fanout.subscribers.values()]}
+
+
+@router.post("/subscribers")
+async def create_subscriber(data: WebhookSubscriberCreate):
+    """
+    Register an internal service to receive C2S lead events
+
+    Events are POSTed as {"events": [...]} batches; failed deliveries are
+    retried with exponential backoff.
+    """
+    subscriber = fanout.add(Subscriber(**data.model_dump(mode="json")))
+    return subscriber.stats()
+
+
+@router.delete("/subscribers/{subscriber_id}")
+async def delete_subscriber(subscriber_id: str):
+    """Unregister an internal subscriber"""
+    if not fanout.remove(subscriber_id):
+        raise HTTPException(status_code=404, detail="Subscriber not found")
+    return {"status": "deleted", "id": subscriber_id}
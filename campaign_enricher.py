@@ -5,6 +5,8 @@ Maps campaign_id to property details for Contact2Sale
 """
 
 import json
+import os
+import tempfile
 from pathlib import Path
 from typing import Dict, Optional
 
@@ -12,11 +14,17 @@ from typing import Dict, Optional
 class CampaignEnricher:
     """Enrich leads with campaign and property information"""
 
-    def __init__(self, mapping_file: str = "campaign_mapping.json"):
-        """Load campaign mapping from JSON file"""
-        mapping_path = Path(__file__).parent / mapping_file
+    def __init__(self, mapping_file: str = "campaign_mapping.json", store=None):
+        """
+        Load campaign mapping from JSON file
+
+        With a store (app.core.campaigns.CampaignStore), campaigns are looked
+        up in and saved to the store instead of the file's campaign dict.
+        """
+        self.mapping_path = Path(__file__).parent / mapping_file
+        self.store = store
 
-        with open(mapping_path, "r", encoding="utf-8") as f:
+        with open(self.mapping_path, "r", encoding="utf-8") as f:
             self.mapping = json.load(f)
 
         self.campaigns = self.mapping.get("google_ads_campaigns", {})
@@ -51,7 +59,7 @@ class CampaignEnricher:
             }
         """
         campaign_id = webhook_data.get("campaign_id", "")
-        campaign_info = self.campaigns.get(campaign_id, None)
+        campaign_info = self.find_campaign(webhook_data)
 
         # Build customer data
         customer_data = {
@@ -114,19 +122,40 @@ class CampaignEnricher:
 
         return enriched
 
+    def find_campaign(self, webhook_data: Dict) -> Optional[Dict]:
+        """Campaign for a lead, by campaign, ad group or form ID"""
+        if self.store is not None:
+            record = self.store.match(webhook_data)
+            return record["data"] if record else None
+        return self.campaigns.get(webhook_data.get("campaign_id", ""), None)
+
     def get_campaign_info(self, campaign_id: str) -> Optional[Dict]:
         """Get campaign information by ID"""
+        if self.store is not None:
+            record = self.store.get(campaign_id)
+            return record["data"] if record else None
         return self.campaigns.get(campaign_id, None)
 
     def add_campaign_mapping(self, campaign_id: str, campaign_data: Dict):
         """Add or update campaign mapping"""
+        if self.store is not None:
+            self.store.put(campaign_id, campaign_data)
+            return
+
         self.campaigns[campaign_id] = campaign_data
         self.mapping["google_ads_campaigns"] = self.campaigns
 
-        # Save to file
-        mapping_path = Path(__file__).parent / "campaign_mapping.json"
-        with open(mapping_path, "w", encoding="utf-8") as f:
-            json.dump(self.mapping, f, indent=2, ensure_ascii=False)
+        # Save to file atomically (write a temp file, then rename over)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.mapping_path.parent, prefix=".campaign_mapping."
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.mapping, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.mapping_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
 
 # Example usage
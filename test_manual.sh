@@ -63,6 +63,21 @@ echo "=========================================="
 curl -s "${BASE_URL}/TEST/full-system-test" | python3 -m json.tool
 echo ""
 
+echo ""
+echo "=========================================="
+echo "TEST 8: Change Feed Survives a Short-Deadline Consumer"
+echo "=========================================="
+# The first consumer starts the shared sync; its 300ms deadline must not stop it
+curl -s -H "X-Request-Timeout-Ms: 300" "${BASE_URL}/leads/changes" > /dev/null
+sleep 5
+curl -s "${BASE_URL}/metrics" | python3 -c '
+import json, sys
+counters = json.load(sys.stdin).get("counters", {})
+errors = sum(v for k, v in counters.items() if k.startswith("feed_sync_errors"))
+print("PASS" if not errors else f"FAIL: {errors:g} feed sync errors")
+'
+echo ""
+
 echo ""
 echo "=========================================="
 echo "All tests completed!"